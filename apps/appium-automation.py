@@ -1,13 +1,12 @@
 import streamlit as st
-import os
-import vertexai
 from vertexai.generative_models import (
     GenerationConfig,
-    GenerativeModel,
     HarmBlockThreshold,
     HarmCategory,
-    Part,
 )
+from utils_models import load_models
+from utils_streamlit import render_keyframe_toggle
+from utils_video import video_request
 
 # Custom CSS to resize video, style tabs, and improve button appearance
 st.markdown("""
@@ -44,17 +43,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_vertex(region):
-    PROJECT_ID = os.environ.get("GCP_PROJECT")
-    LOCATION = os.environ.get(f"{region}")
-    vertexai.init(project=PROJECT_ID, location=LOCATION)
-
-@st.cache_resource
-def load_models(name):
-    text_model_pro = GenerativeModel(name)
-    multimodal_model_pro = GenerativeModel(name)
-    return text_model_pro, multimodal_model_pro
-
 def get_gemini_pro_response(model, prompt, generation_config={}):
     generation_config = {"temperature": 0.1, "max_output_tokens": 8192}
     response = model.generate_content(prompt, generation_config=generation_config, stream=True)
@@ -125,8 +113,7 @@ with col2:
     )
 
 # Load models and video
-load_vertex(model_region)
-text_model_pro, multimodal_model_pro = load_models(model_name)
+text_model_pro, multimodal_model_pro = load_models(model_name, region=model_region)
 
 video_uris = {
     "E-commerce (Nike)": "gs://convento-samples/nike-sbf.mp4",
@@ -145,6 +132,7 @@ col1, col2 = st.columns([1, 1])
 with col1:
     st.subheader("User Interaction Video")
     st.video(video_url)
+    keyframes = render_keyframe_toggle(selected_video_uri)
 
 with col2:
     st.subheader("Generated Results")
@@ -173,10 +161,10 @@ with col2:
         """
         
         with st.spinner("Generating Video Description..."):
-            video_part = Part.from_uri(selected_video_uri, mime_type="video/mp4")
+            video_model, video_input = video_request(multimodal_model_pro, selected_video_uri, keyframes)
             video_description_placeholder = st.empty()
             video_description_response = ""
-            for chunk in get_gemini_pro_response(multimodal_model_pro, [video_description_prompt, video_part]):
+            for chunk in get_gemini_pro_response(video_model, [video_description_prompt, *video_input]):
                 video_description_response += chunk
                 video_description_placeholder.markdown(video_description_response)
             st.session_state['video_description'] = video_description_response
@@ -266,10 +254,10 @@ with col2:
         """
         
         with st.spinner("Generating Appium Script..."):
-            video_part = Part.from_uri(selected_video_uri, mime_type="video/mp4")
+            video_model, video_input = video_request(multimodal_model_pro, selected_video_uri, keyframes)
             appium_script_placeholder = st.empty()
             appium_script_response = ""
-            for chunk in get_gemini_pro_response(multimodal_model_pro, [appium_script_prompt, video_part]):
+            for chunk in get_gemini_pro_response(video_model, [appium_script_prompt, *video_input]):
                 appium_script_response += chunk
                 appium_script_placeholder.markdown(appium_script_response)
             st.session_state['appium_script'] = appium_script_response
@@ -1,18 +1,19 @@
 import streamlit as st
-import os
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel, Part
-
-# Initialize Vertex AI
-PROJECT_ID = os.environ.get("GCP_PROJECT")
-LOCATION = os.environ.get("GCP_REGION")
-vertexai.init(project=PROJECT_ID, location=LOCATION)
+import utils_async
+from utils_models import get_model
 
 def get_gemini_response(prompt, model_name="gemini-1.5-pro-001"):
-    model = GenerativeModel(model_name)
+    model = get_model(model_name)
     response = model.generate_content(prompt)
     return response.text
 
+def get_step_prompt(description, step):
+    return f"{description} for the following COBOL code:\n{cobol_code}\n\nIf there's existing Java code, use it as a base:\n{st.session_state.step_results.get(step, '')}"
+
+def get_final_prompt():
+    all_steps = "\n\n".join(st.session_state.step_results.values())
+    return f"Combine and refine all the following Java code snippets into a single, coherent Java program:\n\n{all_steps}"
+
 st.title("COBOL to Java Migration Demo using Gemini")
 
 cobol_code = """
@@ -111,21 +112,49 @@ with col2:
         ("Update Variables", "Update variable names to Java conventions")
     ]
 
+    run_all = st.button("Run all steps", type="primary")
+
+    step_placeholders = {}
     for i, (step, description) in enumerate(steps, 1):
         with st.expander(f"Step {i}: {step}", expanded=True):
             if st.button(f"Execute Step {i}", key=f"button_{i}"):
-                prompt = f"{description} for the following COBOL code:\n{cobol_code}\n\nIf there's existing Java code, use it as a base:\n{st.session_state.step_results.get(step, '')}"
-                result = get_gemini_response(prompt)
+                result = get_gemini_response(get_step_prompt(description, step))
                 st.session_state.step_results[step] = result
-            
+
+            step_placeholders[step] = st.empty()
             if step in st.session_state.step_results:
-                st.code(st.session_state.step_results[step], language="java")
+                step_placeholders[step].code(st.session_state.step_results[step], language="java")
+            elif run_all:
+                step_placeholders[step].info("Running...")
+
+    failed_steps = []
+    if run_all:
+        # Steps 1-7 only depend on the COBOL source, so they run concurrently on the
+        # pooled model and each result is shown as soon as it finishes.
+        requests = {step: get_step_prompt(description, step) for step, description in steps}
+        for step, future in utils_async.as_completed(requests, get_model("gemini-1.5-pro-001")):
+            try:
+                st.session_state.step_results[step] = future.result()
+                step_placeholders[step].code(st.session_state.step_results[step], language="java")
+            except Exception as e:
+                failed_steps.append(step)
+                step_placeholders[step].error(f"Step failed: {e}")
+        # Keep Step 8 input in the same order as the steps, not completion order.
+        st.session_state.step_results = {
+            step: st.session_state.step_results[step] for step, _ in steps if step in st.session_state.step_results
+        }
 
     with st.expander("Step 8: Generate Final Java Code", expanded=True):
-        if st.button("Generate Final Java Code"):
-            all_steps = "\n\n".join(st.session_state.step_results.values())
-            prompt = f"Combine and refine all the following Java code snippets into a single, coherent Java program:\n\n{all_steps}"
-            final_code = get_gemini_response(prompt)
+        generate_final = st.button("Generate Final Java Code") or run_all
+        # Combining partial results would hide the missing steps in the final code.
+        not_ready = [
+            f"Step {i} ({step})" for i, (step, _) in enumerate(steps, 1)
+            if step in failed_steps or step not in st.session_state.step_results
+        ]
+        if generate_final and not_ready:
+            st.warning(f"Final code not generated. These steps failed or have not run: {', '.join(not_ready)}.")
+        elif generate_final:
+            final_code = get_gemini_response(get_final_prompt())
             st.session_state.final_code = final_code
 
         if 'final_code' in st.session_state:
@@ -1,17 +1,11 @@
 import streamlit as st
-import os
-import vertexai
 from vertexai.generative_models import (
     GenerationConfig,
-    GenerativeModel,
     HarmBlockThreshold,
     HarmCategory,
-    Part,
 )
-
-PROJECT_ID = os.environ.get("GCP_PROJECT")
-LOCATION = os.environ.get("GCP_REGION")
-vertexai.init(project=PROJECT_ID, location=LOCATION)
+from utils_media import part_from_uri, part_from_bytes
+from utils_models import load_models
 
 st.markdown("""
     <style>
@@ -22,11 +16,6 @@ st.markdown("""
     }
     </style>
     """, unsafe_allow_html=True)
-def load_models(name):
-    text_model_pro = GenerativeModel(name)
-    multimodal_model_pro = GenerativeModel(name)
-    return text_model_pro, multimodal_model_pro
-
 def get_gemini_pro_vision_response(
     model, prompt_list, generation_config={}, stream: bool = True
 ):
@@ -105,7 +94,7 @@ with col1:
         custom_prompt = st.text_area("Enter your custom prompt:", value=custom_prompt_suggestion, height=100)
         if image_upload:
             st.image(image_upload, width=300)
-            image_part = Part.from_bytes(image_upload.getvalue(), mime_type=image_upload.type)
+            image_part = part_from_bytes(image_upload.getvalue(), mime_type=image_upload.type)
     else:
         if use_case == "Sprint Planning":
             image_url = "gs://convento-samples/tela-login.png"
@@ -130,7 +119,7 @@ with col1:
             This description will be used for development backlog.
             """
         
-        image_part = Part.from_uri(mime_type="image/png", uri=image_url)
+        image_part = part_from_uri(image_url, mime_type="image/png")
         st.image("https://storage.googleapis.com/" + image_url.split("gs://")[1], width=300)
 
 with col2:
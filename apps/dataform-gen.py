@@ -1,185 +1,94 @@
 import streamlit as st 
+import time
 import utils_vertex as vertex
 import json
+from utils_streamlit import render_cache_controls
+from apps.dataform.questions import QuestionCache, get_questions_prompt, schema_fingerprint
+from apps.dataform.schema import SAMPLE_BILLING_SCHEMA, SCHEMA_NOTATION, compact_schema
+from apps.dataform.schema_reader import LARGE_SCHEMA_BYTES, read_schema, select_columns
+
+page_start = time.perf_counter()
+
+COLUMNS_PER_PAGE = 50
+# Upper bound on the columns preselected for the model from an uploaded schema.
+MAX_SELECTED_COLUMNS = 200
 
 def load_sample_schema():
-    sample_schema = [
-        {
-            "name": "billing_account_id",
-            "mode": "NULLABLE",
-            "type": "STRING",
-            "description": "",
-            "fields": []
-        },
-        {
-            "name": "service",
-            "mode": "NULLABLE",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "id", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "description", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-            ]
-        },
-        {
-            "name": "sku",
-            "mode": "NULLABLE",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "id", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "description", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-            ]
-        },
-        {
-            "name": "usage_start_time",
-            "mode": "NULLABLE",
-            "type": "TIMESTAMP",
-            "description": "",
-            "fields": []
-        },
-        {
-            "name": "usage_end_time",
-            "mode": "NULLABLE",
-            "type": "TIMESTAMP",
-            "description": "",
-            "fields": []
-        },
-        {
-            "name": "project",
-            "mode": "NULLABLE",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "id", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "number", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {
-                    "name": "labels",
-                    "mode": "REPEATED",
-                    "type": "RECORD",
-                    "description": "",
-                    "fields": [
-                        {"name": "key", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                        {"name": "value", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-                    ]
-                },
-                {"name": "ancestry_numbers", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {
-                    "name": "ancestors",
-                    "mode": "REPEATED",
-                    "type": "RECORD",
-                    "description": "",
-                    "fields": [
-                        {"name": "resource_name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                        {"name": "display_name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-                    ]
-                }
-            ]
-        },
-        {
-            "name": "labels",
-            "mode": "REPEATED",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "key", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "value", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-            ]
-        },
-        {
-            "name": "system_labels",
-            "mode": "REPEATED",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "key", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "value", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-            ]
-        },
-        {
-            "name": "location",
-            "mode": "NULLABLE",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "location", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "country", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "region", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "zone", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-            ]
-        },
-        {
-            "name": "resource",
-            "mode": "NULLABLE",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "global_name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-            ]
-        },
-        {
-            "name": "tags",
-            "mode": "REPEATED",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "key", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "value", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "inherited", "mode": "NULLABLE", "type": "BOOLEAN", "description": "", "fields": []},
-                {"name": "namespace", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-            ]
-        },
-        {
-            "name": "cost",
-            "mode": "NULLABLE",
-            "type": "FLOAT",
-            "description": "",
-            "fields": []
-        },
-        {
-            "name": "currency",
-            "mode": "NULLABLE",
-            "type": "STRING",
-            "description": "",
-            "fields": []
-        },
-        {
-            "name": "usage",
-            "mode": "NULLABLE",
-            "type": "RECORD",
-            "description": "",
-            "fields": [
-                {"name": "amount", "mode": "NULLABLE", "type": "FLOAT", "description": "", "fields": []},
-                {"name": "unit", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
-                {"name": "amount_in_pricing_units", "mode": "NULLABLE", "type": "FLOAT", "description": "", "fields": []},
-                {"name": "pricing_unit", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
-            ]
-        }
-    ]
-    return json.dumps(sample_schema, indent=2)
-
-def generate_example_questions(schema):
-    prompt = f"""
-    Given the following JSON schema for a billing dataset:
-
-    {schema}
-
-    Generate three insightful questions that a user might ask about their billing data in Google Cloud. 
-    The questions should be diverse and cover different aspects of the schema.
-    Return only the questions, one per line, without any additional text or numbering.
-    """
-    response = vertex.sendPrompt(prompt, vertex.model_gemini_pro)
+    return json.dumps(SAMPLE_BILLING_SCHEMA, indent=2)
+
+def generate_example_questions(schema, use_cache=True):
+    response = vertex.sendPrompt(get_questions_prompt(compact_schema(schema)), vertex.model_gemini_pro, use_cache=use_cache)
     return [q.strip() for q in response.split('\n') if q.strip()]
 
+# Uploaded schemas are streamed from the file rather than decoded whole; the
+# file id keys the cache and the file object itself is not hashed.
+@st.cache_data(max_entries=4)
+def load_schema_summary(file_id, _uploaded_file):
+    return read_schema(_uploaded_file)
+
+@st.cache_data(max_entries=16)
+def load_schema_columns(file_id, names, _uploaded_file):
+    return select_columns(_uploaded_file, names)
+
+def render_uploaded_schema(uploaded_file):
+    # Summary, paged column list, single-column tree view and the selection of
+    # columns sent to the model. Returns the selected subset as JSON text.
+    summary = load_schema_summary(uploaded_file.file_id, uploaded_file)
+    columns = summary["columns"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Columns", len(columns))
+    col2.metric("Fields", summary["total_fields"])
+    col3.metric("Max depth", summary["max_depth"])
+    for error in summary["errors"]:
+        st.error(error)
+    if not columns:
+        return ""
+
+    names = [column["name"] for column in columns]
+    with st.expander("Browse schema"):
+        pages = (len(columns) - 1) // COLUMNS_PER_PAGE + 1
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+        st.dataframe(columns[(page - 1) * COLUMNS_PER_PAGE:page * COLUMNS_PER_PAGE], use_container_width=True)
+        inspected = st.selectbox("Inspect column:", names)
+        st.json(load_schema_columns(uploaded_file.file_id, (inspected,), uploaded_file), expanded=False)
+
+    selected = st.multiselect(
+        "Columns to send to the model:", names, default=names[:MAX_SELECTED_COLUMNS], key=f"columns-{uploaded_file.file_id}"
+    )
+    if len(selected) == len(names) and not summary["errors"] and uploaded_file.size <= LARGE_SCHEMA_BYTES:
+        return uploaded_file.getvalue().decode("utf-8")
+    return json.dumps(load_schema_columns(uploaded_file.file_id, tuple(selected), uploaded_file), indent=2)
+
+@st.cache_resource
+def load_question_cache():
+    return QuestionCache()
+
+def render_example_questions(fingerprint):
+    entry = question_cache.get(fingerprint)
+    if entry is not None and entry["status"] == "pending":
+        st.caption("Generating example questions...")
+        return
+    if entry is None:
+        # Dropped from the cache; the page rerun below requests it again.
+        st.caption("Generating example questions...")
+    elif entry["status"] == "error":
+        st.caption(f"Example questions unavailable: {entry['error']}")
+    else:
+        for question in entry["questions"]:
+            st.write("- " + question)
+    if st.session_state.get("questions_polling") == fingerprint:
+        # Finished (or dropped): rerun the page once so the fragment stops
+        # polling.
+        st.session_state.questions_polling = None
+        st.rerun()
+
 # Initialize session state variables
 if 'dataform_sql' not in st.session_state:
     st.session_state.dataform_sql = ""
-if 'example_questions' not in st.session_state:
-    st.session_state.example_questions = []
+question_cache = load_question_cache()
 
 st.header("Dataform ELT Generator :bar_chart:")
+use_cache = render_cache_controls(vertex.response_cache)
 st.markdown(" **Effortless BigQuery Table Deployment: Schema-to-SQLx-to-Terraform with Gemini**")
 st.markdown("Transform your ELT using BigQuery with table creation workflow with Gemini's AI-powered capabilities. \
 Simply provide your table schema, and Gemini will generate:")
@@ -200,41 +109,57 @@ schema_option = st.radio(
 if schema_option == "Upload your own schema":
     uploaded_file = st.file_uploader("Upload JSON schema file", type="json")
     if uploaded_file is not None:
-        schema = uploaded_file.getvalue().decode("utf-8")
+        schema = render_uploaded_schema(uploaded_file)
     else:
         schema = ""
 else:
+    uploaded_file = None
     schema = load_sample_schema()
 
-with st.expander("View/Edit Schema"):
-    schema = st.text_area("Schema (JSON format)", value=schema, height=400)
+# Large uploads are browsed and subset above instead of being round-tripped
+# through the text area.
+if uploaded_file is None or uploaded_file.size <= LARGE_SCHEMA_BYTES:
+    with st.expander("View/Edit Schema"):
+        schema = st.text_area("Schema (JSON format)", value=schema, height=400)
 
 # Step 2: Custom Question Input and Dataform SQL Generation
 st.subheader("Step 2: Generate Dataform SQL")
-st.write("Example Questions when using the Simple Billing Schema:")
+st.write("Example questions for this schema:")
 
-# Generate example questions only if they haven't been generated yet
-if not st.session_state.example_questions:
-    st.session_state.example_questions = generate_example_questions(schema)
-
-for question in st.session_state.example_questions:
-    st.write("- " + question)
+# Questions are generated in the background once per schema content and
+# refreshed only when the schema itself changes.
+fingerprint = schema_fingerprint(schema)
+if fingerprint is None:
+    st.caption("Provide a valid JSON schema to get example questions.")
+else:
+    entry = question_cache.request(
+        fingerprint, schema, lambda schema: generate_example_questions(schema, use_cache=use_cache)
+    )
+    pending = entry["status"] == "pending"
+    st.session_state.questions_polling = fingerprint if pending else None
+    st.fragment(run_every=1 if pending else None)(render_example_questions)(fingerprint)
 
 custom_question = st.text_input("Enter your question about the schema:")
 
 if st.button("Generate Dataform SQL"):
     with st.spinner("Generating Dataform SQL..."):
-        dataform_prompt = f"Given the following table schema in JSON format: \n{schema} \
+        # The schema is sent once, compacted, and referenced by the instructions.
+        dataform_prompt = f"{SCHEMA_NOTATION} \n{compact_schema(schema)}\n \
+        Given the table schema above, \
         generate a SQLx query for Dataform to answer the question: {custom_question} \
         generate a step-by-step guide to include the sqlx inside Dataform's paths i.e *definitions \
         Make the following assumptions: \
-        * Assume that the user is trying to generate an ELT using the {schema} that is not stored in Bigquery yet \
-        * Generate a step by step guide to conver the {schema} that is in JSON, to a CSV to be stored in a Bigquery table \
-        * Assume that the only table the user has is the {schema}, so do not include any JOIN \
+        * Assume that the user is trying to generate an ELT using the schema above that is not stored in Bigquery yet \
+        * Generate a step by step guide to conver the data described by the schema above, which is in JSON, to a CSV to be stored in a Bigquery table \
+        * Assume that the only table the user has is the one described by the schema above, so do not include any JOIN \
         * If the question involves filtering by date or time, assume the relevant column exists in the table from the schema provided and is named 'date' or 'timestamp' (choose the most appropriate one based on the schema).    "  
 
-        dataform_input = schema + "\n" + dataform_prompt
-        st.session_state.dataform_sql = vertex.sendPrompt(dataform_input, vertex.model_gemini_pro)
+        dataform_input = dataform_prompt
+        dataform_sql_placeholder = st.empty()
+        st.session_state.dataform_sql = dataform_sql_placeholder.write_stream(
+            vertex.streamPrompt(dataform_input, vertex.model_gemini_pro, use_cache=use_cache)
+        )
+        dataform_sql_placeholder.empty()
 
 if st.session_state.dataform_sql:
     with st.expander("View Generated Dataform SQL"):
@@ -289,10 +214,16 @@ if st.button("Generate Terraform"):
             
             """
             print(terraform_prompt)
-            terraform_response = vertex.sendPrompt(terraform_prompt, vertex.model_gemini_pro)
-
-            if terraform_response:
-                with st.expander("View Generated Terraform Code"):
-                    st.write(terraform_response, language="hcl")
-
-st.info("Note: The generated Dataform SQL and Terraform code are based on AI predictions and may require review and adjustments.")
\ No newline at end of file
+            with st.expander("View Generated Terraform Code", expanded=True):
+                terraform_response = st.write_stream(
+                    vertex.streamPrompt(terraform_prompt, vertex.model_gemini_pro, use_cache=use_cache)
+                )
+
+st.info("Note: The generated Dataform SQL and Terraform code are based on AI predictions and may require review and adjustments.")
+
+# Time-to-interactive: from the start of the script run until every widget has
+# been rendered, which no longer includes generating the example questions.
+if "time_to_interactive" not in st.session_state:
+    st.session_state.time_to_interactive = time.perf_counter() - page_start
+st.sidebar.caption(f"Time to interactive: {st.session_state.time_to_interactive * 1000:.0f} ms (first load), "
+                   f"{(time.perf_counter() - page_start) * 1000:.0f} ms (this run)")
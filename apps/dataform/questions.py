@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Schemas whose questions are kept; the least recently used are dropped.
+QUESTION_CACHE_ENTRIES = int(os.environ.get("DATAFORM_QUESTION_CACHE_ENTRIES", "256"))
+# A failed generation is retried on the next request after this long.
+RETRY_SECONDS = 30
+
+
+def schema_fingerprint(schema):
+    # Hash of the schema's JSON content, independent of formatting and key
+    # order. Returns None for an empty or invalid schema.
+    try:
+        parsed = json.loads(schema)
+    except (TypeError, ValueError):
+        return None
+    if not parsed:
+        return None
+    normalized = json.dumps(parsed, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def get_questions_prompt(schema):
+    return f"""
+    Given the following schema for a billing dataset:
+
+    {schema}
+
+    Generate three insightful questions that a user might ask about their billing data in Google Cloud.
+    The questions should be diverse and cover different aspects of the schema.
+    Return only the questions, one per line, without any additional text or numbering.
+    """
+
+
+class QuestionCache:
+    # Example questions per schema fingerprint, shared by all sessions. Each
+    # fingerprint is generated once, on a background thread, so pages render
+    # without waiting for the model.
+    def __init__(self, max_workers=2, max_entries=QUESTION_CACHE_ENTRIES, retry_seconds=RETRY_SECONDS):
+        self.max_entries = max_entries
+        self.retry_seconds = retry_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dataform-questions")
+
+    def get(self, fingerprint):
+        # Returns {"status": "pending" | "ready" | "error", "questions", "error", "seconds"},
+        # or None if the fingerprint was never requested or has been dropped.
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self._entries.move_to_end(fingerprint)
+            return entry
+
+    def request(self, fingerprint, schema, generate):
+        # Starts generate(schema) -> list of questions unless this fingerprint
+        # is already pending or ready. A failed generation is retried once it
+        # is older than `retry_seconds`.
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self._entries.move_to_end(fingerprint)
+                if entry["status"] != "error" or time.monotonic() - entry["finished"] < self.retry_seconds:
+                    return entry
+            entry = {"status": "pending", "questions": [], "error": None, "seconds": None, "finished": None}
+            self._entries[fingerprint] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._pool.submit(self._run, entry, schema, generate)
+        return entry
+
+    def _run(self, entry, schema, generate):
+        start = time.perf_counter()
+        try:
+            entry["questions"] = generate(schema)
+            entry["status"] = "ready"
+        except Exception as e:
+            entry["error"] = e
+            entry["status"] = "error"
+        entry["seconds"] = time.perf_counter() - start
+        entry["finished"] = time.monotonic()
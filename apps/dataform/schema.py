@@ -0,0 +1,265 @@
+import json
+import re
+
+# The Cloud Billing export schema, used as the page's sample.
+SAMPLE_BILLING_SCHEMA = [
+    {
+        "name": "billing_account_id",
+        "mode": "NULLABLE",
+        "type": "STRING",
+        "description": "",
+        "fields": []
+    },
+    {
+        "name": "service",
+        "mode": "NULLABLE",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "id", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "description", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+        ]
+    },
+    {
+        "name": "sku",
+        "mode": "NULLABLE",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "id", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "description", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+        ]
+    },
+    {
+        "name": "usage_start_time",
+        "mode": "NULLABLE",
+        "type": "TIMESTAMP",
+        "description": "",
+        "fields": []
+    },
+    {
+        "name": "usage_end_time",
+        "mode": "NULLABLE",
+        "type": "TIMESTAMP",
+        "description": "",
+        "fields": []
+    },
+    {
+        "name": "project",
+        "mode": "NULLABLE",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "id", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "number", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {
+                "name": "labels",
+                "mode": "REPEATED",
+                "type": "RECORD",
+                "description": "",
+                "fields": [
+                    {"name": "key", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+                    {"name": "value", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+                ]
+            },
+            {"name": "ancestry_numbers", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {
+                "name": "ancestors",
+                "mode": "REPEATED",
+                "type": "RECORD",
+                "description": "",
+                "fields": [
+                    {"name": "resource_name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+                    {"name": "display_name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+                ]
+            }
+        ]
+    },
+    {
+        "name": "labels",
+        "mode": "REPEATED",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "key", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "value", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+        ]
+    },
+    {
+        "name": "system_labels",
+        "mode": "REPEATED",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "key", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "value", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+        ]
+    },
+    {
+        "name": "location",
+        "mode": "NULLABLE",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "location", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "country", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "region", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "zone", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+        ]
+    },
+    {
+        "name": "resource",
+        "mode": "NULLABLE",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "global_name", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+        ]
+    },
+    {
+        "name": "tags",
+        "mode": "REPEATED",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "key", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "value", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "inherited", "mode": "NULLABLE", "type": "BOOLEAN", "description": "", "fields": []},
+            {"name": "namespace", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+        ]
+    },
+    {
+        "name": "cost",
+        "mode": "NULLABLE",
+        "type": "FLOAT",
+        "description": "",
+        "fields": []
+    },
+    {
+        "name": "currency",
+        "mode": "NULLABLE",
+        "type": "STRING",
+        "description": "",
+        "fields": []
+    },
+    {
+        "name": "usage",
+        "mode": "NULLABLE",
+        "type": "RECORD",
+        "description": "",
+        "fields": [
+            {"name": "amount", "mode": "NULLABLE", "type": "FLOAT", "description": "", "fields": []},
+            {"name": "unit", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []},
+            {"name": "amount_in_pricing_units", "mode": "NULLABLE", "type": "FLOAT", "description": "", "fields": []},
+            {"name": "pricing_unit", "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+        ]
+    }
+]
+
+_DEFAULTS = {"mode": "NULLABLE", "description": "", "fields": []}
+
+
+def _fields(schema):
+    # Accepts a list of fields, {"fields": [...]} or {"schema": {"fields": [...]}}.
+    if isinstance(schema, dict):
+        schema = schema.get("schema", schema)
+        schema = schema.get("fields", []) if isinstance(schema, dict) else schema
+    return schema or []
+
+
+def _is_field_list(fields):
+    return isinstance(fields, list) and all(
+        isinstance(field, dict) and (not field.get("fields") or _is_field_list(field["fields"])) for field in fields
+    )
+
+
+def _type_name(field_name, taken):
+    base = "".join(part.capitalize() for part in re.split(r"[^A-Za-z0-9]+", field_name) if part) or "Record"
+    name, i = base, 2
+    while name in taken:
+        name, i = f"{base}{i}", i + 1
+    taken.add(name)
+    return name
+
+
+class _Compactor:
+    # RECORD structures that occur more than once are written once as a named
+    # TYPE and referenced by name everywhere else.
+    def __init__(self, fields):
+        self.counts = {}
+        self.names = {}
+        self.definitions = []
+        self._count(fields)
+
+    def _signature(self, fields):
+        return json.dumps(
+            [
+                [f.get("name"), f.get("type"), f.get("mode", "NULLABLE"), f.get("description", ""),
+                 self._signature(f.get("fields") or [])]
+                for f in fields
+            ]
+        )
+
+    def _count(self, fields):
+        for field in fields:
+            if field.get("fields"):
+                signature = self._signature(field["fields"])
+                self.counts[signature] = self.counts.get(signature, 0) + 1
+                self._count(field["fields"])
+
+    def column(self, field):
+        data_type = self.data_type(field)
+        if field.get("mode") == "REPEATED":
+            data_type = f"ARRAY<{data_type}>"
+        column = f"{field.get('name')} {data_type}"
+        if field.get("mode") == "REQUIRED":
+            column += " NOT NULL"
+        if field.get("description"):
+            column += f" OPTIONS(description={json.dumps(field['description'], ensure_ascii=False)})"
+        # Any other non-default attribute (e.g. policyTags) is kept verbatim.
+        extra = {
+            k: v for k, v in field.items()
+            if k not in ("name", "type", "mode", "description", "fields") and v not in (None, "", [], {})
+        }
+        if extra:
+            column += f" {json.dumps(extra, sort_keys=True, separators=(',', ':'), ensure_ascii=False)}"
+        return column
+
+    def data_type(self, field):
+        if field.get("type") not in ("RECORD", "STRUCT") or not field.get("fields"):
+            return field.get("type", "STRING")
+        signature = self._signature(field["fields"])
+        struct = f"STRUCT<{', '.join(self.column(f) for f in field['fields'])}>"
+        if self.counts.get(signature, 0) < 2:
+            return struct
+        if signature not in self.names:
+            self.names[signature] = _type_name(field.get("name", ""), set(self.names.values()))
+            self.definitions.append(f"TYPE {self.names[signature]} = {struct};")
+        return self.names[signature]
+
+
+def compact_schema(schema):
+    # Turns a BigQuery JSON schema (text or parsed) into a compact DDL-like
+    # form without default attributes. Input that isn't valid JSON, isn't a
+    # list of fields or has no fields is returned unchanged.
+    parsed = schema
+    if isinstance(schema, str):
+        try:
+            parsed = json.loads(schema)
+        except ValueError:
+            return schema
+    fields = _fields(parsed)
+    if not fields or not _is_field_list(fields):
+        return schema
+    compactor = _Compactor(fields)
+    columns = [f"  {compactor.column(field)}" for field in fields]
+    lines = compactor.definitions + ["TABLE ("] + [",\n".join(columns)] + [")"]
+    return "\n".join(lines)
+
+
+SCHEMA_NOTATION = (
+    "The table schema is given in BigQuery DDL notation: ARRAY<...> columns are REPEATED, "
+    "STRUCT<...> columns are RECORDs, and each TYPE line names a STRUCT that is used more than once."
+)
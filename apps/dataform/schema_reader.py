@@ -0,0 +1,84 @@
+from collections import Counter
+
+import ijson
+
+# Uploaded schemas above this size are summarized instead of being shown in
+# the text area.
+LARGE_SCHEMA_BYTES = 256 * 1024
+MAX_ERRORS = 20
+
+
+def _columns_prefix(file):
+    # Where the list of top-level fields is: a bare list, {"fields": [...]} or
+    # {"schema": {"fields": [...]}} (the `bq show --format=json` layout).
+    file.seek(0)
+    for prefix, event, value in ijson.parse(file):
+        if event == "start_array" and prefix == "":
+            return "item"
+        if event == "map_key" and prefix == "" and value == "fields":
+            return "fields.item"
+        if event == "map_key" and prefix == "schema" and value == "fields":
+            return "schema.fields.item"
+    raise ValueError("No list of schema fields found")
+
+
+def iter_columns(file):
+    # Yields the top-level columns one at a time; only one column's subtree is
+    # in memory at once.
+    prefix = _columns_prefix(file)
+    file.seek(0)
+    yield from ijson.items(file, prefix, use_float=True)
+
+
+def _walk(field, path, depth, summary):
+    # Returns (nested field count, depth) of `field`, validating it on the way.
+    if not isinstance(field, dict) or not field.get("name") or not field.get("type"):
+        if len(summary["errors"]) < MAX_ERRORS:
+            summary["errors"].append(f"{path or '(root)'}: every field needs a name and a type")
+        return 0, depth
+    summary["types"][field["type"]] += 1
+    summary["total_fields"] += 1
+    nested, max_depth = 0, depth
+    for child in field.get("fields") or []:
+        child_nested, child_depth = _walk(child, f"{path}.{child.get('name') if isinstance(child, dict) else '?'}",
+                                          depth + 1, summary)
+        nested += 1 + child_nested
+        max_depth = max(max_depth, child_depth)
+    return nested, max_depth
+
+
+def read_schema(file):
+    # Validates a JSON schema file and summarizes it without loading it whole:
+    # {"columns": [{"name", "type", "mode", "nested_fields", "depth"}],
+    #  "total_fields", "max_depth", "types", "errors"}.
+    summary = {"columns": [], "total_fields": 0, "max_depth": 0, "types": Counter(), "errors": []}
+    try:
+        for i, column in enumerate(iter_columns(file)):
+            name = column.get("name") if isinstance(column, dict) else None
+            nested, depth = _walk(column, name or f"[{i}]", 1, summary)
+            summary["max_depth"] = max(summary["max_depth"], depth)
+            if name:
+                summary["columns"].append({
+                    "name": name,
+                    "type": column.get("type"),
+                    "mode": column.get("mode", "NULLABLE"),
+                    "nested_fields": nested,
+                    "depth": depth,
+                })
+    except (ijson.JSONError, ValueError) as e:
+        summary["errors"].append(f"Invalid JSON schema: {e}")
+    return summary
+
+
+def select_columns(file, names):
+    # The subtrees of the named top-level columns, in file order. A malformed
+    # file yields the columns parsed before the error; read_schema reports it.
+    names = set(names)
+    selected = []
+    try:
+        for column in iter_columns(file):
+            if isinstance(column, dict) and column.get("name") in names:
+                selected.append(column)
+    except (ijson.JSONError, ValueError):
+        pass
+    return selected
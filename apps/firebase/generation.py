@@ -1,5 +1,5 @@
 import streamlit as st
-from vertexai.generative_models import Part
+from utils_video import video_request
 import os
 import json
 
@@ -20,7 +20,7 @@ def get_gemini_pro_response(model, prompt, generation_config={}):
             yield chunk.text
     return "".join(full_response)
 
-def generate_video_description(use_case, language, selected_video_uri, multimodal_model_pro):
+def generate_video_description(use_case, language, selected_video_uri, multimodal_model_pro, keyframes=None):
     if st.button("Generate Video Description", key="generate_video_description", disabled=st.session_state.get('video_description_status') == "Running"):
         st.session_state['video_description_status'] = "Running"
         
@@ -28,14 +28,14 @@ def generate_video_description(use_case, language, selected_video_uri, multimoda
         video_description_prompt = video_description_prompt.format(language=language, use_case=use_case)
         
         with st.spinner("Generating Video Description..."):
-            video_part = Part.from_uri(selected_video_uri, mime_type="video/mp4")
+            video_model, video_input = video_request(multimodal_model_pro, selected_video_uri, keyframes)
             video_description_response = ""
-            for chunk in get_gemini_pro_response(multimodal_model_pro, [video_description_prompt, video_part]):
+            for chunk in get_gemini_pro_response(video_model, [video_description_prompt, *video_input]):
                 video_description_response += chunk
             st.session_state['video_description'] = video_description_response
         st.session_state['video_description_status'] = "Completed"
 
-def generate_robo_script(use_case, language, selected_video_uri, multimodal_model_pro):
+def generate_robo_script(use_case, language, selected_video_uri, multimodal_model_pro, keyframes=None):
     if st.button("Generate Robo Script", key="generate_robo_script", disabled=st.session_state.get('robo_script_status') == "Running"):
         st.session_state['robo_script_status'] = "Running"
         
@@ -52,9 +52,9 @@ def generate_robo_script(use_case, language, selected_video_uri, multimodal_mode
         )
         
         with st.spinner("Generating Robo Script..."):
-            video_part = Part.from_uri(selected_video_uri, mime_type="video/mp4")
+            video_model, video_input = video_request(multimodal_model_pro, selected_video_uri, keyframes)
             robo_script_response = ""
-            for chunk in get_gemini_pro_response(multimodal_model_pro, [robo_script_prompt, video_part]):
+            for chunk in get_gemini_pro_response(video_model, [robo_script_prompt, *video_input]):
                 robo_script_response += chunk
             st.session_state['robo_script'] = robo_script_response
         st.session_state['robo_script_status'] = "Completed"
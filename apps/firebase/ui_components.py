@@ -1,4 +1,5 @@
 import streamlit as st
+from utils_streamlit import render_keyframe_toggle
 from apps.firebase.generation import generate_video_description, generate_robo_script, generate_test_execution_script
 
 def render_custom_css():
@@ -103,6 +104,7 @@ def render_video_analysis_section(video_url, use_case, language, selected_video_
     with col1:
         st.subheader("User Interaction Video")
         st.video(video_url)
+        keyframes = render_keyframe_toggle(selected_video_uri)
     
         # Status indicators
         st.subheader("📊 Generation Status")
@@ -127,12 +129,12 @@ def render_video_analysis_section(video_url, use_case, language, selected_video_
         tab1, tab2, tab3 = st.tabs(["📝 Video Description", "🔧 Robo Script", "🚀 Test Execution"])
         
         with tab1:
-            generate_video_description(use_case, language, selected_video_uri, multimodal_model_pro)
+            generate_video_description(use_case, language, selected_video_uri, multimodal_model_pro, keyframes)
             if st.session_state.get('video_description'):
                 st.markdown(st.session_state['video_description'])
         
         with tab2:
-            generate_robo_script(use_case, language, selected_video_uri, multimodal_model_pro)
+            generate_robo_script(use_case, language, selected_video_uri, multimodal_model_pro, keyframes)
             if st.session_state.get('robo_script'):
                 st.write(st.session_state['robo_script'])
         
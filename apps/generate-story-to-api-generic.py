@@ -1,109 +1,14 @@
 import streamlit as st
-from utils_vertex import sendPrompt, model_experimental, model_gemini_pro_15, model_gemini_flash
-from utils_streamlit import reset_st_state
-
-def load_models(model_name):
-    if model_name == "gemini-experimental":
-        return model_experimental
-    elif model_name == "gemini-1.5-pro-001":
-        return model_gemini_pro_15
-    else:
-        return model_gemini_flash
-
-def load_questions(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read().splitlines()
-    except FileNotFoundError:
-        st.warning(f"File not found: {file_path}. Falling back to English version.")
-        # Fallback to English version
-        english_file_path = file_path.replace('-es.txt', '-en.txt').replace('-pt.txt', '-en.txt')
-        with open(english_file_path, 'r', encoding='utf-8') as f:
-            return f.read().splitlines()
-
-if 'results' not in st.session_state:
-    st.session_state['results'] = []
-
-if st.button("Reset Demo State", key="reset_button"):
-    reset_st_state()
-    st.session_state['results'] = []
-
-st.title("User Story to API 🔌")
-
-# Initialize button states in session state if not already present
-if 'button_states' not in st.session_state:
-    st.session_state.button_states = {
-        'generate_story': False,
-        'generate_tasks': False,
-        'generate_openapi': False,
-        'generate_apigee': False
-    }
-
-def create_button_with_status(label, key, disabled=False):
-    col1, col2 = st.columns([3, 1])
-    with col1:
-        clicked = st.button(label, key=key, disabled=disabled)
-    with col2:
-        # Simplify status display
-        if st.session_state.button_states.get(key, False):
-            st.markdown(':green[Done]')
-        else:
-            st.markdown(':blue[ ]')
-    return clicked
-
-def update_button_state(button_key):
-    st.session_state.button_states[button_key] = True
-
-col1, col2 = st.columns([1, 2])
-
-with col1:
-    st.subheader("Configuration")
-    model_name = st.radio(
-        "Model:",
-        ["gemini-experimental", "gemini-1.5-pro-001", "gemini-1.5-flash-001"],
-        captions=["Gemini Pro Experimental", "Gemini Pro 1.5", "Gemini Flash 1.5"],
-        key="model_name",
-        index=0,
-        horizontal=True
-    )
-
-    model = load_models(model_name)
-
-    selected_category = st.radio(
-        "Select Industry:",
-        ["retail", "energy", "health", "finance", "beauty"],
-        key="category"
-    )
-
-    story_lang = st.radio(
-        "Select language for story generation:",
-        ["English", "Portuguese", "Spanish"],
-        key="story_lang",
-        horizontal=True,
-    )
-
-    # Map selected language to file suffix
-    lang_suffix = {
-        "English": "en",
-        "Portuguese": "pt",
-        "Spanish": "es"
-    }
-
-    QUESTIONS_FILE = f"./data/{selected_category}-{lang_suffix[story_lang]}.txt"
-    questions = load_questions(QUESTIONS_FILE)
-
-    persona_name = st.text_input("Persona:", key="persona_name", value="Breno Cabral")
-
-with col2:
-    selected_index = st.selectbox('Select a theme:', 
-                                  range(len(questions)), 
-                                  format_func=lambda i: questions[i], 
-                                  key="user_story")
-    st.subheader("User Theme")
-    user_story = st.text_area("Edit your theme:", value=questions[selected_index], height=200)
-
-    if create_button_with_status("1. Generate my story", "generate_story"):
-        prompt = f"""Write a User story based on the following premise:
+from utils_vertex import streamPrompt, response_cache
+from utils_models import get_model
+from apps.stories.catalog import INDUSTRIES, LANGUAGES, theme_catalog
+from apps.stories.pipeline import StepPipeline, step
+from utils_streamlit import reset_st_state, render_cache_controls, render_pipeline
+
+# Prompts read the page inputs (persona_name, user_story, story_lang) and
+# the outputs of the stages they depend on.
+def story_prompt(outputs):
+    return f"""Write a User story based on the following premise:
         persona_name: {persona_name}
         user_story: {user_story}
         First start by giving the user Story a Summary: [concise, memorable, human-readable story title] 
@@ -128,43 +33,17 @@ with col2:
         All the answers are required to be in {story_lang} and to stick to the persona. 
         """
 
-        with st.spinner("Generating your story using Gemini ..."):
-            responseStory = sendPrompt(prompt, model)
-            if responseStory:
-                st.session_state['results'].append(("User Story", responseStory, prompt))
-                update_button_state('generate_story')
-                st.rerun()
-
-    if create_button_with_status("2. Generate tasks from user story", "generate_tasks", 
-                                 disabled=not st.session_state.button_states.get('generate_story', False)):
-        if st.session_state['results']:
-            last_story = next((result for result in reversed(st.session_state['results']) if result[0] == "User Story"), None)
-            if last_story:
-                promptTasks = f"""All the answers are required to be in {story_lang} and to stick to the persona. 
+def tasks_prompt(outputs):
+    return f"""All the answers are required to be in {story_lang} and to stick to the persona. 
                 Divide the user story into tasks as granular as possible. 
                 The goal of fragmenting a user story is to create a list of tasks that can be completed within a sprint. 
                 Therefore, it is important to break down the story into minimal tasks that still add value to the end user. 
                 This facilitates progress tracking and ensures that the team stays on track.
                 Create a table with the tasks as the table index with the task description. 
-                """ + last_story[1]
-
-                with st.spinner("Generating your tasks using Gemini Pro ..."):
-                    responseTasks = sendPrompt(promptTasks, model)
-                    if responseTasks:
-                        st.session_state['results'].append(("Tasks", responseTasks, promptTasks))
-                        update_button_state('generate_tasks')
-                        st.rerun()
-            else:
-                st.warning("Please generate a user story first.")
-        else:
-            st.warning("Please generate a user story first.")
-
-    if create_button_with_status("3. Create OpenAPI Specs", "generate_openapi", 
-                                 disabled=not st.session_state.button_states.get('generate_tasks', False)):
-        if st.session_state['results']:
-            last_tasks = next((result for result in reversed(st.session_state['results']) if result[0] == "Tasks"), None)
-            if last_tasks:
-                promptOpenAPI = f"""
+                """ + outputs["story"]
+
+def openapi_prompt(outputs):
+    return f"""
                     All the answers are required to be in {story_lang}.
                     
                     Instruções para o Modelo:
@@ -213,26 +92,10 @@ with col2:
                     Gere uma especificação OpenAPI 3.0 em formato YAML para uma API de consulta de dados de vendas no varejo
 
                     Dados:
-                """ + last_tasks[1]
-
-                with st.spinner("Generating your OpenAPI Specs using Gemini..."):
-                    responseOpenAPI = sendPrompt(promptOpenAPI, model)
-                    if responseOpenAPI:
-                        st.session_state['results'].append(("OpenAPI Specs", responseOpenAPI, promptOpenAPI))
-                        update_button_state('generate_openapi')
-                        st.rerun()
-
-            else:
-                st.warning("Please generate tasks first.")
-        else:
-            st.warning("Please generate a user story and tasks first.")
-
-    if create_button_with_status("4. Create Apigee Implementation", "generate_apigee", 
-                                 disabled=not st.session_state.button_states.get('generate_openapi', False)):
-        if st.session_state['results']:
-            last_openapi = next((result for result in reversed(st.session_state['results']) if result[0] == "OpenAPI Specs"), None)
-            if last_openapi:
-                promptApigee = f"""All the answers are required to be in {story_lang}. 
+                """ + outputs["tasks"]
+
+def apigee_prompt(outputs):
+    return f"""All the answers are required to be in {story_lang}. 
                     Instruções para Criação do Proxy no Apigee X:
 
                     Exporte a Especificação OpenAPI:
@@ -254,25 +117,80 @@ with col2:
                     A especificação OpenAPI deve estar em um formato YAML válido e compatível com o Apigee X.
                     Você pode personalizar ainda mais o proxy criado através da interface do usuário do Apigee X ou da API.
                     Dados:
-                """ + last_openapi[1]
+                """ + outputs["openapi"]
+
+pipeline = StepPipeline([
+    step("story", "User Story", story_prompt),
+    step("tasks", "Tasks", tasks_prompt, after=["story"]),
+    step("openapi", "OpenAPI Specs", openapi_prompt, after=["tasks"]),
+    step("apigee", "Apigee Snippets", apigee_prompt, after=["openapi"]),
+])
+
+if 'story_to_api_pipeline' not in st.session_state:
+    st.session_state['story_to_api_pipeline'] = {}
+
+if st.button("Reset Demo State", key="reset_button"):
+    reset_st_state()
+    st.session_state['story_to_api_pipeline'] = {}
+
+
+st.title("User Story to API 🔌")
+use_cache = render_cache_controls(response_cache)
+
+col1, col2 = st.columns([1, 2])
+
+with col1:
+    st.subheader("Configuration")
+    model_name = st.radio(
+        "Model:",
+        ["gemini-experimental", "gemini-1.5-pro-001", "gemini-1.5-flash-001"],
+        captions=["Gemini Pro Experimental", "Gemini Pro 1.5", "Gemini Flash 1.5"],
+        key="model_name",
+        index=0,
+        horizontal=True
+    )
+
+    model = get_model(model_name)
 
-                with st.spinner("Generating your Apigee implementation using Gemini..."):
-                    responseApigee = sendPrompt(promptApigee, model)
-                    if responseApigee:
-                        st.session_state['results'].append(("Apigee Snippets", responseApigee, promptApigee))
-                        update_button_state('generate_apigee')
-                        st.rerun()
+    selected_category = st.radio(
+        "Select Industry:",
+        INDUSTRIES,
+        key="category"
+    )
+
+    story_lang = st.radio(
+        "Select language for story generation:",
+        ["English", "Portuguese", "Spanish"],
+        key="story_lang",
+        horizontal=True,
+    )
+
+    # Themes are served from the in-memory catalog; it falls back to English
+    # when an industry has no file for the selected language.
+    themes = theme_catalog.themes(selected_category, LANGUAGES[story_lang])
+    if themes and themes[0]["lang"] != LANGUAGES[story_lang]:
+        st.warning(f"No {story_lang} themes for {selected_category}. Falling back to English version.")
+    questions = [theme["raw"] for theme in themes]
+
+    persona_name = st.text_input("Persona:", key="persona_name", value="Breno Cabral")
+
+with col2:
+    selected_index = st.selectbox('Select a theme:', 
+                                  range(len(questions)), 
+                                  format_func=lambda i: questions[i], 
+                                  key="user_story")
+    st.subheader("User Theme")
+    user_story = st.text_area("Edit your theme:", value=questions[selected_index], height=200)
 
-            else:
-                st.warning("Please create OpenAPI Specs first.")
-        else:
-            st.warning("Please generate a user story, tasks, and OpenAPI Specs first.")
+    run_pipeline = st.button("Generate story, tasks, OpenAPI specs and Apigee implementation", key="run_pipeline", type="primary")
+    st.caption("Stages run in order and stream below; a stage whose inputs have not changed is reused while caching is on.")
 
-# Display all results
 st.subheader("Results")
-for result_type, result_content, prompt in reversed(st.session_state['results']):
-    with st.expander(f"{result_type} - Click to expand/collapse"):
-        st.markdown("### Generated Content")
-        st.markdown(result_content)
-        st.markdown("### Prompt Used")
-        st.code(prompt, language="markdown")
\ No newline at end of file
+render_pipeline(
+    pipeline,
+    lambda prompt: streamPrompt(prompt, model, use_cache=use_cache),
+    st.session_state['story_to_api_pipeline'],
+    run=run_pipeline,
+    salt=(model_name,),
+    reuse=use_cache,
+)
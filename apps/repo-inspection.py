@@ -1,27 +1,23 @@
 import streamlit as st
 import time
-import re
-import vertexai
-import os
-import shutil
-from pathlib import Path
-import git
-import magika
-from vertexai.generative_models import GenerativeModel
 import vertexai.preview.generative_models as generative_models
 import pandas as pd
+from utils_models import get_model, init_vertex
+from utils_tokens import TokenLimitError, check_token_limit, count_prompt, estimate_cost, estimate_tokens
+from apps.repo_inspection.context_cache import (
+    generate_with_cache, get_code_prefix, get_context_cache, get_question_suffix,
+)
+from apps.repo_inspection.indexing import index_repo
+from apps.repo_inspection.mapreduce import map_reduce
+from apps.repo_inspection.report import build_report, stream_concurrently
+from apps.repo_inspection.retrieval import get_embedder, get_retrieval_index, get_retrieval_prompt
 
-# Initialize Vertex AI
-PROJECT_ID = os.environ.get('GCP_PROJECT')
-LOCATION = os.environ.get('GCP_REGION')
-vertexai.init(project=PROJECT_ID, location=LOCATION)
-
-# Initialize Magika
-m = magika.Magika()
+# Initialize Vertex AI (once per process)
+init_vertex()
 
 # Constants
 MODEL_ID = "gemini-1.5-flash-002"
-REPO_DIR = "./repo"
+TOKEN_LIMIT = 2000000
 
 # Safety settings
 safety_settings = {
@@ -31,6 +27,12 @@ safety_settings = {
     generative_models.HarmCategory.HARM_CATEGORY_HARASSMENT: generative_models.HarmBlockThreshold.BLOCK_NONE,
 }
 
+generation_config = {
+    "max_output_tokens": 8192,
+    "temperature": 0.4,
+    "top_p": 1
+}
+
 st.markdown("""
     <style>
     .stVideo {
@@ -41,79 +43,66 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 # Initialize Gemini model
-model = GenerativeModel(MODEL_ID, safety_settings=safety_settings)
+model = get_model(MODEL_ID, safety_settings=safety_settings)
 
 # Helper functions
-def stream_prompt(input):
-    token_size = model.count_tokens(input)
-    total_tokens = int(re.search(r"total_tokens:\s*(\d+)", str(token_size)).group(1))
-    if total_tokens > 2000000:
-        raise ValueError("Total tokens must be less than 2000000")
-
-    billable_characters = int(re.search(r"total_billable_characters:\s*(\d+)", str(token_size)).group(1))
-    cost = (billable_characters / 1000) * 0.0025
+def stream_prompt(input, exact_count=False):
+    total_tokens, billable_characters = count_prompt(model, input, exact=exact_count)
+    check_token_limit(total_tokens, TOKEN_LIMIT)
+    cost = estimate_cost(billable_characters)
 
     response = model.generate_content(
         input,
-        generation_config={
-            "max_output_tokens": 8192,
-            "temperature": 0.4,
-            "top_p": 1
-        },
+        generation_config=generation_config,
         safety_settings=safety_settings,
         stream=True,
     )
     return response, cost
 
-def get_code_prompt(question, code_index, code_text):
-    return f"""
-    Task: {question}
-
-    Context:
-    - You are an expert code analyzer and technical writer.
-    - The entire codebase is provided below.
-    - Here is an index of all the files in the codebase:
-      \n\n{code_index}\n\n
-    - The content of each file is concatenated below:
-      \n\n{code_text}\n\n
-
-    Instructions:
-    1. Carefully analyze the provided codebase.
-    2. Focus on addressing the specific task or question given.
-    3. Provide a comprehensive and well-structured response.
-    4. Use markdown formatting to enhance readability.
-    5. If relevant, include code snippets or examples from the codebase.
-    6. Ensure your analysis is accurate, insightful, and actionable.
-
-    Response:
-    """
-
-def clone_repo(repo_url, repo_dir):
-    if os.path.exists(repo_dir):
-        shutil.rmtree(repo_dir)
-    os.makedirs(repo_dir)
-    git.Repo.clone_from(repo_url, repo_dir)
-    return True
-
-def extract_code(repo_dir):
-    code_index = []
-    code_text = ""
-    for root, _, files in os.walk(repo_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, repo_dir)
-            code_index.append(relative_path)
-
-            file_type = m.identify_path(Path(file_path))
-            if file_type.output.group in ("text", "code"):
-                try:
-                    with open(file_path, "r") as f:
-                        code_text += f"----- File: {relative_path} -----\n"
-                        code_text += f.read()
-                        code_text += "\n-------------------------\n"
-                except Exception:
-                    pass
-    return code_index, code_text
+def check_corpus_size(corpus):
+    # The running estimate only rules out corpora far past the limit, without
+    # tokenizing them; whether a prompt fits is decided by stream_prompt's own
+    # count of the full prompt, index included.
+    if corpus.total_tokens > 2 * TOKEN_LIMIT:
+        raise TokenLimitError(f"Total tokens must be less than {TOKEN_LIMIT}")
+
+@st.cache_resource
+def load_context_cache():
+    # Shared by all sessions, so every analysis of a commit reuses one cached prefix.
+    return get_context_cache(MODEL_ID, model)
+
+def run_map_reduce(question, code_index, corpus, chunk_tokens, max_workers):
+    progress = st.progress(0.0, text="Splitting repository into chunks...")
+    partials_container = st.container()
+    total = done = 0
+    final_prompt, cost = None, 0.0
+    events = map_reduce(
+        model, question, code_index, corpus.sections(), chunk_tokens, max_workers,
+        generation_config=generation_config, safety_settings=safety_settings,
+    )
+    for event in events:
+        if event[0] == "chunks":
+            total = event[1]
+        elif event[0] == "partial":
+            done += 1
+            progress.progress(done / total, text=f"Analyzed chunk {done}/{total}")
+            with partials_container.expander(f"Partial analysis: chunk {event[1] + 1}/{total}"):
+                st.markdown(event[2])
+        elif event[0] == "error":
+            done += 1
+            progress.progress(done / total, text=f"Analyzed chunk {done}/{total}")
+            partials_container.warning(f"Chunk {event[1] + 1} failed: {event[2]}")
+        elif event[0] == "reduce":
+            progress.progress(1.0, text=f"Merging partial analyses (round {event[1]}, {event[2]} groups)...")
+        elif event[0] == "reduce_error":
+            partials_container.warning(f"Merging group {event[2] + 1} in round {event[1]} failed: {event[3]}")
+        elif event[0] == "prompt":
+            final_prompt, cost = event[1], event[2]
+        elif event[0] == "failed":
+            cost = event[2]
+            st.error(f"Map-reduce analysis failed: {event[1]}")
+    progress.empty()
+    return final_prompt, cost
 
 
 st.title("Gemini Repo Inspection")
@@ -128,6 +117,10 @@ if 'analyses' not in st.session_state:
     st.session_state.analyses = []
 if 'costs' not in st.session_state:
     st.session_state.costs = []
+if 'latencies' not in st.session_state:
+    st.session_state.latencies = []
+if 'clone_runs' not in st.session_state:
+    st.session_state.clone_runs = []
 
 # Two-column layout
 col1, col2 = st.columns([4, 6])
@@ -137,14 +130,56 @@ with col1:
     st.header("Step 1: Repository Input", divider="gray")
     repo_url = st.text_input("Enter a GitHub repository URL:", "https://github.com/GoogleCloudPlatform/microservices-demo")
 
+    with st.expander("Clone options"):
+        clone_mode = st.radio(
+            "History:",
+            ["Full history", "Shallow (depth 1)"],
+            horizontal=True,
+        )
+        single_branch = st.checkbox("Default branch only", value=True)
+        blob_limit_kb = st.number_input("Skip files larger than (KB, 0 = no limit):", min_value=0, value=0, step=256)
+        include_globs = st.text_input("Include globs (comma-separated):", placeholder="src/**, *.md")
+        exclude_globs = st.text_input("Exclude globs (comma-separated):", placeholder="vendor/**, *.min.js")
+
+    clone_options = {}
+    if clone_mode == "Shallow (depth 1)":
+        clone_options["depth"] = 1
+    if single_branch:
+        clone_options["single_branch"] = True
+    if blob_limit_kb:
+        clone_options["blob_limit"] = f"{blob_limit_kb}k"
+    if include_globs.strip():
+        clone_options["include"] = [g.strip() for g in include_globs.split(",") if g.strip()]
+    if exclude_globs.strip():
+        clone_options["exclude"] = [g.strip() for g in exclude_globs.split(",") if g.strip()]
+
+    build_retrieval = st.checkbox("Build retrieval index (embeddings) while indexing", value=False)
+
     if st.button("Clone and Index Repository"):
         with st.spinner("Cloning and indexing repository..."):
-            clone_success = clone_repo(repo_url, REPO_DIR)
-            if clone_success:
-                code_index, code_text = extract_code(REPO_DIR)
-                st.session_state["index"] = code_index
-                st.session_state["text"] = code_text
-                st.success("Repository cloned and indexed successfully!")
+            start_time = time.time()
+            code_index, corpus, index_stats = index_repo(repo_url, clone_options=clone_options)
+            st.session_state["index"] = code_index
+            st.session_state["corpus"] = corpus
+            st.session_state["repo_key"] = index_stats["repo_key"]
+            st.session_state["commit"] = index_stats["commit"]
+            if build_retrieval:
+                get_retrieval_index(index_stats["repo_key"], index_stats["commit"], corpus, get_embedder())
+            st.success(
+                f"Repository indexed at commit {index_stats['commit'][:8]} in {time.time() - start_time:.1f}s "
+                f"({index_stats['mode']}: {index_stats['reindexed']} of {index_stats['files']} files re-indexed)."
+            )
+            st.caption(f"Corpus: {len(corpus)} text files, {corpus.total_bytes / 1024 / 1024:.1f} MB, ~{corpus.total_tokens:,} tokens")
+            st.session_state.clone_runs.append({
+                "Options": ", ".join(f"{k}={v}" for k, v in clone_options.items()) or "full clone",
+                "Index mode": index_stats["mode"],
+                "Transferred (MB)": round(index_stats["bytes_transferred"] / 1024 / 1024, 2),
+                "Clone time (s)": round(index_stats["clone_seconds"], 2),
+                "Files": index_stats["files"],
+            })
+
+    if st.session_state.clone_runs:
+        st.dataframe(pd.DataFrame(st.session_state.clone_runs), use_container_width=True)
 
     # Step 2: Analysis Selection
     st.header("Step 2: Choose and Generate Analysis", divider="gray")
@@ -165,13 +200,89 @@ with col1:
     else:
         custom_prompt = st.text_area("Enter your custom analysis prompt:", height=100)
 
+    exact_count = st.checkbox("Exact token count (adds a count_tokens call before generation)", value=False)
+
+    analysis_mode = st.radio(
+        "Analysis mode:",
+        ["Single prompt", "Map-reduce", "Retrieval"],
+        captions=[
+            "Whole repository in one request",
+            "Chunked analysis for repositories beyond the token limit",
+            "Only the most relevant snippets, for targeted questions",
+        ],
+        horizontal=True,
+    )
+    if analysis_mode == "Map-reduce":
+        chunk_tokens = st.slider("Tokens per chunk:", 50000, 1000000, 200000, step=50000)
+        max_workers = st.slider("Parallel chunk analyses:", 1, 16, 4)
+    else:
+        chunk_tokens, max_workers = 200000, 4
+    use_context_cache = st.checkbox(
+        "Cache repository context between analyses",
+        value=True,
+        help="For single-prompt analyses and the full report, the file index and code are cached once per "
+        "commit (billed as a Vertex AI context cache); follow-up analyses only send the question.",
+    )
+    if analysis_mode == "Retrieval":
+        top_k = st.slider("Snippets to retrieve:", 5, 100, 20, step=5)
+
     if st.button("Generate Analysis"):
-        if "index" not in st.session_state or "text" not in st.session_state:
+        if "index" not in st.session_state or "corpus" not in st.session_state:
             st.error("Please clone and index a repository first.")
         else:
             question = custom_prompt if selected_analysis == "custom" else analysis_options[selected_analysis]
-            prompt = get_code_prompt(question, st.session_state["index"], st.session_state["text"])
-            response, cost = stream_prompt(prompt)
+            start_time = time.time()
+            corpus = st.session_state["corpus"]
+            setup_cost = 0.0
+            response = None
+            if analysis_mode == "Retrieval":
+                with st.spinner("Retrieving relevant code..."):
+                    embedder = get_embedder()
+                    retrieval_index = get_retrieval_index(
+                        st.session_state["repo_key"], st.session_state["commit"], corpus, embedder
+                    )
+                    hits = retrieval_index.search(embedder.embed_query(question), top_k)
+                with st.expander(f"Retrieved {len(hits)} snippets"):
+                    for hit in hits:
+                        st.write(f"`{hit['path']}` lines {hit['start_line']}-{hit['end_line']} (score {hit['score']:.3f})")
+                prompt = get_retrieval_prompt(question, st.session_state["index"], hits)
+                response, cost = stream_prompt(prompt, exact_count=exact_count)
+            elif analysis_mode == "Single prompt":
+                try:
+                    check_corpus_size(corpus)
+                    if use_context_cache:
+                        # A context too small to cache is sent uncached, reusing the prefix built for it.
+                        response, cost, context_entry, setup_cost = generate_with_cache(
+                            load_context_cache(),
+                            st.session_state["repo_key"],
+                            st.session_state["commit"],
+                            lambda: get_code_prefix(st.session_state["index"], corpus.text()),
+                            get_question_suffix(question),
+                            lambda prompt: stream_prompt(prompt, exact_count=exact_count),
+                            token_limit=TOKEN_LIMIT,
+                            generation_config=generation_config,
+                            safety_settings=safety_settings,
+                        )
+                        if context_entry is not None:
+                            st.caption(
+                                f"Repository context served from cache ({context_entry['characters']:,} characters "
+                                f"billed at the cached rate{' after registering it' if setup_cost else ''})."
+                            )
+                    else:
+                        prefix = get_code_prefix(st.session_state["index"], corpus.text())
+                        response, cost = stream_prompt(prefix + get_question_suffix(question), exact_count=exact_count)
+                except TokenLimitError:
+                    st.info("The repository exceeds the single-prompt token limit; switching to map-reduce analysis.")
+            if response is None:
+                prompt, setup_cost = run_map_reduce(
+                    question, st.session_state["index"], corpus, chunk_tokens, max_workers
+                )
+                if prompt is not None:
+                    response, cost = stream_prompt(prompt, exact_count=exact_count)
+                else:
+                    # Map-reduce failed and reported why; only the requests already made are billed.
+                    response, cost = [], 0.0
+            cost += setup_cost
             
             analysis_container = st.empty()
             full_response = ""
@@ -183,9 +294,94 @@ with col1:
             
             analysis_container.markdown(full_response)
             
-            st.success("Analysis generated successfully!")
+            if full_response:
+                st.success("Analysis generated successfully!")
             st.session_state.analyses.append((selected_analysis, full_response))
             st.session_state.costs.append(cost)
+            st.session_state.latencies.append(time.time() - start_time)
+
+    # Full report: several analyses at once
+    st.subheader("Full report")
+    report_analyses = st.multiselect(
+        "Analyses to include:",
+        [k for k in analysis_options if k != "custom"],
+        default=["summary", "readme", "onboarding", "issues", "troubleshooting"],
+        format_func=lambda x: x.capitalize(),
+    )
+    report_workers = st.slider("Parallel analyses:", 1, 6, 3)
+
+    if st.button("Generate full report"):
+        if "index" not in st.session_state or "corpus" not in st.session_state:
+            st.error("Please clone and index a repository first.")
+        elif report_analyses:
+            corpus = st.session_state["corpus"]
+            try:
+                check_corpus_size(corpus)
+                # Read on the script thread: the report's worker threads have no
+                # Streamlit context to reach session state or cache_resource
+                # functions from.
+                repo_key, commit, code_index = (
+                    st.session_state["repo_key"], st.session_state["commit"], st.session_state["index"]
+                )
+                build_prefix = lambda: get_code_prefix(code_index, corpus.text())
+                context_entry, setup_cost = None, 0.0
+                if use_context_cache:
+                    context_cache = load_context_cache()
+                    context_entry, setup_cost, prefix = context_cache.get_or_register(
+                        repo_key, commit, build_prefix, token_limit=TOKEN_LIMIT
+                    )
+                else:
+                    prefix = build_prefix()
+                    check_token_limit(estimate_tokens(prefix), TOKEN_LIMIT)
+            except TokenLimitError:
+                st.error("The repository exceeds the single-prompt token limit; generate analyses one at a time with map-reduce.")
+            else:
+                def make_job(question):
+                    suffix = get_question_suffix(question)
+                    if context_entry is None:
+                        return lambda: stream_prompt(prefix + suffix)
+
+                    def job():
+                        # Registers the prefix again if the service expired it mid-report.
+                        responses, cost, _, registered_cost = generate_with_cache(
+                            context_cache, repo_key, commit, build_prefix, suffix, stream_prompt, token_limit=TOKEN_LIMIT,
+                            generation_config=generation_config, safety_settings=safety_settings,
+                        )
+                        return responses, cost + registered_cost
+                    return job
+
+                jobs = {name: make_job(analysis_options[name]) for name in report_analyses}
+                placeholders, texts = {}, {name: "" for name in report_analyses}
+                for name in report_analyses:
+                    with st.expander(name.capitalize(), expanded=True):
+                        placeholders[name] = st.empty()
+                        placeholders[name].caption("Waiting...")
+                results = {}
+                for event in stream_concurrently(jobs, report_workers):
+                    name = event[1]
+                    if event[0] == "chunk":
+                        texts[name] += event[2]
+                        placeholders[name].markdown(texts[name] + "▌")
+                    elif event[0] == "done":
+                        placeholders[name].markdown(texts[name])
+                        results[name] = (event[2], event[3])
+                    else:
+                        placeholders[name].error(f"Analysis failed: {event[2]}")
+                for i, name in enumerate(n for n in report_analyses if n in results):
+                    cost, latency = results[name]
+                    st.session_state.analyses.append((name, texts[name]))
+                    # The one-off cost of caching the repository context is charged to the first analysis.
+                    st.session_state.costs.append(cost + (setup_cost if i == 0 else 0.0))
+                    st.session_state.latencies.append(latency)
+                st.session_state["report"] = build_report(
+                    repo_url,
+                    st.session_state["commit"],
+                    [(name.capitalize(), texts[name]) for name in report_analyses if name in results],
+                )
+                st.success(f"Report generated: {len(results)} of {len(report_analyses)} analyses completed.")
+
+    if "report" in st.session_state:
+        st.download_button("Download report", st.session_state["report"], file_name="repo-report.md", mime="text/markdown")
 
 with col2:
     # API Costs Table
@@ -193,7 +389,8 @@ with col2:
     if st.session_state.costs:
         cost_df = pd.DataFrame({
             "Analysis": [a[0].capitalize() for a in st.session_state.analyses],
-            "Cost ($)": st.session_state.costs
+            "Cost ($)": st.session_state.costs,
+            "Latency (s)": [round(latency, 1) for latency in st.session_state.latencies],
         })
         cost_df["Cumulative Cost ($)"] = cost_df["Cost ($)"].cumsum()
         st.dataframe(cost_df, use_container_width=True)
@@ -211,4 +408,6 @@ with col2:
     if st.button("Clear All Analyses"):
         st.session_state.analyses = []
         st.session_state.costs = []
+        st.session_state.latencies = []
+        st.session_state.pop("report", None)
         st.success("All analyses cleared!")
\ No newline at end of file
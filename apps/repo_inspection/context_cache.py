@@ -0,0 +1,235 @@
+import datetime
+import itertools
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from utils_tokens import billable_characters, check_token_limit, estimate_cost, estimate_tokens
+
+# Cached input is billed at a fraction of the normal input price (storage per
+# hour is billed separately and not included here).
+CACHED_INPUT_PRICE_RATIO = 0.25
+# Vertex AI refuses to cache contents below this size.
+MIN_CACHE_TOKENS = 32768
+CONTEXT_CACHE_TTL = int(os.environ.get("REPO_CONTEXT_CACHE_TTL", "3600"))
+# Entries are dropped locally this long before the service expires them, so a
+# request never references an expired cache.
+CONTEXT_CACHE_MARGIN = 60
+
+
+class ContextCacheExpired(LookupError):
+    # The service no longer has the cached prefix; its entry has been dropped.
+    pass
+
+
+def get_code_prefix(code_index, code_text):
+    # Everything that is the same for every question about one commit comes
+    # first, so it can be cached and shared by all analyses.
+    return f"""
+    Context:
+    - You are an expert code analyzer and technical writer.
+    - The entire codebase is provided below.
+    - Here is an index of all the files in the codebase:
+      \n\n{code_index}\n\n
+    - The content of each file is concatenated below:
+      \n\n{code_text}\n\n
+    """
+
+
+def get_question_suffix(question):
+    return f"""
+    Task: {question}
+
+    Instructions:
+    1. Carefully analyze the provided codebase.
+    2. Focus on addressing the specific task or question given.
+    3. Provide a comprehensive and well-structured response.
+    4. Use markdown formatting to enhance readability.
+    5. If relevant, include code snippets or examples from the codebase.
+    6. Ensure your analysis is accurate, insightful, and actionable.
+
+    Response:
+    """
+
+
+def cached_prompt_cost(prefix_characters, suffix):
+    return (
+        estimate_cost(prefix_characters) * CACHED_INPUT_PRICE_RATIO
+        + estimate_cost(billable_characters(suffix))
+    )
+
+
+class _ContextCache:
+    # Registers one cached prefix per (repository, commit), shared by every
+    # session of this process until it expires. Backends implement _create and
+    # generate.
+    min_tokens = 0
+
+    def __init__(self, ttl_seconds=CONTEXT_CACHE_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        return entry if entry is not None and entry["expires"] > time.time() else None
+
+    def get_or_register(self, repo_key, commit, build_prefix, token_limit=None):
+        # Returns (entry, cost of registering it now, prefix). `build_prefix` is
+        # only called when the prefix isn't registered yet; if it is too small
+        # to be cached, the entry is None and the prefix it built is returned
+        # so the caller can send it uncached. Raises TokenLimitError if the
+        # prefix alone is over `token_limit`.
+        key = (repo_key, commit)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is not None:
+                return entry, 0.0, None
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Building and uploading the prefix only blocks sessions waiting for
+        # the same commit.
+        with key_lock:
+            with self._lock:
+                entry = self._live_entry(key)
+            if entry is not None:
+                return entry, 0.0, None
+            prefix = build_prefix()
+            tokens = estimate_tokens(prefix)
+            if token_limit is not None:
+                check_token_limit(tokens, token_limit)
+            if tokens < self.min_tokens:
+                return None, 0.0, prefix
+            # The service's TTL starts before create() returns.
+            created = time.time()
+            entry = self._create(f"repo-{repo_key[:12]}-{commit[:12]}", prefix)
+            entry.update({
+                "key": key,
+                "characters": billable_characters(prefix),
+                "expires": created + self.ttl_seconds - CONTEXT_CACHE_MARGIN,
+            })
+            with self._lock:
+                self._entries[key] = entry
+            return entry, estimate_cost(entry["characters"]), prefix
+
+    def forget(self, entry):
+        with self._lock:
+            if self._entries.get(entry["key"]) is entry:
+                del self._entries[entry["key"]]
+
+    def _create(self, name, prefix):
+        raise NotImplementedError
+
+    def generate(self, entry, suffix, generation_config=None, safety_settings=None):
+        raise NotImplementedError
+
+
+class VertexContextCache(_ContextCache):
+    min_tokens = MIN_CACHE_TOKENS
+
+    def __init__(self, model_id, ttl_seconds=CONTEXT_CACHE_TTL):
+        super().__init__(ttl_seconds)
+        self.model_id = model_id
+
+    def _create(self, name, prefix):
+        from vertexai.preview import caching
+
+        cached_content = caching.CachedContent.create(
+            model_name=self.model_id,
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=self.ttl_seconds),
+            display_name=name,
+        )
+        return {"name": name, "cached_content": cached_content}
+
+    def generate(self, entry, suffix, generation_config=None, safety_settings=None):
+        # Raises ContextCacheExpired if the service has already deleted the
+        # cache; streamed errors surface with the first chunk, so it is read
+        # here.
+        from google.api_core import exceptions
+        from vertexai.preview.generative_models import GenerativeModel
+
+        try:
+            model = GenerativeModel.from_cached_content(cached_content=entry["cached_content"])
+            responses = iter(model.generate_content(
+                suffix, generation_config=generation_config, safety_settings=safety_settings, stream=True
+            ))
+            first = list(itertools.islice(responses, 1))
+        except exceptions.NotFound as e:
+            self.forget(entry)
+            raise ContextCacheExpired(entry["name"]) from e
+        return itertools.chain(first, responses), cached_prompt_cost(entry["characters"], suffix)
+
+
+class LocalContextCache(_ContextCache):
+    # Simulates context caching for offline benchmarks. The prefix is kept in
+    # memory and, if a model is given, the full prompt is still sent to it so
+    # answers are unchanged; only billing follows the cached pricing. Without a
+    # model, responses are synthetic and time-to-first-token is modeled as a
+    # fixed latency plus prefill of the input that isn't cached.
+    def __init__(
+        self,
+        model=None,
+        ttl_seconds=CONTEXT_CACHE_TTL,
+        base_latency=0.3,
+        prefill_characters_per_second=2000000,
+    ):
+        super().__init__(ttl_seconds)
+        self.model = model
+        self.base_latency = base_latency
+        self.prefill_characters_per_second = prefill_characters_per_second
+
+    def _create(self, name, prefix):
+        return {"name": name, "prefix": prefix}
+
+    def _simulate(self, uncached_characters):
+        time.sleep(self.base_latency + uncached_characters / self.prefill_characters_per_second)
+        yield SimpleNamespace(text="(simulated response)")
+
+    def generate(self, entry, suffix, generation_config=None, safety_settings=None):
+        # `entry` may be None to send `suffix` as an ordinary, uncached prompt.
+        if entry is None:
+            cost = estimate_cost(billable_characters(suffix))
+            prompt, uncached = suffix, len(suffix)
+        else:
+            cost = cached_prompt_cost(entry["characters"], suffix)
+            prompt, uncached = entry["prefix"] + suffix, len(suffix)
+        if self.model is None:
+            return self._simulate(uncached), cost
+        responses = self.model.generate_content(
+            prompt, generation_config=generation_config, safety_settings=safety_settings, stream=True
+        )
+        return responses, cost
+
+
+def generate_with_cache(
+    cache, repo_key, commit, build_prefix, suffix, send_uncached,
+    token_limit=None, generation_config=None, safety_settings=None,
+):
+    # Answers `suffix` against the commit's cached prefix, registering it if
+    # needed. Returns (responses, cost, entry, cost of registering the prefix
+    # now). A prefix too small to cache is sent with `send_uncached(prompt)`,
+    # which returns (responses, cost); a cache the service has already
+    # expired is registered again once.
+    for attempt in range(2):
+        entry, setup_cost, prefix = cache.get_or_register(repo_key, commit, build_prefix, token_limit=token_limit)
+        if entry is None:
+            responses, cost = send_uncached(prefix + suffix)
+            return responses, cost, None, setup_cost
+        try:
+            responses, cost = cache.generate(
+                entry, suffix, generation_config=generation_config, safety_settings=safety_settings
+            )
+            return responses, cost, entry, setup_cost
+        except ContextCacheExpired:
+            if attempt:
+                raise
+
+
+def get_context_cache(model_id, model=None, backend=None):
+    # REPO_CONTEXT_CACHE selects the backend: "vertex" (default) or "local".
+    backend = backend or os.environ.get("REPO_CONTEXT_CACHE", "vertex")
+    if backend == "local":
+        return LocalContextCache(model)
+    return VertexContextCache(model_id)
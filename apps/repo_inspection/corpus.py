@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+from utils_tokens import CHARS_PER_TOKEN
+
+FILE_FOOTER = "\n-------------------------\n"
+# Corpora larger than this are kept in a temporary file instead of memory.
+SPILL_BYTES = int(os.environ.get("REPO_CORPUS_SPILL_BYTES", str(64 * 1024 * 1024)))
+
+
+def file_header(path):
+    return f"----- File: {path} -----\n"
+
+
+class Corpus:
+    # Collects file sections for the code prompt without repeated string
+    # concatenation, tracking the size of each file as it goes. The full prompt
+    # text is only produced by text().
+
+    def __init__(self, spill_bytes=SPILL_BYTES):
+        self.spill_bytes = spill_bytes
+        self.files = []
+        self.total_bytes = 0
+        self.total_tokens = 0
+        self._parts = []
+        self._spill = None
+
+    def add_file(self, path, text):
+        section = (file_header(path) + text + FILE_FOOTER).encode("utf-8")
+        tokens = -(-len(text) // CHARS_PER_TOKEN)
+        if self._spill is None and self.total_bytes + len(section) > self.spill_bytes:
+            self._spill = tempfile.TemporaryFile()
+            for part in self._parts:
+                self._spill.write(part)
+            self._parts = []
+        if self._spill is not None:
+            self._spill.seek(0, os.SEEK_END)
+            self._spill.write(section)
+        else:
+            self._parts.append(section)
+        self.files.append({"path": path, "offset": self.total_bytes, "bytes": len(section), "tokens": tokens})
+        self.total_bytes += len(section)
+        self.total_tokens += tokens
+
+    def _read(self, offset, size):
+        self._spill.seek(offset)
+        return self._spill.read(size)
+
+    def sections(self):
+        # Yields (path, section) pairs without materializing the whole corpus.
+        for i, record in enumerate(self.files):
+            if self._spill is not None:
+                data = self._read(record["offset"], record["bytes"])
+            else:
+                data = self._parts[i]
+            yield record["path"], data.decode("utf-8")
+
+    def file_texts(self):
+        # Yields (path, file content) pairs, without the section header and footer.
+        for path, section in self.sections():
+            yield path, section[len(file_header(path)):-len(FILE_FOOTER)]
+
+    def text(self):
+        if self._spill is not None:
+            return self._read(0, self.total_bytes).decode("utf-8")
+        return b"".join(self._parts).decode("utf-8")
+
+    def __len__(self):
+        return len(self.files)
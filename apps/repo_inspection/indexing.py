@@ -0,0 +1,282 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import git
+import magika
+
+from apps.repo_inspection.corpus import Corpus
+from apps.repo_inspection.store import IndexStore, repo_lock
+
+# Each repository URL gets a persistent working copy; indexed commits live in
+# the shared IndexStore, so re-indexing only fetches and re-reads what changed.
+REPO_CACHE_DIR = os.environ.get("REPO_CACHE_DIR", "./.repo-cache")
+EXTRACT_WORKERS = int(os.environ.get("REPO_EXTRACT_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+MAX_FILE_BYTES = int(os.environ.get("REPO_MAX_FILE_BYTES", str(4 * 1024 * 1024)))
+MAGIKA_BATCH_SIZE = 256
+# Extensions that are never text, so Magika isn't run on them.
+BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".tiff", ".psd",
+    ".mp3", ".mp4", ".mov", ".avi", ".wav", ".ogg", ".webm",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".tar", ".jar", ".war",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
+    ".so", ".dll", ".dylib", ".exe", ".bin", ".o", ".a", ".class", ".pyc", ".wasm",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot",
+    ".db", ".sqlite", ".pkl", ".npy", ".parquet",
+}
+
+_magika = None
+
+
+def get_magika():
+    global _magika
+    if _magika is None:
+        _magika = magika.Magika()
+    return _magika
+
+
+# Clone options (all optional):
+#   depth          int, shallow clone/fetch depth (e.g. 1)
+#   single_branch  bool, only fetch the default branch
+#   blob_limit     str, partial clone size filter (e.g. "1m"); larger files are
+#                  left out of the checkout
+#   include        list of globs to check out (sparse checkout)
+#   exclude        list of globs to leave out of the checkout
+def repo_cache_path(repo_url, cache_dir=REPO_CACHE_DIR, clone_options=None):
+    key = repo_url
+    if clone_options:
+        key += "\n" + json.dumps(clone_options, sort_keys=True)
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+
+def _uses_sparse_checkout(clone_options):
+    return bool(clone_options.get("include") or clone_options.get("exclude") or clone_options.get("blob_limit"))
+
+
+def _missing_blob_paths(repo, commit):
+    # Paths whose blobs were left out by the partial clone filter. Only trees are
+    # read, so this never triggers a lazy fetch of the missing blobs.
+    missing = {
+        line[1:] for line in repo.git.rev_list("--objects", "--missing=print", commit).splitlines()
+        if line.startswith("?")
+    }
+    if not missing:
+        return []
+    paths = []
+    for line in repo.git.ls_tree("-r", "-z", commit).split("\0"):
+        if not line:
+            continue
+        meta, path = line.split("\t", 1)
+        if meta.split()[2] in missing:
+            paths.append(path)
+    return paths
+
+
+def _literal_pattern(path):
+    # Sparse-checkout lines are gitignore-style patterns; escape a path so the
+    # pattern matches that one file only.
+    escaped = re.sub(r"([\\*?\[!#])", r"\\\1", path)
+    stripped = escaped.rstrip(" ")
+    return stripped + "\\ " * (len(escaped) - len(stripped))
+
+
+def _apply_sparse_checkout(repo, commit, clone_options):
+    patterns = list(clone_options.get("include") or ["/*"])
+    patterns += [f"!{glob}" for glob in clone_options.get("exclude") or []]
+    if clone_options.get("blob_limit"):
+        patterns += [f"!/{_literal_pattern(path)}" for path in _missing_blob_paths(repo, commit)]
+    os.makedirs(os.path.join(repo.git_dir, "info"), exist_ok=True)
+    with open(os.path.join(repo.git_dir, "info", "sparse-checkout"), "w", encoding="utf-8") as f:
+        f.write("\n".join(patterns) + "\n")
+    repo.git.config("core.sparseCheckout", "true")
+    repo.git.config("core.sparseCheckoutCone", "false")
+
+
+def _clone_kwargs(clone_options):
+    kwargs = {}
+    if clone_options.get("depth"):
+        kwargs["depth"] = clone_options["depth"]
+    if clone_options.get("single_branch"):
+        kwargs["single_branch"] = True
+    if clone_options.get("blob_limit"):
+        kwargs["filter"] = f"blob:limit={clone_options['blob_limit']}"
+    if _uses_sparse_checkout(clone_options):
+        kwargs["no_checkout"] = True
+    return kwargs
+
+
+def list_files(repo_dir):
+    paths = []
+    for root, dirs, files in os.walk(repo_dir):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for file in files:
+            paths.append(os.path.relpath(os.path.join(root, file), repo_dir))
+    return sorted(paths)
+
+
+def _prefilter(file_path):
+    # Cheap checks that settle a file without running Magika on it.
+    if os.path.splitext(file_path)[1].lower() in BINARY_EXTENSIONS:
+        return "binary"
+    try:
+        if os.path.getsize(file_path) > MAX_FILE_BYTES:
+            return "too_large"
+        with open(file_path, "rb") as f:
+            if b"\0" in f.read(8192):
+                return "binary"
+    except OSError:
+        return "unreadable"
+    return None
+
+
+def _read_text(file_path):
+    try:
+        with open(file_path, "r") as f:
+            return f.read()
+    except Exception:
+        return None
+
+
+def index_files(repo_dir, paths):
+    paths = sorted(paths)
+    with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+        skipped = list(pool.map(_prefilter, [os.path.join(repo_dir, p) for p in paths]))
+        candidates = [p for p, reason in zip(paths, skipped) if reason is None]
+
+        labels = {}
+        for i in range(0, len(candidates), MAGIKA_BATCH_SIZE):
+            batch = candidates[i:i + MAGIKA_BATCH_SIZE]
+            results = get_magika().identify_paths([Path(repo_dir, p) for p in batch])
+            for relative_path, result in zip(batch, results):
+                labels[relative_path] = (result.output.ct_label, result.output.group)
+
+        to_read = [p for p in candidates if labels[p][1] in ("text", "code")]
+        texts = dict(zip(to_read, pool.map(_read_text, [os.path.join(repo_dir, p) for p in to_read])))
+
+    records = {}
+    for relative_path, reason in zip(paths, skipped):
+        if reason:
+            records[relative_path] = {"label": reason, "text": None}
+        else:
+            records[relative_path] = {"label": labels[relative_path][0], "text": texts.get(relative_path)}
+    return records
+
+
+def build_corpus(records):
+    code_index = sorted(records)
+    corpus = Corpus()
+    for relative_path in code_index:
+        text = records[relative_path]["text"]
+        if text is not None:
+            corpus.add_file(relative_path, text)
+    return code_index, corpus
+
+
+def extract_code(repo_dir):
+    return build_corpus(index_files(repo_dir, list_files(repo_dir)))
+
+
+def sync_repo(repo_url, worktree, clone_options=None):
+    clone_options = clone_options or {}
+    if os.path.isdir(os.path.join(worktree, ".git")):
+        repo = git.Repo(worktree)
+        fetch_kwargs = {"depth": clone_options["depth"]} if clone_options.get("depth") else {}
+        repo.remotes.origin.fetch(**fetch_kwargs)
+        try:
+            target = repo.git.rev_parse("origin/HEAD")
+        except git.GitCommandError:
+            target = repo.git.rev_parse("FETCH_HEAD")
+    else:
+        os.makedirs(worktree, exist_ok=True)
+        # file:// keeps --depth and --filter effective for local fixture repositories.
+        repo = git.Repo.clone_from(repo_url, worktree, **_clone_kwargs(clone_options))
+        target = repo.head.commit.hexsha
+    if _uses_sparse_checkout(clone_options):
+        _apply_sparse_checkout(repo, target, clone_options)
+    repo.git.reset("--hard", target)
+    return repo
+
+
+def changed_files(repo, old_commit, new_commit):
+    # Returns (paths to re-index, deleted paths), or None if the old commit is
+    # no longer reachable (e.g. after a force push) and a full index is needed.
+    try:
+        output = repo.git.diff("--name-status", "--no-renames", "-z", old_commit, new_commit)
+    except git.GitCommandError:
+        return None
+    fields = [f for f in output.split("\0") if f]
+    updated, deleted = [], []
+    for status, path in zip(fields[::2], fields[1::2]):
+        path = os.path.normpath(path)
+        (deleted if status == "D" else updated).append(path)
+    return updated, deleted
+
+
+def _remote_head(repo_url):
+    try:
+        return git.cmd.Git().ls_remote(repo_url, "HEAD").split()[0]
+    except (git.GitCommandError, IndexError):
+        return None
+
+
+def index_repo(repo_url, cache_dir=REPO_CACHE_DIR, clone_options=None, store=None):
+    # Returns (code_index, corpus, stats) for the current HEAD of `repo_url`.
+    store = store or IndexStore()
+    cache_path = repo_cache_path(repo_url, cache_dir, clone_options)
+    repo_key = os.path.basename(cache_path)
+    worktree = os.path.join(cache_path, "worktree")
+    stats = {"bytes_transferred": 0, "clone_seconds": 0.0}
+
+    with repo_lock(repo_key, store.index_dir):
+        commit = _remote_head(repo_url)
+        records = store.load(repo_key, commit) if commit and store.has(repo_key, commit) else None
+        if records is not None:
+            # Already indexed by this or another session: no fetch needed.
+            stats.update({"mode": "cached", "reindexed": 0})
+        else:
+            git_dir_size = _dir_size(os.path.join(worktree, ".git"))
+            start_time = time.time()
+            repo = sync_repo(repo_url, worktree, clone_options)
+            stats["clone_seconds"] = time.time() - start_time
+            stats["bytes_transferred"] = max(_dir_size(os.path.join(worktree, ".git")) - git_dir_size, 0)
+            commit = repo.head.commit.hexsha
+
+            # Stored indexes can be evicted at any time, so each load may miss.
+            previous = store.latest_commit(repo_key)
+            records = store.load(repo_key, commit) if previous == commit else None
+            if records is not None:
+                stats.update({"mode": "cached", "reindexed": 0})
+            else:
+                diff = changed_files(repo, previous, commit) if previous and previous != commit else None
+                records = store.load(repo_key, previous) if diff is not None else None
+                if records is not None:
+                    updated, deleted = diff
+                    existing = [p for p in updated if os.path.isfile(os.path.join(worktree, p))]
+                    # Changed files that are no longer checked out (sparse or size filter) are dropped too.
+                    for path in deleted + [p for p in updated if p not in existing]:
+                        records.pop(path, None)
+                    records.update(index_files(worktree, existing))
+                    stats.update({"mode": "incremental", "reindexed": len(existing), "deleted": len(deleted)})
+                else:
+                    records = index_files(worktree, list_files(worktree))
+                    stats.update({"mode": "full", "reindexed": len(records)})
+                store.save(repo_key, commit, repo_url, records)
+
+    code_index, corpus = build_corpus(records)
+    stats.update({"repo_key": repo_key, "commit": commit, "files": len(records)})
+    return code_index, corpus, stats
@@ -0,0 +1,202 @@
+import os
+import re
+
+import utils_async
+from utils_tokens import billable_characters, estimate_cost, estimate_tokens
+
+FILE_HEADER = re.compile(r"^----- File: (.+) -----\n", re.MULTILINE)
+FILE_FOOTER = "\n-------------------------\n"
+
+
+def split_files(code_text):
+    # Splits the concatenated `extract_code` output back into (path, section)
+    # pairs, where each section still carries its own header and footer.
+    headers = list(FILE_HEADER.finditer(code_text))
+    files = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(code_text)
+        files.append((header.group(1), code_text[header.start():end]))
+    return files
+
+
+def _split_large_file(path, section, token_budget):
+    pieces = []
+    current = []
+    current_tokens = 0
+    for line in section.splitlines(keepends=True):
+        line_tokens = estimate_tokens(line)
+        if current and current_tokens + line_tokens > token_budget:
+            pieces.append("".join(current))
+            current = [f"----- File: {path} (continued) -----\n"]
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+
+def chunk_files(files, token_budget):
+    # Packs files into chunks of at most `token_budget` tokens. Files are grouped
+    # by directory and a new chunk is started at a top-level directory boundary
+    # when the current chunk is already more than half full.
+    chunks = []
+    current = []
+    current_tokens = 0
+    current_top = None
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append({
+                "paths": sorted({path for path, _ in current}),
+                "text": "".join(section for _, section in current),
+                "tokens": current_tokens,
+            })
+        current = []
+        current_tokens = 0
+
+    for path, section in sorted(files, key=lambda f: (os.path.dirname(f[0]), f[0])):
+        top = path.split(os.sep, 1)[0] if os.sep in path else ""
+        tokens = estimate_tokens(section)
+        if tokens > token_budget:
+            flush()
+            for piece in _split_large_file(path, section, token_budget):
+                current = [(path, piece)]
+                current_tokens = estimate_tokens(piece)
+                flush()
+            current_top = top
+            continue
+        boundary = top != current_top and current_tokens > token_budget // 2
+        if current and (boundary or current_tokens + tokens > token_budget):
+            flush()
+        current.append((path, section))
+        current_tokens += tokens
+        current_top = top
+    flush()
+    return chunks
+
+
+def get_map_prompt(question, chunk, index, total):
+    file_list = "\n".join(chunk["paths"])
+    return f"""
+    Task: {question}
+
+    Context:
+    - You are an expert code analyzer and technical writer.
+    - The codebase is too large for a single request, so it was split into {total} parts.
+    - This is part {index + 1} of {total}. It contains these files:
+      \n\n{file_list}\n\n
+    - The content of each file is concatenated below:
+      \n\n{chunk["text"]}\n\n
+
+    Instructions:
+    1. Analyze only the files in this part.
+    2. Extract every finding relevant to the task: components, responsibilities, dependencies, issues and notable code.
+    3. Reference file paths so the findings can be merged with the other parts.
+    4. Be concise; this is an intermediate result that will be combined with the analyses of the other parts.
+
+    Partial analysis:
+    """
+
+
+def get_reduce_prompt(question, code_index, partials):
+    sections = "\n\n".join(
+        f"----- Partial analysis {i + 1} -----\n{partial}" for i, partial in enumerate(partials)
+    )
+    return f"""
+    Task: {question}
+
+    Context:
+    - You are an expert code analyzer and technical writer.
+    - The codebase was analyzed in parts; the partial analyses are provided below.
+    - Here is an index of all the files in the codebase:
+      \n\n{code_index}\n\n
+    - Partial analyses:
+      \n\n{sections}\n\n
+
+    Instructions:
+    1. Merge the partial analyses into a single answer for the task.
+    2. Remove duplicated findings and resolve contradictions.
+    3. Provide a comprehensive and well-structured response.
+    4. Use markdown formatting to enhance readability.
+    5. If relevant, include code snippets or examples quoted in the partial analyses.
+
+    Response:
+    """
+
+
+def map_reduce(model, question, code_index, sections, token_budget, max_workers=None, **generation_kwargs):
+    # Generator that drives the whole analysis and reports progress as events:
+    #   ("chunks", count)             once the corpus has been split
+    #   ("partial", index, text)      as each chunk analysis completes
+    #   ("error", index, exception)   if a chunk analysis fails
+    #   ("reduce", level, count)      before each round of merging
+    #   ("reduce_error", level, index, exception)
+    #                                 if merging a group fails; its partials are
+    #                                 kept and merged again in the next round
+    #   ("prompt", final_prompt, cost) the final reduce prompt for the caller to
+    #                                 stream, with the cost of all requests so far
+    #   ("failed", exception, cost)   instead of "prompt" when no final prompt
+    #                                 within the budget can be produced
+    # `sections` is an iterable of (path, section) pairs, e.g. Corpus.sections()
+    # or split_files(code_text).
+    chunks = chunk_files(sections, token_budget)
+    yield ("chunks", len(chunks))
+
+    prompts = {i: get_map_prompt(question, chunk, i, len(chunks)) for i, chunk in enumerate(chunks)}
+    cost = sum(estimate_cost(billable_characters(p)) for p in prompts.values())
+    partials = {}
+    for i, future in utils_async.as_completed(prompts, model, limit=max_workers, **generation_kwargs):
+        try:
+            partials[i] = future.result()
+            yield ("partial", i, partials[i])
+        except Exception as e:
+            yield ("error", i, e)
+    partials = [partials[i] for i in sorted(partials)]
+    if not partials:
+        yield ("failed", RuntimeError("Every chunk analysis failed"), cost)
+        return
+
+    # Merge in rounds until the partials fit into a single reduce request.
+    level = 0
+    while estimate_tokens(get_reduce_prompt(question, code_index, partials)) > token_budget and len(partials) > 1:
+        level += 1
+        groups = []
+        group = []
+        for partial in partials:
+            if group and estimate_tokens("\n".join(group + [partial])) > token_budget // 2:
+                groups.append(group)
+                group = []
+            group.append(partial)
+        groups.append(group)
+        if len(groups) == len(partials):
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        yield ("reduce", level, len(groups))
+        reduce_prompts = {i: get_reduce_prompt(question, "(see partial analyses)", g) for i, g in enumerate(groups)}
+        cost += sum(estimate_cost(billable_characters(p)) for p in reduce_prompts.values())
+        merged = {}
+        error = None
+        for i, future in utils_async.as_completed(reduce_prompts, model, limit=max_workers, **generation_kwargs):
+            try:
+                merged[i] = [future.result()]
+            except Exception as e:
+                error = e
+                merged[i] = groups[i]
+                yield ("reduce_error", level, i, e)
+        if len(merged) == len(groups) and all(merged[i] is groups[i] for i in merged):
+            # No group could be merged this round, so another round would not
+            # make progress.
+            yield ("failed", error, cost)
+            return
+        partials = [partial for i in sorted(merged) for partial in merged[i]]
+
+    final_prompt = get_reduce_prompt(question, code_index, partials)
+    if estimate_tokens(final_prompt) > token_budget:
+        # A single merged analysis plus the file index can still be too large;
+        # the index is only there for orientation, so drop it first.
+        final_prompt = get_reduce_prompt(question, "(see partial analyses)", partials)
+    if estimate_tokens(final_prompt) > token_budget:
+        yield ("failed", ValueError(f"The merged analysis exceeds the {token_budget:,}-token budget"), cost)
+        return
+    yield ("prompt", final_prompt, cost)
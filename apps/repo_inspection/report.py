@@ -0,0 +1,51 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def stream_concurrently(jobs, max_workers):
+    # Runs `jobs` ({key: callable returning (responses, cost)}) on at most
+    # `max_workers` threads and yields their progress as events, so the caller
+    # can render every stream from its own thread:
+    #   ("chunk", key, text)
+    #   ("done", key, cost, latency_seconds)
+    #   ("error", key, exception)
+    # Workers stop early if the caller stops iterating.
+    events = queue.Queue()
+    stopped = threading.Event()
+
+    def run(key, job):
+        start = time.perf_counter()
+        try:
+            responses, cost = job()
+            for chunk in responses:
+                if stopped.is_set():
+                    return
+                if chunk.text:
+                    events.put(("chunk", key, chunk.text))
+            events.put(("done", key, cost, time.perf_counter() - start))
+        except Exception as e:
+            events.put(("error", key, e))
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for key, job in jobs.items():
+            pool.submit(run, key, job)
+        remaining = len(jobs)
+        while remaining:
+            event = events.get()
+            if event[0] != "chunk":
+                remaining -= 1
+            yield event
+    finally:
+        stopped.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def build_report(repo_url, commit, sections):
+    # `sections` is a list of (title, markdown) pairs.
+    lines = [f"# Repository report: {repo_url}", "", f"Commit: `{commit}`", ""]
+    for title, text in sections:
+        lines += [f"## {title}", "", text.strip(), ""]
+    return "\n".join(lines)
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import faiss
+import numpy as np
+
+from apps.repo_inspection.store import REPO_INDEX_DIR, repo_lock
+
+CHUNK_CHARS = 4000
+# Lines that start a top-level symbol in the common languages; chunks are cut
+# at these boundaries so a function or class stays in one snippet.
+SYMBOL_START = re.compile(
+    r"^(async\s+def|def|class|func|fn|function|export|public|private|protected|interface|"
+    r"type|struct|enum|impl|module|package|const\s+\w+\s*=\s*(async\s*)?\(|@\w+)\b"
+)
+TOKEN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+
+
+def chunk_file(path, text, max_chars=CHUNK_CHARS):
+    lines = text.splitlines(keepends=True)
+    segments = []
+    start = 0
+    for i, line in enumerate(lines):
+        if i > start and SYMBOL_START.match(line):
+            segments.append((start, i))
+            start = i
+    if lines:
+        segments.append((start, len(lines)))
+
+    chunks = []
+    current_start, current_end, current_size = None, None, 0
+    for seg_start, seg_end in segments:
+        size = sum(len(line) for line in lines[seg_start:seg_end])
+        if current_start is not None and current_size + size > max_chars:
+            chunks.append((current_start, current_end))
+            current_start = None
+        if current_start is None:
+            current_start, current_size = seg_start, 0
+        current_end = seg_end
+        current_size += size
+    if current_start is not None:
+        chunks.append((current_start, current_end))
+
+    snippets = []
+    for chunk_start, chunk_end in chunks:
+        # Oversized symbols are split by lines.
+        piece_start, piece_size = chunk_start, 0
+        for i in range(chunk_start, chunk_end):
+            if i > piece_start and piece_size + len(lines[i]) > max_chars:
+                snippets.append((piece_start, i))
+                piece_start, piece_size = i, 0
+            piece_size += len(lines[i])
+        snippets.append((piece_start, chunk_end))
+
+    return [
+        {
+            "path": path,
+            "start_line": snippet_start + 1,
+            "end_line": snippet_end,
+            "text": "".join(lines[snippet_start:snippet_end]),
+        }
+        for snippet_start, snippet_end in snippets
+        if "".join(lines[snippet_start:snippet_end]).strip()
+    ]
+
+
+def chunk_corpus(sections_by_path):
+    chunks = []
+    for path, text in sections_by_path:
+        chunks.extend(chunk_file(path, text))
+    return chunks
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class HashEmbedder:
+    # Deterministic bag-of-identifiers embedding (hashing trick). Needs no
+    # network or model, so it doubles as the local stand-in for tests.
+    name = "hash"
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value & (1 << 63) else -1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return _normalize([self._embed(t) for t in texts]) if texts else np.zeros((0, self.dimensions), np.float32)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class VertexEmbedder:
+    name = "vertex"
+
+    def _embed(self, texts, task_type):
+        import utils_embeddings
+
+        return _normalize(utils_embeddings.embed_texts(texts, task_type=task_type))
+
+    def embed_documents(self, texts):
+        return self._embed(texts, "RETRIEVAL_DOCUMENT")
+
+    def embed_query(self, text):
+        return self._embed([text], "RETRIEVAL_QUERY")[0]
+
+
+def get_embedder(name=None):
+    name = name or os.environ.get("REPO_EMBEDDER", "vertex")
+    return HashEmbedder() if name == "hash" else VertexEmbedder()
+
+
+class RetrievalIndex:
+    def __init__(self, index, chunks):
+        self.index = index
+        self.chunks = chunks
+
+    @classmethod
+    def build(cls, chunks, embedder):
+        if not chunks:
+            return cls(None, [])
+        vectors = embedder.embed_documents([f"{c['path']}\n{c['text']}" for c in chunks])
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+        return cls(index, chunks)
+
+    def search(self, query_vector, top_k):
+        if not self.chunks:
+            return []
+        scores, ids = self.index.search(np.asarray([query_vector], dtype=np.float32), min(top_k, len(self.chunks)))
+        return [dict(self.chunks[i], score=float(s)) for s, i in zip(scores[0], ids[0]) if i >= 0]
+
+    def save(self, prefix):
+        # Both files are written under temporary names and renamed into place,
+        # so readers never see a partial index.
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        suffix = f"{threading.get_ident()}.tmp"
+        faiss.write_index(self.index, f"{prefix}.faiss.{suffix}")
+        with open(f"{prefix}.chunks.json.{suffix}", "w", encoding="utf-8") as f:
+            json.dump(self.chunks, f)
+        os.replace(f"{prefix}.chunks.json.{suffix}", f"{prefix}.chunks.json")
+        os.replace(f"{prefix}.faiss.{suffix}", f"{prefix}.faiss")
+
+    @classmethod
+    def load(cls, prefix):
+        with open(f"{prefix}.chunks.json", "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        return cls(faiss.read_index(f"{prefix}.faiss"), chunks)
+
+
+def index_prefix(repo_key, commit, embedder, index_dir=REPO_INDEX_DIR):
+    # Stored next to the commit's file index in the shared IndexStore directory.
+    return os.path.join(index_dir, repo_key, f"{commit}.{embedder.name}")
+
+
+def get_retrieval_index(repo_key, commit, corpus, embedder, index_dir=REPO_INDEX_DIR):
+    prefix = index_prefix(repo_key, commit, embedder, index_dir)
+    # Held like index_repo does, so only one session builds a commit's index
+    # and nobody loads it while it is being written.
+    with repo_lock(repo_key, index_dir):
+        try:
+            return RetrievalIndex.load(prefix)
+        except (FileNotFoundError, RuntimeError):
+            # Not built yet, or (partly) evicted by the IndexStore; faiss
+            # reports a missing file as a RuntimeError.
+            pass
+        retrieval_index = RetrievalIndex.build(chunk_corpus(corpus.file_texts()), embedder)
+        if retrieval_index.chunks:
+            retrieval_index.save(prefix)
+        return retrieval_index
+
+
+def get_retrieval_prompt(question, code_index, hits):
+    snippets = "\n".join(
+        f"----- File: {hit['path']} (lines {hit['start_line']}-{hit['end_line']}) -----\n{hit['text']}\n"
+        for hit in hits
+    )
+    return f"""
+    Task: {question}
+
+    Context:
+    - You are an expert code analyzer and technical writer.
+    - Only the parts of the codebase most relevant to the task are provided below.
+    - Here is an index of all the files in the codebase:
+      \n\n{code_index}\n\n
+    - The relevant code snippets are:
+      \n\n{snippets}\n\n
+
+    Instructions:
+    1. Carefully analyze the provided snippets.
+    2. Focus on addressing the specific task or question given.
+    3. If the snippets are not enough to answer with certainty, say which files or areas should be inspected next.
+    4. Use markdown formatting to enhance readability.
+    5. If relevant, include code snippets or examples from the codebase.
+
+    Response:
+    """
@@ -0,0 +1,159 @@
+import contextlib
+import fcntl
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+
+from utils_tokens import CHARS_PER_TOKEN
+
+# Indexed repositories are shared by every session and user on this instance:
+# one SQLite file per (repository, commit), plus any derived indexes stored next
+# to it, evicted least-recently-used first once the directory grows past
+# REPO_INDEX_MAX_BYTES.
+REPO_INDEX_DIR = os.environ.get("REPO_INDEX_DIR", "./.repo-index")
+REPO_INDEX_MAX_BYTES = int(os.environ.get("REPO_INDEX_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Temporary files older than this were left by an interrupted save and are
+# removed by the next eviction.
+STALE_TMP_SECONDS = 3600
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextlib.contextmanager
+def repo_lock(repo_key, index_dir=REPO_INDEX_DIR):
+    # Serializes cloning and indexing of one repository across the threads of
+    # this process and across processes sharing the same directory.
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(repo_key, threading.Lock())
+    os.makedirs(index_dir, exist_ok=True)
+    with thread_lock, open(os.path.join(index_dir, f"{repo_key}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class IndexStore:
+    def __init__(self, index_dir=REPO_INDEX_DIR, max_bytes=REPO_INDEX_MAX_BYTES):
+        self.index_dir = index_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, repo_key, commit):
+        return os.path.join(self.index_dir, repo_key, f"{commit}.sqlite")
+
+    def has(self, repo_key, commit):
+        return os.path.exists(self._path(repo_key, commit))
+
+    def latest_commit(self, repo_key):
+        repo_dir = os.path.join(self.index_dir, repo_key)
+        if not os.path.isdir(repo_dir):
+            return None
+        indexes = [f for f in os.listdir(repo_dir) if f.endswith(".sqlite")]
+        if not indexes:
+            return None
+        latest = max(indexes, key=lambda f: os.path.getmtime(os.path.join(repo_dir, f)))
+        return latest[: -len(".sqlite")]
+
+    def load(self, repo_key, commit):
+        # Returns None if the index doesn't exist (anymore): a save of another
+        # repository can evict it without holding this repository's lock. The
+        # database is opened read-only so a missing file is never re-created
+        # empty; once open, it stays readable even if it is evicted meanwhile.
+        path = self._path(repo_key, commit)
+        uri = f"file:{urllib.request.pathname2url(os.path.abspath(path))}?mode=ro"
+        try:
+            with contextlib.closing(sqlite3.connect(uri, uri=True)) as db:
+                rows = db.execute("SELECT path, label, size, tokens, content FROM files ORDER BY path").fetchall()
+            # Reading counts as use for the LRU eviction; mtime still marks when
+            # the commit was indexed, which latest_commit relies on.
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except (sqlite3.OperationalError, FileNotFoundError):
+            return None
+        return {
+            path: {
+                "label": label,
+                "size": size,
+                "tokens": tokens,
+                "text": zlib.decompress(content).decode("utf-8") if content is not None else None,
+            }
+            for path, label, size, tokens, content in rows
+        }
+
+    def save(self, repo_key, commit, repo_url, records):
+        path = self._path(repo_key, commit)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique name per save, so neither a concurrent save nor one that was
+        # interrupted earlier can collide with it.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{commit}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            self._write(tmp_path, commit, repo_url, records)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+        self.evict(keep=path)
+
+    def _write(self, db_path, commit, repo_url, records):
+        with contextlib.closing(sqlite3.connect(db_path)) as db:
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.execute(
+                "CREATE TABLE files (path TEXT PRIMARY KEY, label TEXT, size INTEGER, tokens INTEGER, content BLOB)"
+            )
+            db.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [("url", repo_url), ("commit", commit), ("indexed_at", str(time.time()))],
+            )
+            db.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        file_path,
+                        record["label"],
+                        len(record["text"].encode("utf-8")) if record["text"] is not None else None,
+                        -(-len(record["text"]) // CHARS_PER_TOKEN) if record["text"] is not None else None,
+                        zlib.compress(record["text"].encode("utf-8")) if record["text"] is not None else None,
+                    )
+                    for file_path, record in records.items()
+                ],
+            )
+            db.commit()
+
+    def evict(self, keep=None):
+        entries = []
+        total = os.path.getsize(keep) if keep else 0
+        now = time.time()
+        for root, _, files in os.walk(self.index_dir):
+            if root == self.index_dir:
+                continue
+            for file in files:
+                path = os.path.join(root, file)
+                if file.endswith(".tmp"):
+                    # In-progress saves are left alone; abandoned ones go.
+                    with contextlib.suppress(OSError):
+                        if now - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                            os.remove(path)
+                    continue
+                if path == keep:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
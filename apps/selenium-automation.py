@@ -1,12 +1,8 @@
 import streamlit as st
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part, GenerationConfig, HarmCategory, HarmBlockThreshold
-import os
-from utils_streamlit import reset_st_state
-
-PROJECT_ID = os.environ.get("GCP_PROJECT")
-LOCATION = os.environ.get("GCP_REGION")
-vertexai.init(project=PROJECT_ID, location=LOCATION)
+from vertexai.generative_models import GenerationConfig, HarmCategory, HarmBlockThreshold
+from utils_streamlit import reset_st_state, render_keyframe_toggle
+from utils_models import load_models
+from utils_video import estimate_keyframe_tokens, estimate_video_tokens, video_request
 
 if 'response' not in st.session_state:
     st.session_state['response'] = 'init'
@@ -24,12 +20,6 @@ st.markdown("""
     }
     </style>
     """, unsafe_allow_html=True)
-@st.cache_resource
-def load_models(name):
-    text_model_pro = GenerativeModel(name)
-    multimodal_model_pro = GenerativeModel(name)
-    return text_model_pro, multimodal_model_pro
-
 def get_gemini_pro_vision_response(model, prompt_list, generation_config={}, stream=True):
     generation_config = {"temperature": 0.1, "max_output_tokens": 2048}
     responses = model.generate_content(
@@ -47,15 +37,16 @@ def count_tokens(model, text):
     response = model.count_tokens(text)
     return response.total_tokens, response.total_billable_characters
 
-def calculate_cost(model_name, input_chars, output_chars, video_duration=0):
+def calculate_cost(model_name, input_chars, output_chars, video_duration=0, image_count=0):
+    # Images are billed at the same rate as one second of video.
     if model_name == "gemini-1.5-flash-001":
         input_cost = (input_chars / 1000) * 0.00001875
         output_cost = (output_chars / 1000) * 0.000075
-        video_cost = video_duration * 0.00002
+        video_cost = (video_duration + image_count) * 0.00002
     else:  # gemini-1.5-pro-001 or gemini-experimental
         input_cost = (input_chars / 1000) * 0.00125
         output_cost = (output_chars / 1000) * 0.00375
-        video_cost = video_duration * 0.001315
+        video_cost = (video_duration + image_count) * 0.001315
     
     return input_cost + output_cost + video_cost
 
@@ -113,7 +104,13 @@ with col1:
     Provide the description in {story_lang}.
     """
 
-    vide_desc_img = Part.from_uri(vide_desc_uri, mime_type="video/mp4")
+    keyframes = render_keyframe_toggle(vide_desc_uri)
+
+# Video seconds and images billed for the video input.
+if keyframes is None:
+    video_duration, image_count = 60, 0  # Assuming the video is 60 seconds long. Adjust as needed.
+else:
+    video_duration, image_count = 0, len(keyframes["frames"])
 
 with col2:
     # API Costs Session at the top right
@@ -133,14 +130,14 @@ with col2:
 
     if vide_desc_description and prompt:
         with st.spinner("Analyzing video and generating description..."):
-            response = get_gemini_pro_vision_response(multimodal_model_pro, [prompt, vide_desc_img])
+            video_model, video_input = video_request(multimodal_model_pro, vide_desc_uri, keyframes)
+            response = get_gemini_pro_vision_response(video_model, [prompt, *video_input])
             st.session_state["response"] = response
 
             # Calculate and update costs for video description generation
             input_tokens, input_chars = count_tokens(text_model_pro, prompt)
             output_tokens, output_chars = count_tokens(text_model_pro, response)
-            video_duration = 60  # Assuming the video is 60 seconds long. Adjust as needed.
-            total_cost = calculate_cost(model_name, input_chars, output_chars, video_duration)
+            total_cost = calculate_cost(model_name, input_chars, output_chars, video_duration, image_count)
             st.session_state['api_costs'].append(total_cost)
             update_session_analysis("Generate Description", total_cost)
 
@@ -150,20 +147,28 @@ with col2:
         input_tokens, input_chars = count_tokens(text_model_pro, prompt)
         output_tokens, output_chars = count_tokens(text_model_pro, st.session_state["response"])
         
-        video_duration = 60  # Assuming the video is 60 seconds long. Adjust as needed.
-        total_cost = calculate_cost(model_name, input_chars, output_chars, video_duration)
+        total_cost = calculate_cost(model_name, input_chars, output_chars, video_duration, image_count)
         
         token_data = {
             "Metric": ["Input", "Output", "Total", "API Cost"],
             "Tokens": [input_tokens, output_tokens, input_tokens + output_tokens, ""],
             "Characters": [input_chars, output_chars, input_chars + output_chars, ""],
             "Cost ($)": [
-                calculate_cost(model_name, input_chars, 0, video_duration),
+                calculate_cost(model_name, input_chars, 0, video_duration, image_count),
                 calculate_cost(model_name, 0, output_chars, 0),
                 total_cost,
                 total_cost
             ]
         }
+        if keyframes is not None:
+            # Before/after estimate for the video input alone.
+            token_data["Metric"] += ["Video (full)", "Video (keyframes)"]
+            token_data["Tokens"] += [estimate_video_tokens(keyframes["duration"]), estimate_keyframe_tokens(keyframes)]
+            token_data["Characters"] += ["", ""]
+            token_data["Cost ($)"] += [
+                calculate_cost(model_name, 0, 0, keyframes["duration"]),
+                calculate_cost(model_name, 0, 0, 0, image_count),
+            ]
         
         st.table(token_data)
 
@@ -177,7 +182,8 @@ with col2:
 
                 {st.session_state["response"]}
                 """
-                selenium_response = get_gemini_pro_vision_response(multimodal_model_pro, [prompt_selenium, vide_desc_img])
+                video_model, video_input = video_request(multimodal_model_pro, vide_desc_uri, keyframes)
+                selenium_response = get_gemini_pro_vision_response(video_model, [prompt_selenium, *video_input])
                 
                 with st.expander("Selenium Script", expanded=True):
                     st.code(selenium_response, language="python")
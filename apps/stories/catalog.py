@@ -0,0 +1,113 @@
+import os
+import re
+import threading
+import time
+
+DATA_DIR = os.environ.get(
+    "STORY_THEMES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+)
+INDUSTRIES = ["retail", "energy", "health", "finance", "beauty"]
+LANGUAGES = {"English": "en", "Portuguese": "pt", "Spanish": "es"}
+FALLBACK_LANGUAGE = "en"
+# Files are stat'ed for changes at most this often, so reruns are served from
+# memory.
+RELOAD_INTERVAL_SECONDS = float(os.environ.get("STORY_THEMES_RELOAD_SECONDS", "2"))
+
+_THEME_FILE = re.compile(r"^(?P<industry>[a-z]+)-(?P<lang>[a-z]{2})\.txt$")
+_TAGGED_LINE = re.compile(r"^\[(?P<tag>[^\]]+)\]\s*(?P<text>.*)$")
+
+
+def parse_themes(path, industry, lang):
+    # One record per non-empty line: {"industry", "lang", "tag", "text", "raw"}.
+    # Lines without a "[Tag]" prefix get tag None.
+    themes = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f.read().splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            match = _TAGGED_LINE.match(line)
+            themes.append({
+                "industry": industry,
+                "lang": lang,
+                "tag": match.group("tag").strip() if match else None,
+                "text": match.group("text") if match else line,
+                "raw": line,
+            })
+    return themes
+
+
+class ThemeCatalog:
+    # All data/{industry}-{lang}.txt theme files, parsed once and indexed by
+    # (industry, lang) and by tag. The directory is rescanned when a file is
+    # added, removed or modified.
+    def __init__(self, data_dir=DATA_DIR, reload_interval=RELOAD_INTERVAL_SECONDS):
+        self.data_dir = data_dir
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._checked_at = 0.0
+        self._themes = {}
+        self._by_tag = {}
+        self.loads = 0
+
+    def _scan(self):
+        mtimes = {}
+        try:
+            names = os.listdir(self.data_dir)
+        except FileNotFoundError:
+            return mtimes
+        for name in names:
+            if _THEME_FILE.match(name):
+                try:
+                    mtimes[name] = os.path.getmtime(os.path.join(self.data_dir, name))
+                except FileNotFoundError:
+                    pass
+        return mtimes
+
+    def _load(self, mtimes):
+        themes, by_tag = {}, {}
+        for name in sorted(mtimes):
+            match = _THEME_FILE.match(name)
+            key = (match.group("industry"), match.group("lang"))
+            themes[key] = parse_themes(os.path.join(self.data_dir, name), *key)
+            for theme in themes[key]:
+                if theme["tag"] is not None:
+                    by_tag.setdefault(theme["tag"].lower(), []).append(theme)
+        self._themes, self._by_tag, self._mtimes = themes, by_tag, mtimes
+        self.loads += 1
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._mtimes is not None and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if self._mtimes is not None and now - self._checked_at < self.reload_interval:
+                return
+            mtimes = self._scan()
+            if mtimes != self._mtimes:
+                self._load(mtimes)
+            self._checked_at = now
+
+    def themes(self, industry, lang):
+        # Themes for an industry in a language, or in FALLBACK_LANGUAGE when
+        # that language has no file; check the records' "lang" to tell.
+        self._refresh()
+        themes = self._themes.get((industry, lang))
+        if themes is None:
+            themes = self._themes.get((industry, FALLBACK_LANGUAGE), [])
+        return themes
+
+    def by_tag(self, tag, lang=None):
+        self._refresh()
+        return [theme for theme in self._by_tag.get(tag.lower(), []) if lang is None or theme["lang"] == lang]
+
+    def tags(self, industry, lang):
+        return [theme["tag"] for theme in self.themes(industry, lang) if theme["tag"] is not None]
+
+    def industries(self):
+        self._refresh()
+        return sorted({industry for industry, _ in self._themes})
+
+
+theme_catalog = ThemeCatalog()
@@ -0,0 +1,89 @@
+import hashlib
+import time
+
+from utils_cache import stable_key
+
+
+def step(key, label, prompt, after=()):
+    # One stage of a StepPipeline. `prompt(outputs)` builds the stage's prompt,
+    # where `outputs` maps each key in `after` to that stage's generated text.
+    return {"key": key, "label": label, "prompt": prompt, "after": tuple(after)}
+
+
+def _ordered(steps):
+    # Steps in dependency order; raises ValueError on unknown keys or cycles.
+    by_key = {s["key"]: s for s in steps}
+    if len(by_key) != len(steps):
+        raise ValueError("Duplicate step keys")
+    ordered, visiting, done = [], set(), set()
+
+    def visit(s):
+        if s["key"] in done:
+            return
+        if s["key"] in visiting:
+            raise ValueError(f"Cycle through step {s['key']!r}")
+        visiting.add(s["key"])
+        for key in s["after"]:
+            if key not in by_key:
+                raise ValueError(f"Step {s['key']!r} depends on unknown step {key!r}")
+            visit(by_key[key])
+        visiting.discard(s["key"])
+        done.add(s["key"])
+        ordered.append(s)
+
+    for s in steps:
+        visit(s)
+    return ordered
+
+
+def input_hash(prompt, *salt):
+    # A stage's prompt embeds everything it depends on (page inputs and
+    # upstream outputs), so hashing it with the model identifies its inputs.
+    return hashlib.sha256(stable_key(prompt, *salt).encode("utf-8")).hexdigest()
+
+
+class StepPipeline:
+    # Runs a DAG of prompt stages end to end in one pass, streaming each stage
+    # as it generates. Results are memoized per stage in `memo` (e.g. a
+    # session_state dict) by input hash: a stage whose prompt is unchanged is
+    # reused without calling the model, so editing a late stage's inputs only
+    # regenerates that stage and the ones after it.
+    def __init__(self, steps):
+        self.steps = _ordered(steps)
+
+    def run(self, generate, memo, salt=(), reuse=True):
+        # `generate(prompt)` returns an iterable of text chunks. With `reuse`
+        # off, every stage is regenerated and the memo is only written. Yields:
+        #   ("start", key)
+        #   ("chunk", key, text)
+        #   ("done", key, entry, reused)  entry: {"hash", "prompt", "output", "seconds"}
+        #   ("error", key, exception)     later stages are skipped and forgotten
+        outputs = {}
+        for i, s in enumerate(self.steps):
+            key = s["key"]
+            yield ("start", key)
+            try:
+                prompt = s["prompt"]({k: outputs[k] for k in s["after"]})
+                digest = input_hash(prompt, *salt)
+                entry = memo.get(key)
+                if reuse and entry is not None and entry["hash"] == digest:
+                    outputs[key] = entry["output"]
+                    yield ("done", key, entry, True)
+                    continue
+                start = time.perf_counter()
+                chunks = []
+                for chunk in generate(prompt):
+                    chunks.append(chunk)
+                    yield ("chunk", key, chunk)
+                if not chunks:
+                    raise ValueError("The model returned an empty response")
+            except Exception as e:
+                for later in self.steps[i:]:
+                    memo.pop(later["key"], None)
+                yield ("error", key, e)
+                return
+            entry = {"hash": digest, "prompt": prompt, "output": "".join(chunks),
+                     "seconds": time.perf_counter() - start}
+            memo[key] = entry
+            outputs[key] = entry["output"]
+            yield ("done", key, entry, False)
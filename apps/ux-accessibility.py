@@ -1,24 +1,12 @@
 import streamlit as st
-import os
-import vertexai
 from vertexai.generative_models import (
     GenerationConfig,
-    GenerativeModel,
     HarmBlockThreshold,
     HarmCategory,
-    Part,
 )
-
-def load_vertex(region):
-    PROJECT_ID = os.environ.get("GCP_PROJECT")
-    LOCATION = os.environ.get(f"{region}")
-    vertexai.init(project=PROJECT_ID, location=LOCATION)
-
-@st.cache_resource
-def load_models(name):
-    text_model_pro = GenerativeModel(name)
-    multimodal_model_pro = GenerativeModel(name)
-    return text_model_pro, multimodal_model_pro
+from utils_models import load_models
+from utils_streamlit import render_keyframe_toggle
+from utils_video import video_request
 
 def get_gemini_pro_vision_response_stream(
     model, prompt_list, generation_config={}, stream: bool = True
@@ -59,8 +47,6 @@ with col1:
         key="model_region",
     )
 
-    load_vertex(model_region)
-
     model_name = st.radio(
         "Select Model:",
         ["gemini-experimental", "gemini-1.5-pro-001", "gemini-1.5-flash-001"],
@@ -82,7 +68,7 @@ with col1:
         key="use_case",
     )
 
-    text_model_pro, multimodal_model_pro = load_models(model_name)
+    text_model_pro, multimodal_model_pro = load_models(model_name, region=model_region)
 
     if use_case == "Retail (Nike)":
         video_uri = "gs://convento-samples/nike-sbf.mp4"
@@ -97,6 +83,7 @@ with col1:
             Your browser does not support the video tag.
         </video>
     """, unsafe_allow_html=True)
+    keyframes = render_keyframe_toggle(video_uri)
 
 with col2:
     with st.expander("WCAG Compliance Analysis", expanded=False):
@@ -117,8 +104,8 @@ with col2:
 
             Follow with a concise summary of overall WCAG compliance strengths and weaknesses, and specific, actionable recommendations for improvement.
             """
-            video_part = Part.from_uri(video_uri, mime_type="video/mp4")
-            wcag_response_stream = get_gemini_pro_vision_response_stream(multimodal_model_pro, [prompt_wcag, video_part])
+            video_model, video_input = video_request(multimodal_model_pro, video_uri, keyframes)
+            wcag_response_stream = get_gemini_pro_vision_response_stream(video_model, [prompt_wcag, *video_input])
             
             full_response = ""
             for chunk in wcag_response_stream:
@@ -145,8 +132,8 @@ with col2:
                 Priority | User Story | WCAG Guideline | Details (including issue and recommendation)
                 """
                 prompt_user_story += "\n" + st.session_state["wcag_analysis"]
-                video_part = Part.from_uri(video_uri, mime_type="video/mp4")
-                user_story_response_stream = get_gemini_pro_vision_response_stream(multimodal_model_pro, [prompt_user_story, video_part])
+                video_model, video_input = video_request(multimodal_model_pro, video_uri, keyframes)
+                user_story_response_stream = get_gemini_pro_vision_response_stream(video_model, [prompt_user_story, *video_input])
                 
                 full_response = ""
                 for chunk in user_story_response_stream:
@@ -1,13 +1,12 @@
 import streamlit as st
-import os
-import vertexai
 from vertexai.generative_models import (
     GenerationConfig,
-    GenerativeModel,
     HarmBlockThreshold,
     HarmCategory,
-    Part,
 )
+from utils_models import load_models
+from utils_streamlit import render_keyframe_toggle
+from utils_video import video_request
 
 
 # Custom CSS to resize video, style tabs, and improve button appearance
@@ -44,17 +43,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_vertex(region):
-    PROJECT_ID = os.environ.get("GCP_PROJECT")
-    LOCATION = os.environ.get(f"{region}")
-    vertexai.init(project=PROJECT_ID, location=LOCATION)
-
-@st.cache_resource
-def load_models(name):
-    text_model_pro = GenerativeModel(name)
-    multimodal_model_pro = GenerativeModel(name)
-    return text_model_pro, multimodal_model_pro
-
 def get_gemini_pro_response(model, prompt, generation_config={}, stream=True):
     generation_config = {"temperature": 0.1, "max_output_tokens": 8192}
     response = model.generate_content(prompt, generation_config=generation_config, stream=stream)
@@ -120,8 +108,7 @@ with col2:
     )
 
 # Load models and video
-load_vertex(model_region)
-text_model_pro, multimodal_model_pro = load_models(model_name)
+text_model_pro, multimodal_model_pro = load_models(model_name, region=model_region)
 
 video_uris = {
     "E-commerce (Nike)": "gs://convento-samples/nike-sbf.mp4",
@@ -134,6 +121,7 @@ video_url = "https://storage.googleapis.com/" + selected_video_uri.split("gs://"
 
 st.header("User Interaction Video")
 st.video(video_url)
+keyframes = render_keyframe_toggle(selected_video_uri)
 
 # Friction Log Generation
 st.header("Analysis Generation")
@@ -179,10 +167,10 @@ if st.button("Generate Analysis", key="generate_analysis", disabled=st.session_s
     st.session_state['user_story_status'] = "Running"
     
     with st.spinner("Generating Friction Log..."):
-        video_part = Part.from_uri(selected_video_uri, mime_type="video/mp4")
+        video_model, video_input = video_request(multimodal_model_pro, selected_video_uri, keyframes)
         friction_response = ""
         friction_placeholder = st.empty()
-        for chunk in get_gemini_pro_response(multimodal_model_pro, [friction_prompt, video_part]):
+        for chunk in get_gemini_pro_response(video_model, [friction_prompt, *video_input]):
             friction_response += chunk
             friction_placeholder.markdown(friction_response)
         st.session_state['friction_log'] = friction_response
@@ -1,24 +1,12 @@
 import streamlit as st
-import os
-import vertexai
 from vertexai.generative_models import (
     GenerationConfig,
-    GenerativeModel,
     HarmBlockThreshold,
     HarmCategory,
-    Part,
 )
-
-def load_vertex(region):
-    PROJECT_ID = os.environ.get("GCP_PROJECT")
-    LOCATION = os.environ.get(f"{region}")
-    vertexai.init(project=PROJECT_ID, location=LOCATION)
-
-@st.cache_resource
-def load_models(name):
-    text_model_pro = GenerativeModel(name)
-    multimodal_model_pro = GenerativeModel(name)
-    return text_model_pro, multimodal_model_pro
+from utils_models import load_models
+from utils_streamlit import render_keyframe_toggle
+from utils_video import video_request
 
 def get_gemini_pro_vision_response(
     model, prompt_list, generation_config={}, stream: bool = True
@@ -102,8 +90,7 @@ with col2:
         key="use_case",
     )
 
-load_vertex(model_region)
-text_model_pro, multimodal_model_pro = load_models(model_name)
+text_model_pro, multimodal_model_pro = load_models(model_name, region=model_region)
 
 if use_case == "Nike Mobile App":
     video_uri = "gs://convento-samples/nike-sbf.mp4"
@@ -144,6 +131,7 @@ video_url = ("https://storage.googleapis.com/" + video_uri.split("gs://")[1])
 
 st.subheader("Video for Analysis")
 st.video(video_url)
+keyframes = render_keyframe_toggle(video_uri)
 
 col1, col2 = st.columns(2)
 
@@ -156,9 +144,9 @@ with col1:
         st.session_state['friction_log_state'] = 'Running'
         with st.spinner("Analyzing video and generating friction log..."):
             prompt = f"All answers should be provided in {story_lang}. {heuristic_prompt}"
-            video_part = Part.from_uri(video_uri, mime_type="video/mp4")
             try:
-                response = get_gemini_pro_vision_response(multimodal_model_pro, [prompt, video_part])
+                video_model, video_input = video_request(multimodal_model_pro, video_uri, keyframes)
+                response = get_gemini_pro_vision_response(video_model, [prompt, *video_input])
                 st.session_state['friction_log'] = response
                 st.session_state['friction_log_state'] = 'Completed'
             except Exception as e:
@@ -0,0 +1,50 @@
+# Compares billed input and time-to-first-token for the repo-inspection
+# analyses with and without a cached repository prefix, using the local
+# simulation backend (no network needed). Run from the repository root:
+#   python snippets/context-cache-benchmark.py [corpus MB]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.repo_inspection.context_cache import LocalContextCache, get_code_prefix, get_question_suffix
+from utils_tokens import billable_characters
+
+QUESTIONS = ["summary", "readme", "onboarding", "issues", "bug_fix", "troubleshooting"]
+CORPUS_MB = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+line = "def handler(request):  return render(request, 'index.html', {'items': load_items()})\n"
+files = [f"src/module_{i}.py" for i in range(200)]
+body = line * int(CORPUS_MB * 1024 * 1024 / len(line) / len(files))
+code_text = "".join(f"----- File: {f} -----\n{body}\n-------------------------\n" for f in files)
+
+cache = LocalContextCache()
+
+
+def time_to_first_token(responses):
+    start = time.perf_counter()
+    next(iter(responses))
+    return time.perf_counter() - start
+
+
+for cached in (False, True):
+    total_cost, total_characters, ttfts = 0.0, 0, []
+    for question in QUESTIONS:
+        suffix = get_question_suffix(question)
+        if cached:
+            entry, setup_cost, _ = cache.get_or_register("benchmark", "HEAD", lambda: get_code_prefix(files, code_text))
+            responses, cost = cache.generate(entry, suffix)
+            cost += setup_cost
+            total_characters += billable_characters(suffix) + (entry["characters"] if setup_cost else 0)
+        else:
+            prompt = get_code_prefix(files, code_text) + suffix
+            responses, cost = cache.generate(None, prompt)
+            total_characters += billable_characters(prompt)
+        ttfts.append(time_to_first_token(responses))
+        total_cost += cost
+    label = "cached prefix" if cached else "full prompt"
+    print(
+        f"{label:14s} billed input chars (full rate): {total_characters:>12,}  cost: ${total_cost:8.4f}  "
+        f"median TTFT: {sorted(ttfts)[len(ttfts) // 2] * 1000:7.1f} ms"
+    )
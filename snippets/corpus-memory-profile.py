@@ -0,0 +1,57 @@
+# Reports peak RSS of building the repo-inspection prompt corpus with repeated
+# string concatenation vs the Corpus builder, on a synthetic repository.
+# Run from the repository root (size in MB, default 500):
+#   python snippets/corpus-memory-profile.py [size_mb]
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FILE_BYTES = 256 * 1024
+
+
+def concatenate(repo_dir):
+    code_text = ""
+    for root, _, files in os.walk(repo_dir):
+        for file in sorted(files):
+            relative_path = os.path.relpath(os.path.join(root, file), repo_dir)
+            with open(os.path.join(root, file), "r") as f:
+                code_text += f"----- File: {relative_path} -----\n"
+                code_text += f.read()
+                code_text += "\n-------------------------\n"
+    return len(code_text)
+
+
+def corpus(repo_dir):
+    from apps.repo_inspection.corpus import Corpus
+
+    builder = Corpus()
+    for root, _, files in os.walk(repo_dir):
+        for file in sorted(files):
+            with open(os.path.join(root, file), "r") as f:
+                builder.add_file(os.path.relpath(os.path.join(root, file), repo_dir), f.read())
+    return builder.total_bytes
+
+
+if len(sys.argv) > 2 and sys.argv[1] == "--run":
+    method, repo_dir = sys.argv[2], sys.argv[3]
+    size = {"concatenate": concatenate, "corpus": corpus}[method](repo_dir)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{method:12s} corpus {size / 1024 / 1024:8.1f} MB   peak RSS {peak_mb:8.1f} MB")
+    sys.exit(0)
+
+size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+with tempfile.TemporaryDirectory() as tmp:
+    line = "def handler(request):\n    return process(request.payload)  # synthetic\n"
+    content = (line * (FILE_BYTES // len(line) + 1))[:FILE_BYTES]
+    for i in range(size_mb * 1024 * 1024 // FILE_BYTES):
+        directory = os.path.join(tmp, f"pkg{i % 100}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"module_{i}.py"), "w") as f:
+            f.write(content)
+    for method in ("concatenate", "corpus"):
+        subprocess.run([sys.executable, __file__, "--run", method, tmp], cwd=ROOT, check=True)
@@ -0,0 +1,59 @@
+# Request bytes and time per pipeline step when the same uploaded file is sent
+# to the model in several steps (description, script, user stories): inline
+# bytes on every step vs. the media registry with an upload-once store. Runs
+# offline against a local stand-in backend. Run from the repository root:
+#   python snippets/media-registry-benchmark.py [file MB] [uplink MB/s]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils_media import LocalUploader, MediaRegistry
+
+FILE_MB = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+UPLINK_MB_PER_SECOND = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+STEPS = ["description", "script", "user stories"]
+
+data = os.urandom(int(FILE_MB * 1024 * 1024))
+
+
+def send(part):
+    # Stand-in backend: a request costs the time to transmit its inline bytes.
+    kind, payload = part
+    size = len(payload) if kind == "inline" else len(payload.encode("utf-8"))
+    time.sleep(size / (UPLINK_MB_PER_SECOND * 1024 * 1024))
+    return size
+
+
+class SlowUploader(LocalUploader):
+    # The one-off upload goes over the same uplink as the requests.
+    def upload(self, data, digest, mime_type):
+        time.sleep(len(data) / (UPLINK_MB_PER_SECOND * 1024 * 1024))
+        return super().upload(data, digest, mime_type)
+
+
+def run(registry):
+    rows = []
+    for step in STEPS:
+        start = time.perf_counter()
+        sent = send(registry.from_bytes(data, "video/mp4"))
+        rows.append((step, sent, time.perf_counter() - start))
+    return rows
+
+
+with tempfile.TemporaryDirectory() as directory:
+    baseline = MediaRegistry(
+        max_entries=0, part_from_uri=lambda u, m: ("uri", u), part_from_bytes=lambda d, m: ("inline", d)
+    )
+    registry = MediaRegistry(
+        uploader=SlowUploader(directory),
+        part_from_uri=lambda u, m: ("uri", u),
+        part_from_bytes=lambda d, m: ("inline", d),
+    )
+    for label, reg in (("inline every step", baseline), ("upload once", registry)):
+        print(label)
+        for step, sent, seconds in run(reg):
+            print(f"  {step:14s} request bytes: {sent:>12,}  time: {seconds * 1000:8.1f} ms")
+        print(f"  stats: {reg.stats}")
@@ -0,0 +1,65 @@
+# Compares cold vs warm repo-inspection indexing, and the clone modes, on a
+# local bare repository fixture. Run from the repository root:
+#   python snippets/repo-index-benchmark.py [file_count]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import git
+
+from apps.repo_inspection.indexing import index_repo
+
+FILE_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+with tempfile.TemporaryDirectory() as tmp:
+    bare = git.Repo.init(os.path.join(tmp, "origin.git"), bare=True)
+    work = git.Repo.clone_from(bare.working_dir, os.path.join(tmp, "work"))
+    for i in range(FILE_COUNT):
+        path = os.path.join(work.working_dir, f"pkg{i % 20}", f"module_{i}.py")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(f"def function_{i}(value):\n    return value * {i}\n")
+    work.git.add(A=True)
+    work.index.commit("initial")
+    with open(os.path.join(work.working_dir, "vendor.bin"), "wb") as f:
+        f.write(os.urandom(5 * 1024 * 1024))
+    work.git.add(A=True)
+    work.index.commit("vendor a binary")
+    work.git.push("origin", "HEAD:master")
+    bare.git.symbolic_ref("HEAD", "refs/heads/master")
+    bare.git.config("uploadpack.allowFilter", "true")
+
+    url = f"file://{bare.working_dir}"
+    cache_dir = os.path.join(tmp, "cache")
+
+    for label in ("cold", "warm (unchanged)"):
+        start = time.perf_counter()
+        _, _, stats = index_repo(url, cache_dir)
+        print(f"{label:24s} {time.perf_counter() - start:8.2f}s  {stats}")
+
+    with open(os.path.join(work.working_dir, "pkg0", "module_0.py"), "a") as f:
+        f.write("\n# changed\n")
+    work.git.add(A=True)
+    work.index.commit("change one file")
+    work.git.push("origin", "HEAD:master")
+
+    start = time.perf_counter()
+    _, _, stats = index_repo(url, cache_dir)
+    print(f"{'warm (1 file changed)':24s} {time.perf_counter() - start:8.2f}s  {stats}")
+
+    clone_modes = {
+        "full clone": {},
+        "depth 1": {"depth": 1},
+        "depth 1, single branch": {"depth": 1, "single_branch": True},
+        "depth 1, blob limit 1m": {"depth": 1, "blob_limit": "1m"},
+        "sparse pkg0/**": {"depth": 1, "include": ["pkg0/**"]},
+    }
+    for label, clone_options in clone_modes.items():
+        _, _, stats = index_repo(url, os.path.join(tmp, "modes"), clone_options)
+        print(
+            f"{label:24s} {stats['clone_seconds']:8.2f}s  "
+            f"{stats['bytes_transferred'] / 1024:10.0f} KB  {stats['files']} files"
+        )
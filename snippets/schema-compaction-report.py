@@ -0,0 +1,64 @@
+# Token volume of the dataform-gen SQL prompt before and after schema
+# compaction, for the billing sample and for large synthetic schemas. Before:
+# the pretty-printed JSON schema is embedded four times. After: the compact
+# DDL-like schema is embedded once. Run from the repository root:
+#   python snippets/schema-compaction-report.py
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.dataform.schema import SAMPLE_BILLING_SCHEMA, SCHEMA_NOTATION, compact_schema
+from utils_tokens import estimate_tokens
+
+INSTRUCTIONS = "generate a SQLx query for Dataform to answer the question: What did each project spend last month?"
+
+
+def synthetic_schema(top_level, seed=0):
+    # Wide, nested schema in which the same few RECORD shapes recur, as in
+    # real exports (labels, key/value pairs, addresses...).
+    rng = random.Random(seed)
+    shared = [
+        [{"name": n, "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []} for n in ("key", "value")],
+        [{"name": n, "mode": "NULLABLE", "type": t, "description": "", "fields": []}
+         for n, t in (("street", "STRING"), ("city", "STRING"), ("zip", "STRING"), ("lat", "FLOAT"), ("lng", "FLOAT"))],
+    ]
+
+    def field(name, depth):
+        kind = rng.random()
+        if depth < 3 and kind < 0.25:
+            return {"name": name, "mode": "NULLABLE", "type": "RECORD", "description": "",
+                    "fields": [field(f"{name}_{i}", depth + 1) for i in range(rng.randint(2, 6))]}
+        if kind < 0.45:
+            return {"name": name, "mode": rng.choice(["NULLABLE", "REPEATED"]), "type": "RECORD", "description": "",
+                    "fields": rng.choice(shared)}
+        return {"name": name, "mode": "NULLABLE", "type": rng.choice(["STRING", "INTEGER", "FLOAT", "TIMESTAMP"]),
+                "description": "", "fields": []}
+
+    return [field(f"col_{i}", 0) for i in range(top_level)]
+
+
+def count_fields(fields):
+    return sum(1 + count_fields(f.get("fields") or []) for f in fields)
+
+
+def before(schema):
+    text = json.dumps(schema, indent=2)
+    return text + "\n" + f"Given the following table schema in JSON format: \n{text} {INSTRUCTIONS} " + f"{text} {text}"
+
+
+def after(schema):
+    return f"{SCHEMA_NOTATION} \n{compact_schema(schema)}\n Given the table schema above, {INSTRUCTIONS}"
+
+
+cases = [("billing sample", SAMPLE_BILLING_SCHEMA)]
+cases += [(f"synthetic, {n} columns", synthetic_schema(n)) for n in (200, 1000, 3000)]
+print(f"{'schema':24s} {'fields':>7s} {'before':>12s} {'after':>10s} {'reduction':>10s}")
+for label, schema in cases:
+    tokens_before, tokens_after = estimate_tokens(before(schema)), estimate_tokens(after(schema))
+    print(
+        f"{label:24s} {count_fields(schema):>7,} {tokens_before:>12,} {tokens_after:>10,} "
+        f"{1 - tokens_after / tokens_before:>9.1%}"
+    )
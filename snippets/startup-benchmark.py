@@ -0,0 +1,25 @@
+# Measures the cold-start cost of `import utils_vertex` and of the first
+# access to a model. Run from the repository root:
+#   python snippets/startup-benchmark.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+start = time.perf_counter()
+import utils_vertex
+import_time = time.perf_counter() - start
+
+start = time.perf_counter()
+utils_vertex.model_gemini_pro
+first_access = time.perf_counter() - start
+
+start = time.perf_counter()
+utils_vertex.model_gemini_pro
+cached_access = time.perf_counter() - start
+
+print(f"import utils_vertex:        {import_time * 1000:8.1f} ms")
+print(f"first model_gemini_pro:     {first_access * 1000:8.1f} ms")
+print(f"cached model_gemini_pro:    {cached_access * 1000:8.3f} ms")
+print(f"models built: {utils_vertex.loaded_models()}")
@@ -0,0 +1,30 @@
+# Compares time-to-first-token with a blocking count_tokens call before
+# generation against the local token estimate. Run from the repository root:
+#   python snippets/ttft-benchmark.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils_vertex
+from utils_tokens import check_token_limit, count_prompt
+
+PROMPT = "Write a short user story about a customer comparing running shoes online."
+RUNS = 3
+
+
+def time_to_first_token(exact):
+    model = utils_vertex.model_gemini_flash
+    start = time.perf_counter()
+    total_tokens, _ = count_prompt(model, PROMPT, exact=exact)
+    check_token_limit(total_tokens, utils_vertex.TOKEN_LIMIT)
+    for chunk in model.generate_content(PROMPT, generation_config=utils_vertex.generation_config, stream=True):
+        return time.perf_counter() - start
+
+
+utils_vertex.model_gemini_flash
+for exact in (True, False):
+    samples = sorted(time_to_first_token(exact) for _ in range(RUNS))
+    label = "count_tokens + generate" if exact else "local estimate + generate"
+    print(f"{label:28s} median TTFT: {samples[RUNS // 2] * 1000:8.1f} ms")
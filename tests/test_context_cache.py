@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from apps.repo_inspection.context_cache import (
+    CONTEXT_CACHE_MARGIN, ContextCacheExpired, LocalContextCache, generate_with_cache,
+)
+
+PREFIX = "x" * 200000
+
+
+class ExpiringCache(LocalContextCache):
+    # The service deletes the first `expired` caches before they are used.
+    min_tokens = 1000
+
+    def __init__(self, expired=1):
+        super().__init__(base_latency=0)
+        self.expired = expired
+        self.created = 0
+
+    def _create(self, name, prefix):
+        self.created += 1
+        return super()._create(name, prefix)
+
+    def generate(self, entry, suffix, generation_config=None, safety_settings=None):
+        if self.expired:
+            self.expired -= 1
+            self.forget(entry)
+            raise ContextCacheExpired(entry["name"])
+        return super().generate(entry, suffix)
+
+
+def _uncached(prompt):
+    return iter(["uncached"]), 1.0
+
+
+def test_entries_expire_before_the_service_does():
+    cache = LocalContextCache(ttl_seconds=3600)
+    before = time.time()
+    entry, _, _ = cache.get_or_register("repo", "c1", lambda: PREFIX)
+    assert entry["expires"] <= before + 3600 - CONTEXT_CACHE_MARGIN + 1
+
+
+def test_expired_cache_is_registered_again():
+    cache = ExpiringCache(expired=1)
+    built = []
+    responses, cost, entry, setup_cost = generate_with_cache(
+        cache, "repo", "c1", lambda: built.append(1) or PREFIX, "question", _uncached
+    )
+    assert entry is not None
+    assert cache.created == 2
+    assert len(built) == 2
+    assert setup_cost > 0
+    assert [r.text for r in responses] == ["(simulated response)"]
+
+
+def test_cache_expiring_twice_raises():
+    with pytest.raises(ContextCacheExpired):
+        generate_with_cache(ExpiringCache(expired=2), "repo", "c1", lambda: PREFIX, "question", _uncached)
+
+
+def test_small_prefix_is_sent_uncached():
+    cache = ExpiringCache(expired=0)
+    responses, cost, entry, setup_cost = generate_with_cache(cache, "repo", "c1", lambda: "small", "q", _uncached)
+    assert (list(responses), cost, entry, setup_cost) == (["uncached"], 1.0, None, 0.0)
+    assert cache.created == 0
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils_embeddings import EmbeddingService, VectorCache
+
+IMAGES = [b"image-a", b"image-b"]
+
+
+class FakeMultimodalModel:
+    def __init__(self):
+        self.calls = 0
+
+    def get_embeddings(self, image=None, contextual_text=None, dimension=None):
+        self.calls += 1
+        return SimpleNamespace(image_embedding=[float(len(image._image_bytes))] * dimension)
+
+
+def _service(cache_dir, model):
+    return EmbeddingService(model, cache_dir=str(cache_dir), requests_per_minute=0)
+
+
+def test_image_dimensions_have_separate_caches(tmp_path):
+    model = FakeMultimodalModel()
+    service = _service(tmp_path, model)
+    assert service.embed_images(IMAGES, dimension=1408).shape == (2, 1408)
+    assert service.embed_images(IMAGES, dimension=128).shape == (2, 128)
+    assert model.calls == 4
+
+    # A new process reads both widths back from the shared directory.
+    reader = _service(tmp_path, model)
+    assert reader.embed_images(IMAGES, dimension=128).shape == (2, 128)
+    assert reader.embed_images(IMAGES, dimension=1408).shape == (2, 1408)
+    assert model.calls == 4
+    assert reader.stats["hits"] == 4
+
+
+def test_vector_cache_rejects_other_widths(tmp_path):
+    cache = VectorCache(str(tmp_path))
+    cache.put_many(["a"], np.ones((1, 4)))
+    with pytest.raises(ValueError):
+        cache.put_many(["b"], np.ones((1, 8)))
+    with pytest.raises(ValueError):
+        VectorCache(str(tmp_path)).put_many(["b"], np.ones((1, 8)))
+    assert np.array_equal(VectorCache(str(tmp_path)).get_many(["a"])["a"], np.ones(4))
@@ -0,0 +1,108 @@
+import os
+import subprocess
+
+import pytest
+
+pytest.importorskip("git")
+pytest.importorskip("magika")
+
+from apps.repo_inspection.indexing import _literal_pattern, index_repo, list_files, repo_cache_path
+from apps.repo_inspection.store import IndexStore
+
+SMALL_FILES = {
+    "README.md": "# Fixture\n",
+    "src/app.py": "print('hello')\n",
+    "src/data1.txt": "small data file\n",
+    "src/[x].py": "x = 1\n",
+    "src/#notes.md": "notes\n",
+    "src/!bang.txt": "bang\n",
+    "docs/guide.md": "guide\n",
+}
+# Larger than the blob limit below. Unescaped, its sparse-checkout exclusion
+# "!/src/data*.txt" would also drop src/data1.txt.
+LARGE_FILES = {"src/data*.txt": "x" * 4096 + "\n"}
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit_files(repo_dir, files, message):
+    for path, text in files.items():
+        os.makedirs(os.path.join(repo_dir, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(repo_dir, path), "w") as f:
+            f.write(text)
+    git(repo_dir, "add", "-A")
+    git(repo_dir, "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-qm", message)
+
+
+@pytest.fixture
+def fixture_repo(tmp_path):
+    repo_dir = tmp_path / "origin"
+    repo_dir.mkdir()
+    git(repo_dir, "init", "-q", "-b", "main")
+    git(repo_dir, "config", "uploadpack.allowFilter", "true")
+    commit_files(repo_dir, {"src/app.py": "print('v1')\n"}, "first")
+    commit_files(repo_dir, {**SMALL_FILES, **LARGE_FILES}, "second")
+    return repo_dir
+
+
+def index(tmp_path, repo_dir, clone_options=None):
+    return index_repo(
+        f"file://{repo_dir}",
+        cache_dir=str(tmp_path / "cache"),
+        clone_options=clone_options,
+        store=IndexStore(str(tmp_path / "index")),
+    )
+
+
+def worktree(tmp_path, repo_dir, clone_options=None):
+    return os.path.join(repo_cache_path(f"file://{repo_dir}", str(tmp_path / "cache"), clone_options), "worktree")
+
+
+def test_literal_pattern_escapes_wildcards():
+    assert _literal_pattern("src/data*.txt") == "src/data\\*.txt"
+    assert _literal_pattern("[x]?.py") == "\\[x]\\?.py"
+    assert _literal_pattern("#a\\!b") == "\\#a\\\\\\!b"
+    assert _literal_pattern("trailing ") == "trailing\\ "
+
+
+def test_full_clone_indexes_every_file(tmp_path, fixture_repo):
+    code_index, corpus, stats = index(tmp_path, fixture_repo)
+    assert stats["mode"] == "full"
+    assert set(code_index) == set(SMALL_FILES) | set(LARGE_FILES)
+    assert "----- File: src/[x].py -----" in corpus.text()
+
+
+def test_shallow_clone_fetches_one_commit(tmp_path, fixture_repo):
+    options = {"depth": 1, "single_branch": True}
+    index(tmp_path, fixture_repo, options)
+    assert git(worktree(tmp_path, fixture_repo, options), "rev-list", "--count", "HEAD") == "1"
+
+
+def test_blob_limit_leaves_out_only_large_files(tmp_path, fixture_repo):
+    options = {"blob_limit": "1k"}
+    code_index, _, _ = index(tmp_path, fixture_repo, options)
+    assert set(code_index) == set(SMALL_FILES)
+    assert set(list_files(worktree(tmp_path, fixture_repo, options))) == set(SMALL_FILES)
+
+
+def test_include_and_exclude_globs(tmp_path, fixture_repo):
+    code_index, _, _ = index(tmp_path, fixture_repo, {"include": ["/src/"], "exclude": ["*.md"]})
+    assert set(code_index) == {p for p in SMALL_FILES if p.startswith("src/") and not p.endswith(".md")} | set(
+        LARGE_FILES
+    )
+
+
+def test_reindex_is_cached_then_incremental(tmp_path, fixture_repo):
+    index(tmp_path, fixture_repo)
+    _, _, stats = index(tmp_path, fixture_repo)
+    assert stats["mode"] == "cached"
+
+    commit_files(fixture_repo, {"src/app.py": "print('v2')\n"}, "third")
+    git(fixture_repo, "rm", "-q", "docs/guide.md")
+    git(fixture_repo, "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-qm", "fourth")
+    code_index, corpus, stats = index(tmp_path, fixture_repo)
+    assert stats["mode"] == "incremental"
+    assert "docs/guide.md" not in code_index
+    assert "print('v2')" in corpus.text()
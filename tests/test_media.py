@@ -0,0 +1,115 @@
+import threading
+
+from utils_media import LocalUploader, MediaRegistry, VideoContextCache
+
+DATA = b"\x00" * 1000
+
+
+def _registry(uploader=None):
+    return MediaRegistry(
+        uploader=uploader,
+        part_from_uri=lambda uri, mime_type: ("uri", uri),
+        part_from_bytes=lambda data, mime_type: ("inline", len(data)),
+    )
+
+
+def test_uploaded_bytes_are_avoided_only_on_hits(tmp_path):
+    registry = _registry(LocalUploader(str(tmp_path)))
+    first = registry.from_bytes(DATA, "video/mp4")
+    assert first[0] == "uri"
+    assert registry.stats["bytes_uploaded"] == len(DATA)
+    assert registry.stats["bytes_avoided"] == 0
+    assert registry.from_bytes(DATA, "video/mp4") == first
+    assert registry.stats["bytes_uploaded"] == len(DATA)
+    assert registry.stats["bytes_avoided"] == len(DATA)
+    assert (registry.stats["hits"], registry.stats["misses"]) == (1, 1)
+
+
+def test_inline_bytes_are_counted_on_every_request():
+    registry = _registry()
+    registry.from_bytes(DATA, "image/png")
+    registry.from_bytes(DATA, "image/png")
+    assert registry.stats["bytes_inline"] == 2 * len(DATA)
+    assert registry.stats["bytes_avoided"] == 0
+    assert len(registry) == 1
+
+
+def test_upload_does_not_block_other_parts(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    class BlockingUploader(LocalUploader):
+        def upload(self, data, digest, mime_type):
+            started.set()
+            release.wait(5)
+            return super().upload(data, digest, mime_type)
+
+    registry = _registry(BlockingUploader(str(tmp_path)))
+    upload = threading.Thread(target=registry.from_bytes, args=(DATA, "video/mp4"))
+    upload.start()
+    assert started.wait(5)
+    # The upload is in progress; URI parts are still served.
+    assert registry.from_uri("gs://bucket/a.mp4", "video/mp4") == ("uri", "gs://bucket/a.mp4")
+    release.set()
+    upload.join()
+    assert registry.stats["bytes_uploaded"] == len(DATA)
+
+
+def test_video_context_cache_creates_each_cache_once():
+    created = []
+
+    def create(model, uri, mime_type, ttl_seconds):
+        created.append(uri)
+        return None if uri.endswith("short.mp4") else ("cached", model, uri)
+
+    cache = VideoContextCache(create=create)
+    model = object()
+    assert cache.get(model, "gs://b/long.mp4", "video/mp4") == ("cached", model, "gs://b/long.mp4")
+    assert cache.get(model, "gs://b/long.mp4", "video/mp4") == ("cached", model, "gs://b/long.mp4")
+    # A video that can't be cached isn't retried on every request.
+    assert cache.get(model, "gs://b/short.mp4", "video/mp4") is None
+    assert cache.get(model, "gs://b/short.mp4", "video/mp4") is None
+    assert created == ["gs://b/long.mp4", "gs://b/short.mp4"]
+    assert cache.stats == {"hits": 2, "misses": 1, "uncached": 1}
+
+
+def test_expired_video_context_cache_is_recreated():
+    created = []
+    cache = VideoContextCache(create=lambda *args: created.append(args) or "cached", ttl_seconds=0)
+    model = object()
+    cache.get(model, "gs://b/a.mp4", "video/mp4")
+    cache.get(model, "gs://b/a.mp4", "video/mp4")
+    assert len(created) == 2
+
+
+def test_expired_entries_and_their_locks_are_pruned():
+    cache = VideoContextCache(create=lambda *args: "cached", ttl_seconds=0)
+    model = object()
+    for i in range(5):
+        cache.get(model, f"gs://b/{i}.mp4", "video/mp4")
+    assert len(cache._entries) == 1
+    assert len(cache._key_locks) == 1
+
+
+def test_service_errors_fall_back_to_ordinary_parts(monkeypatch):
+    from google.api_core import exceptions
+    from google.cloud.aiplatform import initializer
+    from vertexai.preview import caching
+
+    import utils_media
+    import utils_models
+
+    def refuse(**kwargs):
+        raise exceptions.PermissionDenied("caching is not allowed")
+
+    initializer.global_config.init(project="demo-project", location="us-central1")
+    monkeypatch.setattr(utils_models, "init_vertex", lambda: None)
+    monkeypatch.setattr(utils_models, "client_settings", lambda model: (None, None, "gemini", None, None))
+    monkeypatch.setattr(caching.CachedContent, "create", refuse)
+    assert utils_media._cached_video_model(object(), "gs://b/a.mp4", "video/mp4", 3600) is None
+
+
+def test_server_side_video_caching_is_off_by_default():
+    import utils_media
+
+    assert utils_media.VIDEO_CONTEXT_CACHE is False
+    assert utils_media.cached_video_model(object(), "gs://b/a.mp4", "video/mp4") is None
@@ -0,0 +1,48 @@
+import pytest
+
+import utils_models
+from google.cloud.aiplatform import initializer
+
+
+class FakeGenerativeModel:
+    def __init__(self, name, safety_settings=None, generation_config=None):
+        self.name = name
+        self.generation_config = generation_config
+
+
+@pytest.fixture
+def models(monkeypatch):
+    monkeypatch.setattr(utils_models, "GenerativeModel", FakeGenerativeModel)
+    monkeypatch.setattr(utils_models, "_clients", {})
+    monkeypatch.setattr(utils_models, "_settings", {})
+    monkeypatch.setattr(utils_models, "_constructions", utils_models.Counter())
+    monkeypatch.setattr(utils_models, "_hits", utils_models.Counter())
+    monkeypatch.setattr(utils_models, "PROJECT_ID", "demo-project")
+    monkeypatch.setattr(utils_models, "LOCATION", "us-central1")
+    monkeypatch.setattr(utils_models, "_vertex_initialized", False)
+    initializer.global_config.init(project="demo-project", location="us-central1")
+    return utils_models
+
+
+def test_clients_are_bound_to_their_region(models):
+    a = models.get_model("gemini-1.5-pro", region="europe-west1")
+    b = models.get_model("gemini-1.5-pro", region="asia-northeast1")
+    default = models.get_model("gemini-1.5-pro")
+    assert a.name == "projects/demo-project/locations/europe-west1/publishers/google/models/gemini-1.5-pro"
+    assert b.name == "projects/demo-project/locations/asia-northeast1/publishers/google/models/gemini-1.5-pro"
+    assert default.name == "projects/demo-project/locations/us-central1/publishers/google/models/gemini-1.5-pro"
+    # Building clients for other regions never switches the SDK's defaults.
+    assert initializer.global_config.location == "us-central1"
+    assert initializer.global_config.project == "demo-project"
+
+
+def test_clients_are_cached_per_region_model_and_settings(models):
+    a = models.get_model("gemini-1.5-pro", region="europe-west1")
+    assert models.get_model("gemini-1.5-pro", region="europe-west1") is a
+    assert models.get_model("gemini-1.5-flash", region="europe-west1") is not a
+    assert models.get_model("gemini-1.5-pro", region="europe-west1", generation_config={"temperature": 0}) is not a
+    assert models.load_models("gemini-1.5-pro", region="europe-west1") == (a, a)
+    pro = [s for s in models.stats() if s["model"] == "gemini-1.5-pro"]
+    # One client without settings (hit twice) and one with a generation config.
+    assert sorted((s["constructed"], s["hits"]) for s in pro) == [(1, 0), (1, 2)]
+    assert models.client_settings(a) == ("demo-project", "europe-west1", "gemini-1.5-pro", None, None)
@@ -0,0 +1,42 @@
+from apps.stories.pipeline import StepPipeline, step
+
+PIPELINE = StepPipeline([
+    step("story", "Story", lambda outputs: "write a story"),
+    step("code", "Code", lambda outputs: f"code for {outputs['story']}", after=["story"]),
+])
+
+
+def _run(memo, generate, **kwargs):
+    return [event for event in PIPELINE.run(generate, memo, **kwargs) if event[0] != "chunk"]
+
+
+def test_unchanged_stages_are_reused():
+    memo, prompts = {}, []
+    generate = lambda prompt: prompts.append(prompt) or iter([prompt.upper()])
+    _run(memo, generate)
+    events = _run(memo, generate)
+    assert [event[3] for event in events if event[0] == "done"] == [True, True]
+    assert prompts == ["write a story", "code for WRITE A STORY"]
+
+
+def test_reuse_off_regenerates_every_stage():
+    memo, prompts = {}, []
+    generate = lambda prompt: prompts.append(prompt) or iter([prompt.upper()])
+    _run(memo, generate)
+    events = _run(memo, generate, reuse=False)
+    assert [event[3] for event in events if event[0] == "done"] == [False, False]
+    assert len(prompts) == 4
+
+
+def test_failed_stage_forgets_it_and_later_stages():
+    memo = {}
+    _run(memo, lambda prompt: iter(["ok"]))
+
+    def generate(prompt):
+        if prompt.startswith("code"):
+            raise RuntimeError("quota")
+        return iter(["changed"])
+
+    events = _run(memo, generate, reuse=False)
+    assert events[-1][:2] == ("error", "code")
+    assert list(memo) == ["story"]
@@ -0,0 +1,37 @@
+from apps.dataform.questions import QuestionCache
+
+
+def _wait(cache, fingerprint):
+    cache._pool.shutdown(wait=True)
+    return cache.get(fingerprint)
+
+
+def test_least_recently_used_schemas_are_dropped():
+    cache = QuestionCache(max_entries=2)
+    for fingerprint in ("a", "b"):
+        cache.request(fingerprint, fingerprint, lambda schema: [schema])
+    cache.get("a")
+    cache.request("c", "c", lambda schema: [schema])
+    assert _wait(cache, "b") is None
+    assert cache.get("a")["questions"] == ["a"]
+    assert cache.get("c")["questions"] == ["c"]
+
+
+def test_failed_generation_is_retried_after_the_retry_interval():
+    calls = []
+
+    def fail(schema):
+        calls.append(schema)
+        raise RuntimeError("quota")
+
+    cache = QuestionCache(max_workers=1, retry_seconds=3600)
+    cache.request("a", "{}", fail)
+    cache._pool.submit(lambda: None).result()
+    entry = cache.get("a")
+    assert entry["status"] == "error"
+    # Reruns within the interval keep the error instead of polling a retry.
+    assert cache.request("a", "{}", fail) is entry
+    cache.retry_seconds = 0
+    assert cache.request("a", "{}", lambda schema: ["q"]) is not entry
+    assert _wait(cache, "a")["questions"] == ["q"]
+    assert calls == ["{}"]
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+pytest.importorskip("faiss")
+
+from apps.repo_inspection.corpus import Corpus
+from apps.repo_inspection.retrieval import HashEmbedder, chunk_file, get_retrieval_index, index_prefix
+
+
+def make_corpus(files):
+    corpus = Corpus()
+    for path, text in files.items():
+        corpus.add_file(path, text)
+    return corpus
+
+
+def test_chunk_file_cuts_at_symbols():
+    text = "import os\n\ndef a():\n    return 1\n\nclass B:\n    pass\n"
+    chunks = chunk_file("m.py", text, max_chars=30)
+    assert [c["start_line"] for c in chunks] == [1, 3, 6]
+    assert "".join(c["text"] for c in chunks) == text
+
+
+def test_index_is_built_once_and_reloaded(tmp_path):
+    corpus = make_corpus({"auth.py": "def login(user, password):\n    return check(password)\n",
+                          "cart.py": "def add_item(cart, item):\n    cart.append(item)\n"})
+    embedder = HashEmbedder()
+    built = get_retrieval_index("repo", "c1", corpus, embedder, index_dir=str(tmp_path))
+    prefix = index_prefix("repo", "c1", embedder, str(tmp_path))
+    assert os.path.exists(f"{prefix}.faiss") and os.path.exists(f"{prefix}.chunks.json")
+    assert not [f for f in os.listdir(os.path.dirname(prefix)) if f.endswith(".tmp")]
+
+    loaded = get_retrieval_index("repo", "c1", make_corpus({}), embedder, index_dir=str(tmp_path))
+    assert loaded.chunks == built.chunks
+    assert loaded.search(embedder.embed_query("login password"), 1)[0]["path"] == "auth.py"
+
+
+def test_partly_evicted_index_is_rebuilt(tmp_path):
+    corpus = make_corpus({"a.py": "def a():\n    pass\n"})
+    embedder = HashEmbedder()
+    get_retrieval_index("repo", "c1", corpus, embedder, index_dir=str(tmp_path))
+    os.remove(f"{index_prefix('repo', 'c1', embedder, str(tmp_path))}.faiss")
+    assert len(get_retrieval_index("repo", "c1", corpus, embedder, index_dir=str(tmp_path)).chunks) == 1
+
+
+def test_empty_corpus_gives_empty_index(tmp_path):
+    retrieval_index = get_retrieval_index("repo", "c1", make_corpus({}), HashEmbedder(), index_dir=str(tmp_path))
+    assert retrieval_index.search(HashEmbedder().embed_query("anything"), 5) == []
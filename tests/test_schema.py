@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from apps.dataform.schema import SAMPLE_BILLING_SCHEMA, compact_schema
+from utils_tokens import estimate_tokens
+
+
+def test_billing_sample_is_reduced():
+    schema = json.dumps(SAMPLE_BILLING_SCHEMA, indent=2)
+    compact = compact_schema(schema)
+    assert estimate_tokens(compact) < 0.2 * estimate_tokens(schema)
+    # Every column survives, repeated records are named once, and the
+    # default attributes are gone.
+    for column in SAMPLE_BILLING_SCHEMA:
+        assert f"\n  {column['name']} " in compact
+    assert compact.count("TYPE Labels = STRUCT<key STRING, value STRING>;") == 1
+    assert "labels ARRAY<Labels>" in compact
+    assert "NULLABLE" not in compact
+    assert "OPTIONS(" not in compact
+
+
+def test_nested_and_required_fields():
+    schema = [
+        {"name": "id", "type": "INT64", "mode": "REQUIRED", "description": "Row id"},
+        {"name": "items", "type": "RECORD", "mode": "REPEATED", "fields": [{"name": "sku", "type": "STRING"}]},
+    ]
+    assert compact_schema(schema) == (
+        'TABLE (\n  id INT64 NOT NULL OPTIONS(description="Row id"),\n  items ARRAY<STRUCT<sku STRING>>\n)'
+    )
+
+
+@pytest.mark.parametrize(
+    "schema",
+    ["not json", "123", '["a"]', "[]", "{}", '{"fields": "x"}', '[{"name": "a", "type": "RECORD", "fields": [1]}]'],
+)
+def test_input_that_is_not_a_field_list_is_returned_unchanged(schema):
+    assert compact_schema(schema) == schema
+
+
+def _synthetic_schema(columns):
+    # Wide, nested schema in which the same two RECORD shapes recur, as
+    # labels and addresses do in real exports.
+    key_value = [{"name": n, "mode": "NULLABLE", "type": "STRING", "description": "", "fields": []}
+                 for n in ("key", "value")]
+    address = [{"name": n, "mode": "NULLABLE", "type": t, "description": "", "fields": []}
+               for n, t in (("street", "STRING"), ("city", "STRING"), ("zip", "STRING"), ("lat", "FLOAT"))]
+
+    def field(name, i, depth):
+        if depth < 2 and i % 4 == 0:
+            return {"name": name, "mode": "NULLABLE", "type": "RECORD", "description": "",
+                    "fields": [field(f"{name}_{j}", j + 1, depth + 1) for j in range(4)]}
+        if i % 4 == 1:
+            return {"name": name, "mode": "REPEATED", "type": "RECORD", "description": "", "fields": key_value}
+        if i % 4 == 2:
+            return {"name": name, "mode": "NULLABLE", "type": "RECORD", "description": "", "fields": address}
+        return {"name": name, "mode": "NULLABLE", "type": "INTEGER", "description": "", "fields": []}
+
+    return [field(f"col_{i}", i, 0) for i in range(columns)]
+
+
+def _count_fields(fields):
+    return sum(1 + _count_fields(f.get("fields") or []) for f in fields)
+
+
+@pytest.mark.parametrize("columns", [200, 1000])
+def test_large_synthetic_schema_is_reduced(columns):
+    schema = _synthetic_schema(columns)
+    assert _count_fields(schema) > 4 * columns
+    text = json.dumps(schema, indent=2)
+    compact = compact_schema(text)
+    assert estimate_tokens(compact) < 0.15 * estimate_tokens(text)
+    # Each recurring shape is defined once and referenced everywhere else.
+    definitions = [line for line in compact.splitlines() if line.startswith("TYPE ")]
+    assert len(definitions) == len(set(definitions))
+    assert sum("= STRUCT<key STRING, value STRING>;" in line for line in definitions) == 1
+    assert sum("= STRUCT<street STRING, city STRING, zip STRING, lat FLOAT>;" in line for line in definitions) == 1
+    assert compact.count("STRUCT<key STRING, value STRING>") == 1
+    assert compact.count("\n  col_") == columns
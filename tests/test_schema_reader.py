@@ -0,0 +1,56 @@
+import io
+import json
+
+import pytest
+
+pytest.importorskip("ijson")
+
+from apps.dataform.schema_reader import read_schema, select_columns  # noqa: E402
+
+COLUMNS = [
+    {"name": "id", "type": "STRING", "mode": "REQUIRED"},
+    {
+        "name": "usage",
+        "type": "RECORD",
+        "fields": [
+            {"name": "amount", "type": "FLOAT"},
+            {"name": "unit", "type": "RECORD", "fields": [{"name": "code", "type": "STRING"}]},
+        ],
+    },
+]
+
+
+@pytest.mark.parametrize(
+    "layout", [COLUMNS, {"fields": COLUMNS}, {"schema": {"fields": COLUMNS}}], ids=["list", "fields", "schema"]
+)
+def test_layouts(layout):
+    file = io.BytesIO(json.dumps(layout).encode("utf-8"))
+    summary = read_schema(file)
+    assert summary["errors"] == []
+    assert [(c["name"], c["type"], c["mode"], c["nested_fields"], c["depth"]) for c in summary["columns"]] == [
+        ("id", "STRING", "REQUIRED", 0, 1),
+        ("usage", "RECORD", "NULLABLE", 3, 3),
+    ]
+    assert summary["total_fields"] == 5
+    assert summary["max_depth"] == 3
+    assert summary["types"]["STRING"] == 2
+    assert select_columns(file, ["usage"]) == [COLUMNS[1]]
+
+
+def test_fields_without_name_or_type_are_reported():
+    file = io.BytesIO(json.dumps([{"name": "a"}, {"name": "b", "type": "RECORD", "fields": [{"type": "INT64"}]}]).encode())
+    summary = read_schema(file)
+    assert len(summary["errors"]) == 2
+    assert summary["errors"][0] == "a: every field needs a name and a type"
+    assert [column["name"] for column in summary["columns"]] == ["a", "b"]
+
+
+@pytest.mark.parametrize("data", [b'[{"name":"a","type":"STRING"}, {"name":', b'{"other": 1}', b"not json"])
+def test_malformed_files(data):
+    file = io.BytesIO(data)
+    summary = read_schema(file)
+    assert len(summary["errors"]) == 1
+    assert summary["errors"][0].startswith("Invalid JSON schema")
+    # The columns read_schema listed can still be selected.
+    names = [column["name"] for column in summary["columns"]]
+    assert select_columns(file, names) == [{"name": name, "type": "STRING"} for name in names]
@@ -0,0 +1,54 @@
+import os
+import time
+
+import pytest
+
+from apps.repo_inspection.store import STALE_TMP_SECONDS, IndexStore
+
+RECORDS = {
+    "a.py": {"label": "python", "text": "a = 1\n"},
+    "logo.png": {"label": "binary", "text": None},
+}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = IndexStore(str(tmp_path))
+    store.save("repo", "c1", "file:///repo", RECORDS)
+    assert store.has("repo", "c1")
+    assert store.latest_commit("repo") == "c1"
+    loaded = store.load("repo", "c1")
+    assert {path: (r["label"], r["text"]) for path, r in loaded.items()} == {
+        path: (r["label"], r["text"]) for path, r in RECORDS.items()
+    }
+
+
+def test_load_of_evicted_index_is_a_miss(tmp_path):
+    store = IndexStore(str(tmp_path))
+    store.save("repo", "c1", "file:///repo", RECORDS)
+    # Another repository's save evicts everything but its own index.
+    IndexStore(str(tmp_path), max_bytes=0).save("other", "c2", "file:///other", RECORDS)
+    assert store.load("repo", "c1") is None
+    assert not os.path.exists(os.path.join(tmp_path, "repo", "c1.sqlite"))
+    assert store.load("other", "c2") is not None
+
+
+def test_failed_save_leaves_no_temporary_file(tmp_path):
+    store = IndexStore(str(tmp_path))
+    with pytest.raises(AttributeError):
+        store.save("repo", "c1", "file:///repo", {"a.py": {"label": "python", "text": 1}})
+    assert os.listdir(tmp_path / "repo") == []
+    store.save("repo", "c1", "file:///repo", RECORDS)
+    assert store.load("repo", "c1") is not None
+
+
+def test_eviction_removes_abandoned_temporary_files(tmp_path):
+    store = IndexStore(str(tmp_path))
+    os.makedirs(tmp_path / "repo")
+    abandoned, in_progress = tmp_path / "repo" / "c0.x.tmp", tmp_path / "repo" / "c0.y.tmp"
+    abandoned.write_bytes(b"partial")
+    in_progress.write_bytes(b"partial")
+    old = time.time() - STALE_TMP_SECONDS - 1
+    os.utime(abandoned, (old, old))
+    store.save("repo", "c1", "file:///repo", RECORDS)
+    assert not abandoned.exists()
+    assert in_progress.exists()
@@ -0,0 +1,73 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+import utils_video  # noqa: E402
+from utils_video import extract_keyframes, get_keyframes, video_parts  # noqa: E402
+
+FPS = 10
+# Three scenes of 3 s each, then the last one held for 1 s more.
+SCENES = [(0, 3), (255, 3), (128, 4)]
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (320, 180))
+    assert writer.isOpened()
+    for value, seconds in SCENES:
+        frame = np.full((180, 320, 3), value, dtype=np.uint8)
+        for _ in range(seconds * FPS):
+            writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_extract_keyframes_keeps_one_frame_per_scene(clip):
+    duration, frames = extract_keyframes(clip)
+    assert duration == pytest.approx(10, abs=0.2)
+    assert [t for t, _ in frames] == pytest.approx([0, 3, 6])
+    for _, jpeg in frames:
+        assert jpeg[:2] == b"\xff\xd8"
+
+
+def test_extract_keyframes_spreads_frames_over_the_limit(clip):
+    _, frames = extract_keyframes(clip, max_frames=2)
+    assert [t for t, _ in frames] == pytest.approx([0, 6])
+    _, frames = extract_keyframes(clip, max_frames=1)
+    assert [t for t, _ in frames] == pytest.approx([0])
+    with pytest.raises(ValueError):
+        extract_keyframes(clip, max_frames=0)
+
+
+def test_get_keyframes_extracts_once(clip, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils_video, "VIDEO_CACHE_DIR", str(tmp_path / "cache"))
+    calls = []
+    real_extract = utils_video.extract_keyframes
+    monkeypatch.setattr(utils_video, "extract_keyframes", lambda *args: calls.append(args) or real_extract(*args))
+    keyframes = get_keyframes(clip)
+    assert get_keyframes(clip) is keyframes
+    assert len(calls) == 1
+    assert len(keyframes["frames"]) == 3
+
+    parts = video_parts(clip, keyframes)
+    assert parts[0] == "Frame at 0.0s:"
+    assert len(parts) == 6
+    # Later steps reuse the parts instead of reading the JPEGs again.
+    monkeypatch.setattr("builtins.open", None)
+    assert video_parts(clip, keyframes) == parts
+
+
+def test_keyframe_caches_keep_only_recent_videos(clip, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils_video, "VIDEO_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(utils_video, "KEYFRAME_CACHE_ENTRIES", 2)
+    monkeypatch.setattr(utils_video, "_keyframes", utils_video.OrderedDict())
+    monkeypatch.setattr(utils_video, "_keyframe_parts", utils_video.OrderedDict())
+    for max_frames in (1, 2, 3):
+        video_parts(clip, get_keyframes(clip, max_frames=max_frames))
+    assert len(utils_video._keyframes) == 2
+    assert len(utils_video._keyframe_parts) == 2
+    # An evicted video is read back from its manifest, not extracted again.
+    monkeypatch.setattr(utils_video, "extract_keyframes", None)
+    assert len(get_keyframes(clip, max_frames=1)["frames"]) == 1
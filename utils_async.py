@@ -0,0 +1,81 @@
+import asyncio
+import concurrent.futures
+import itertools
+import os
+import threading
+
+from utils_cache import model_name
+
+# Upper bound of in-flight requests per (model, region).
+MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8"))
+# Seconds before a single request is cancelled.
+REQUEST_TIMEOUT = float(os.environ.get("GEMINI_REQUEST_TIMEOUT", "600"))
+
+_loop = None
+_loop_lock = threading.Lock()
+_semaphores = {}
+
+
+def _get_loop():
+    # Streamlit runs each script on its own thread, so all async calls share one
+    # long-lived loop on a daemon thread; semaphores and gRPC channels stay bound
+    # to it across reruns and sessions.
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="gemini-async", daemon=True).start()
+        return _loop
+
+
+def _semaphore(model):
+    key = (model_name(model), getattr(model, "_location", None) or os.environ.get("GCP_REGION"))
+    if key not in _semaphores:
+        _semaphores[key] = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphores[key]
+
+
+async def generate_async(model, contents, generation_config=None, safety_settings=None, timeout=REQUEST_TIMEOUT):
+    async with _semaphore(model):
+        if hasattr(model, "generate_content_async"):
+            call = model.generate_content_async(
+                contents, generation_config=generation_config, safety_settings=safety_settings
+            )
+        else:
+            call = asyncio.to_thread(
+                model.generate_content, contents, generation_config=generation_config, safety_settings=safety_settings
+            )
+        response = await asyncio.wait_for(call, timeout)
+    return response.text
+
+
+def submit(model, contents, **kwargs):
+    return asyncio.run_coroutine_threadsafe(generate_async(model, contents, **kwargs), _get_loop())
+
+
+def as_completed(requests, model, limit=None, **kwargs):
+    # Runs the prompts in `requests` ({key: contents}) concurrently, at most
+    # `limit` at a time, and yields (key, future) pairs in completion order.
+    # Anything still pending when the caller stops iterating is cancelled.
+    items = iter(requests.items())
+    futures = {}
+    try:
+        while True:
+            free_slots = (limit or len(requests)) - len(futures)
+            for key, contents in itertools.islice(items, max(free_slots, 0)):
+                futures[submit(model, contents, **kwargs)] = key
+            if not futures:
+                break
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def gather(requests, model, **kwargs):
+    results = {}
+    for key, future in as_completed(requests, model, **kwargs):
+        results[key] = future.result()
+    return {key: results[key] for key in requests}
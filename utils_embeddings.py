@@ -0,0 +1,301 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils_tokens import estimate_tokens
+
+# Texts are packed into requests of at most EMBEDDING_BATCH_SIZE inputs and
+# EMBEDDING_BATCH_TOKENS estimated tokens (the text embedding API limits).
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "250"))
+EMBEDDING_BATCH_TOKENS = int(os.environ.get("EMBEDDING_BATCH_TOKENS", "20000"))
+# Requests in flight per service, and requests per minute across all of them.
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "8"))
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.environ.get("EMBEDDING_REQUESTS_PER_MINUTE", "600"))
+# Vectors are kept in memory only unless EMBEDDING_CACHE_DIR is set.
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR")
+MULTIMODAL_DIMENSION = 1408
+
+
+def content_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class RateLimiter:
+    # Spaces calls evenly so that at most `per_minute` start in any minute.
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class VectorCache:
+    # Content-hash keyed float32 vectors. With a directory, vectors are appended
+    # to `vectors.f32` and read back through a memory map, with the keys in
+    # `keys.txt` (one per row); several processes can share the directory.
+    # Every vector in a cache has the same width.
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.dimensions = None
+        self._rows = {}
+        self._vectors = []
+        self._keys_offset = 0
+        self._map = None
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._refresh()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _refresh(self):
+        # Picks up rows appended since the last read, by this or another process.
+        meta_path = self._path("meta.json")
+        if self.dimensions is None and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.dimensions = json.load(f)["dimensions"]
+        keys_path = self._path("keys.txt")
+        if not os.path.exists(keys_path):
+            return
+        with open(keys_path, "r", encoding="utf-8") as f:
+            f.seek(self._keys_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                self._rows[line[:-1]] = len(self._rows)
+                self._keys_offset += len(line)
+        if self._rows and (self._map is None or len(self._map) < len(self._rows)):
+            self._map = np.memmap(
+                self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(len(self._rows), self.dimensions)
+            )
+
+    def _row(self, row):
+        return self._map[row] if self.directory else self._vectors[row]
+
+    def get_many(self, keys):
+        with self._lock:
+            if self.directory and any(key not in self._rows for key in keys):
+                self._refresh()
+            return {key: np.array(self._row(self._rows[key])) for key in keys if key in self._rows}
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.directory and self.dimensions is None:
+                self._refresh()
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            if len(vectors) and vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions}-dimensional vectors, got {vectors.shape[1]}")
+            if not self.directory:
+                for key, vector in zip(keys, vectors):
+                    if key not in self._rows:
+                        self._rows[key] = len(self._vectors)
+                        self._vectors.append(vector)
+                return
+            with open(self._path("keys.txt"), "a", encoding="utf-8") as keys_file:
+                fcntl.flock(keys_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    if not os.path.exists(self._path("meta.json")):
+                        with open(self._path("meta.json"), "w", encoding="utf-8") as f:
+                            json.dump({"dimensions": self.dimensions}, f)
+                    new = {}
+                    for key, vector in zip(keys, vectors):
+                        if key not in self._rows:
+                            new.setdefault(key, vector)
+                    if not new:
+                        return
+                    # Vectors are written before their keys, so a row only
+                    # becomes visible once its data is complete.
+                    with open(self._path("vectors.f32"), "ab") as f:
+                        f.truncate(len(self._rows) * self.dimensions * 4)
+                        f.write(np.stack(list(new.values())).tobytes())
+                    keys_file.write("".join(f"{key}\n" for key in new))
+                    keys_file.flush()
+                    self._refresh()
+                finally:
+                    fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+def _load_image(image):
+    from vertexai.vision_models import Image
+
+    if isinstance(image, Image):
+        return image
+    if isinstance(image, bytes):
+        return Image(image_bytes=image)
+    return Image.load_from_file(image)
+
+
+def _image_bytes(image):
+    if isinstance(image, bytes):
+        return image
+    if hasattr(image, "_image_bytes"):
+        return image._image_bytes
+    with open(image, "rb") as f:
+        return f.read()
+
+
+class EmbeddingService:
+    # Batched, cached and rate-limited embeddings. `model` is a utils_vertex
+    # model name ("embeddings" or "multimodal_embeddings") or a model object.
+    def __init__(
+        self,
+        model="embeddings",
+        cache_dir=EMBEDDING_CACHE_DIR,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        batch_tokens=EMBEDDING_BATCH_TOKENS,
+        max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+        requests_per_minute=EMBEDDING_REQUESTS_PER_MINUTE,
+    ):
+        self._model = model
+        self.name = model if isinstance(model, str) else type(model).__name__
+        self.cache_dir = cache_dir
+        self.cache = VectorCache(os.path.join(cache_dir, self.name) if cache_dir else None)
+        self._image_caches = {}
+        self._caches_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.stats = {"hits": 0, "misses": 0, "requests": 0}
+
+    def image_cache(self, dimension):
+        # Image embeddings are requested at several widths, each kept in its
+        # own cache (and directory).
+        with self._caches_lock:
+            if dimension not in self._image_caches:
+                directory = os.path.join(self.cache_dir, self.name, str(dimension)) if self.cache_dir else None
+                self._image_caches[dimension] = VectorCache(directory)
+            return self._image_caches[dimension]
+
+    @property
+    def model(self):
+        if isinstance(self._model, str):
+            import utils_vertex
+
+            return utils_vertex.get_model(self._model)
+        return self._model
+
+    def _batches(self, items, sizes):
+        batch, batch_tokens = [], 0
+        for item, size in zip(items, sizes):
+            if batch and (len(batch) >= self.batch_size or batch_tokens + size > self.batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(item)
+            batch_tokens += size
+        if batch:
+            yield batch
+
+    def _run(self, cache, keys, batches, embed_batch):
+        # Embeds the batches concurrently and stores the results in the cache.
+        def run(batch):
+            self.rate_limiter.wait()
+            vectors = embed_batch(batch)
+            cache.put_many([keys[i] for i in batch], vectors)
+            return vectors
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            results = list(pool.map(run, batches))
+        self.stats["requests"] += len(results)
+        return {keys[i]: vector for batch, vectors in zip(batches, results) for i, vector in zip(batch, vectors)}
+
+    def _embed(self, cache, keys, batches_for, embed_batch):
+        cached = cache.get_many(set(keys))
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in cached:
+                missing.setdefault(key, i)
+        self.stats["hits"] += len(keys) - len(missing)
+        self.stats["misses"] += len(missing)
+        if missing:
+            cached.update(self._run(cache, keys, list(batches_for(list(missing.values()))), embed_batch))
+        if not keys:
+            return np.zeros((0, cache.dimensions or 0), dtype=np.float32)
+        return np.stack([cached[key] for key in keys]).astype(np.float32, copy=False)
+
+    def embed_texts(self, texts, task_type=None):
+        # Returns an (n, dimensions) float32 array in the order of `texts`.
+        from vertexai.language_models import TextEmbeddingInput
+
+        texts = list(texts)
+        keys = [content_key(self.name, task_type or "", text) for text in texts]
+
+        def batches_for(indices):
+            return self._batches(indices, [estimate_tokens(texts[i]) for i in indices])
+
+        def embed_batch(batch):
+            inputs = [TextEmbeddingInput(texts[i], task_type) for i in batch]
+            return [e.values for e in self.model.get_embeddings(inputs, auto_truncate=True)]
+
+        return self._embed(self.cache, keys, batches_for, embed_batch)
+
+    def embed_images(self, images, contextual_text=None, dimension=MULTIMODAL_DIMENSION):
+        # `images` are file paths, bytes or vertexai Image objects. The
+        # multimodal API takes one image per request, so only concurrency helps.
+        images = list(images)
+        keys = [content_key(self.name, dimension, contextual_text or "", _image_bytes(image)) for image in images]
+
+        def batches_for(indices):
+            return [[i] for i in indices]
+
+        def embed_batch(batch):
+            response = self.model.get_embeddings(
+                image=_load_image(images[batch[0]]), contextual_text=contextual_text, dimension=dimension
+            )
+            return [response.image_embedding]
+
+        return self._embed(self.image_cache(dimension), keys, batches_for, embed_batch)
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_service(model="embeddings"):
+    with _services_lock:
+        if model not in _services:
+            _services[model] = EmbeddingService(model)
+        return _services[model]
+
+
+def embed_texts(texts, task_type=None):
+    return get_service("embeddings").embed_texts(texts, task_type=task_type)
+
+
+def embed_images(images, contextual_text=None, dimension=MULTIMODAL_DIMENSION):
+    return get_service("multimodal_embeddings").embed_images(
+        images, contextual_text=contextual_text, dimension=dimension
+    )
+
+
+def cosine_similarity(queries, vectors):
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return queries @ vectors.T
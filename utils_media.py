@@ -0,0 +1,257 @@
+import hashlib
+import mimetypes
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+# With DEMO_ASSETS_BUCKET set, uploaded files are stored once in that bucket and
+# every later request references them by URI instead of sending the bytes again.
+DEMO_ASSETS_BUCKET = os.environ.get("DEMO_ASSETS_BUCKET")
+MEDIA_CACHE_ENTRIES = int(os.environ.get("MEDIA_CACHE_ENTRIES", "256"))
+# Upper bound for the bytes of inline parts kept in memory.
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# With VIDEO_CONTEXT_CACHE=1, gs:// videos are kept in a Vertex AI context
+# cache (billed per hour of storage) for VIDEO_CONTEXT_CACHE_TTL seconds, so the
+# backend processes each video once per TTL instead of on every step.
+VIDEO_CONTEXT_CACHE = os.environ.get("VIDEO_CONTEXT_CACHE") == "1"
+VIDEO_CONTEXT_CACHE_TTL = int(os.environ.get("VIDEO_CONTEXT_CACHE_TTL", "3600"))
+# Cached videos are dropped locally this long before the service expires them,
+# so a request never references an expired cache.
+VIDEO_CONTEXT_CACHE_MARGIN = 60
+
+
+def _object_name(digest, mime_type):
+    return f"media/{digest}{mimetypes.guess_extension(mime_type) or ''}"
+
+
+class GcsUploader:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self._client = None
+
+    def upload(self, data, digest, mime_type):
+        from google.cloud import storage
+
+        if self._client is None:
+            self._client = storage.Client()
+        blob = self._client.bucket(self.bucket).blob(_object_name(digest, mime_type))
+        # Content-addressed, so an object that already exists is already correct.
+        if not blob.exists():
+            blob.upload_from_string(data, content_type=mime_type)
+        return f"gs://{self.bucket}/{blob.name}"
+
+
+class LocalUploader:
+    # Stand-in for GcsUploader in offline runs: objects are files in `directory`.
+    def __init__(self, directory):
+        self.directory = directory
+
+    def upload(self, data, digest, mime_type):
+        path = os.path.join(self.directory, _object_name(digest, mime_type))
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(data)
+            shutil.move(f"{path}.tmp", path)
+        return f"file://{os.path.abspath(path)}"
+
+
+def _part_from_uri(uri, mime_type):
+    from vertexai.generative_models import Part
+
+    return Part.from_uri(uri, mime_type=mime_type)
+
+
+def _part_from_bytes(data, mime_type):
+    from vertexai.generative_models import Part
+
+    return Part.from_data(data, mime_type=mime_type)
+
+
+class MediaRegistry:
+    # Builds each media Part once per process, keyed by URI or by the SHA-256 of
+    # its bytes, and reuses it across steps, reruns and sessions. `stats` counts
+    # the request bytes saved by referencing uploaded files instead of inlining
+    # them.
+    def __init__(
+        self,
+        uploader=None,
+        max_entries=MEDIA_CACHE_ENTRIES,
+        max_bytes=MEDIA_CACHE_MAX_BYTES,
+        part_from_uri=_part_from_uri,
+        part_from_bytes=_part_from_bytes,
+    ):
+        self.uploader = uploader
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._part_from_uri = part_from_uri
+        self._part_from_bytes = part_from_bytes
+        self._parts = OrderedDict()
+        self._inline_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bytes_uploaded": 0, "bytes_inline": 0, "bytes_avoided": 0}
+
+    def _get(self, key):
+        entry = self._parts.get(key)
+        if entry is not None:
+            self._parts.move_to_end(key)
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+        return entry
+
+    def _put(self, key, part, size=0):
+        self._parts[key] = (part, size)
+        self._inline_bytes += size
+        while len(self._parts) > self.max_entries or self._inline_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._parts.popitem(last=False)
+            self._inline_bytes -= evicted_size
+
+    def from_uri(self, uri, mime_type):
+        key = ("uri", uri, mime_type)
+        with self._lock:
+            entry = self._get(key)
+            if entry is None:
+                entry = (self._part_from_uri(uri, mime_type), 0)
+                self._put(key, *entry)
+            return entry[0]
+
+    def from_bytes(self, data, mime_type):
+        digest = hashlib.sha256(data).hexdigest()
+        key = ("sha256", digest, mime_type)
+        with self._lock:
+            entry = self._get(key)
+            if self.uploader is None:
+                if entry is None:
+                    entry = (self._part_from_bytes(data, mime_type), len(data))
+                    self._put(key, *entry)
+                self.stats["bytes_inline"] += len(data)
+                return entry[0]
+            if entry is not None:
+                self.stats["bytes_avoided"] += len(data)
+                return entry[0]
+        # The upload happens outside the lock so it doesn't hold up other parts.
+        # Objects are content-addressed, so concurrent uploads of the same bytes
+        # write the same object.
+        uri = self.uploader.upload(data, digest, mime_type)
+        part = self._part_from_uri(uri, mime_type)
+        with self._lock:
+            self.stats["bytes_uploaded"] += len(data)
+            self._put(key, part)
+        return part
+
+    def __len__(self):
+        return len(self._parts)
+
+
+def _cached_video_model(model, uri, mime_type, ttl_seconds):
+    # A client that answers with the video already in its context, or None if
+    # the video can't be cached: the client isn't from get_model or isn't in
+    # the SDK's default region (caches are created there), or the service
+    # refuses it (e.g. the video is below the minimum cache size, or the
+    # project lacks permission or quota).
+    import datetime
+
+    from google.api_core import exceptions
+    from google.cloud.aiplatform import initializer
+    from vertexai.preview import caching
+    from vertexai.preview.generative_models import GenerativeModel, Part
+
+    from utils_models import client_settings, init_vertex
+
+    settings = client_settings(model)
+    if settings is None:
+        return None
+    project, region, name, safety_settings, generation_config = settings
+    init_vertex()
+    if (project or initializer.global_config.project) != initializer.global_config.project:
+        return None
+    if (region or initializer.global_config.location) != initializer.global_config.location:
+        return None
+    try:
+        cached_content = caching.CachedContent.create(
+            model_name=name,
+            contents=[Part.from_uri(uri, mime_type=mime_type)],
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+            display_name=f"video-{hashlib.sha1(uri.encode('utf-8')).hexdigest()[:12]}",
+        )
+    except exceptions.GoogleAPICallError:
+        return None
+    return GenerativeModel.from_cached_content(
+        cached_content=cached_content, safety_settings=safety_settings, generation_config=generation_config
+    )
+
+
+class VideoContextCache:
+    # Keeps one context cache per (client, gs:// video) for all steps, reruns
+    # and sessions. Requests through the cached client send only their prompt,
+    # and the backend doesn't process the video again. Videos that can't be
+    # cached are remembered for the TTL too, so they aren't retried per request.
+    def __init__(self, create=_cached_video_model, ttl_seconds=VIDEO_CONTEXT_CACHE_TTL):
+        self._create = create
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "uncached": 0}
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        return entry if entry is not None and entry["expires"] > time.time() else None
+
+    def _prune(self):
+        # Drops expired entries, and the locks of keys nobody is creating.
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if entry["expires"] <= now]:
+            del self._entries[key]
+        for key in [key for key, lock in self._key_locks.items() if key not in self._entries and not lock.locked()]:
+            del self._key_locks[key]
+
+    def get(self, model, uri, mime_type):
+        # The cached client, or None to send the video as an ordinary part.
+        # Keyed by id(model); the entry holds the client so the id isn't reused.
+        key = (id(model), uri, mime_type)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return entry["cached"]
+            self._prune()
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Creating a cache takes as long as processing the video; only requests
+        # for the same video wait for it.
+        with key_lock:
+            with self._lock:
+                entry = self._live_entry(key)
+                if entry is not None:
+                    self.stats["hits"] += 1
+                    return entry["cached"]
+            cached = self._create(model, uri, mime_type, self.ttl_seconds)
+            with self._lock:
+                self._entries[key] = {
+                    "model": model,
+                    "cached": cached,
+                    "expires": time.time() + self.ttl_seconds - VIDEO_CONTEXT_CACHE_MARGIN,
+                }
+                self.stats["misses" if cached is not None else "uncached"] += 1
+            return cached
+
+
+media_registry = MediaRegistry(uploader=GcsUploader(DEMO_ASSETS_BUCKET) if DEMO_ASSETS_BUCKET else None)
+video_context_cache = VideoContextCache() if VIDEO_CONTEXT_CACHE else None
+
+
+def part_from_uri(uri, mime_type):
+    return media_registry.from_uri(uri, mime_type)
+
+
+def part_from_bytes(data, mime_type):
+    return media_registry.from_bytes(data, mime_type)
+
+
+def cached_video_model(model, uri, mime_type):
+    if video_context_cache is None:
+        return None
+    return video_context_cache.get(model, uri, mime_type)
@@ -0,0 +1,86 @@
+import os
+import threading
+from collections import Counter
+
+import vertexai
+from google.cloud.aiplatform import initializer
+from vertexai.generative_models import GenerativeModel
+
+from utils_cache import stable_key
+
+PROJECT_ID = os.environ.get("GCP_PROJECT")  # Your Google Cloud Project ID
+LOCATION = os.environ.get("GCP_REGION")  # Default region, when a page doesn't pick one
+
+# One client per (project, region, model name, default settings) for the whole
+# process. Clients are safe to share between threads and Streamlit sessions, so
+# pages get them from here instead of building their own on every rerun.
+_clients = {}
+_clients_lock = threading.Lock()
+_constructions = Counter()
+_hits = Counter()
+_settings = {}
+_vertex_initialized = False
+_init_lock = threading.Lock()
+
+
+def init_vertex():
+    # Configures the SDK defaults once per process, for code that uses the
+    # global configuration directly (e.g. context caches). The configuration
+    # is never changed afterwards; clients for other regions name their region
+    # explicitly instead.
+    global _vertex_initialized
+    with _init_lock:
+        if not _vertex_initialized:
+            vertexai.init(project=PROJECT_ID, location=LOCATION)
+            _vertex_initialized = True
+
+
+def _new_client(name, project, region, safety_settings, generation_config):
+    # A GenerativeModel built from a full resource name is bound to that
+    # project and region, whatever the SDK's global configuration says.
+    if "/" not in name:
+        init_vertex()
+        project = project or initializer.global_config.project
+        region = region or initializer.global_config.location
+        name = f"projects/{project}/locations/{region}/publishers/google/models/{name}"
+    return GenerativeModel(name, safety_settings=safety_settings, generation_config=generation_config)
+
+
+def get_model(name, safety_settings=None, generation_config=None, region=None, project=None):
+    project = project or PROJECT_ID
+    region = region or LOCATION
+    key = (project, region, name, stable_key(safety_settings, generation_config))
+    model = _clients.get(key)
+    if model is None:
+        with _clients_lock:
+            model = _clients.get(key)
+            if model is None:
+                model = _new_client(name, project, region, safety_settings, generation_config)
+                _clients[key] = model
+                _settings[id(model)] = (project, region, name, safety_settings, generation_config)
+                _constructions[key] += 1
+                return model
+    _hits[key] += 1
+    return model
+
+
+def client_settings(model):
+    # (project, region, name, safety_settings, generation_config) a client from
+    # get_model was built with, or None for clients built elsewhere. Project
+    # and region are None when they are the SDK defaults.
+    return _settings.get(id(model))
+
+
+def load_models(name, region=None):
+    # Drop-in replacement for the per-page load_models helpers, which returned a
+    # text and a multimodal client for the same model name. Both are the same
+    # pooled client.
+    model = get_model(name, region=region)
+    return model, model
+
+
+def stats():
+    return [
+        {"project": key[0], "region": key[1], "model": key[2], "constructed": _constructions[key], "hits": _hits[key]}
+        for key in _clients
+    ]
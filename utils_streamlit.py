@@ -9,4 +9,79 @@ def reset_page_state(prefix: str):
 
 def reset_st_state():
     for key in st.session_state:
-        del st.session_state[key]
\ No newline at end of file
+        del st.session_state[key]
+
+def render_cache_controls(cache, key="use_response_cache"):
+    use_cache = st.sidebar.checkbox("Reuse cached responses", value=True, key=key)
+    stats = cache.stats()
+    st.sidebar.caption(
+        f"Response cache: {stats['hits']} hits / {stats['misses']} misses "
+        f"({stats['entries']} entries)"
+    )
+    return use_cache
+
+
+def render_keyframe_toggle(video_uri, key="use_keyframes"):
+    # Returns the video's keyframes when the user opts in, otherwise None.
+    from utils_video import estimate_keyframe_tokens, estimate_video_tokens, get_keyframes
+
+    if not st.toggle("Send keyframes instead of the full video", key=key):
+        return None
+    with st.spinner("Extracting keyframes..."):
+        keyframes = get_keyframes(video_uri)
+    st.caption(
+        f"{len(keyframes['frames'])} keyframes from a {keyframes['duration']:.0f}s video: "
+        f"~{estimate_video_tokens(keyframes['duration']):,} → ~{estimate_keyframe_tokens(keyframes):,} input tokens"
+    )
+    return keyframes
+
+
+def render_pipeline(pipeline, generate, memo, run=False, salt=(), reuse=True):
+    # One expander per pipeline stage. With `run`, executes the whole pipeline
+    # and streams each stage into its expander as it generates, reusing
+    # unchanged stages only if `reuse`; otherwise shows the results memoized
+    # by earlier runs.
+    views = {}
+    for s in pipeline.steps:
+        entry = memo.get(s["key"])
+        with st.expander(s["label"], expanded=run or entry is not None):
+            views[s["key"]] = (st.empty(), st.empty(), st.empty())
+        if entry is not None and not run:
+            _render_stage(views[s["key"]], entry, reused=True)
+    if not run:
+        return
+
+    texts = {}
+    total = 0.0
+    failed = False
+    for event in pipeline.run(generate, memo, salt, reuse):
+        kind, key = event[0], event[1]
+        status, output, prompt = views[key]
+        if kind == "start":
+            texts[key] = ""
+            status.caption("Generating...")
+        elif kind == "chunk":
+            texts[key] += event[2]
+            output.markdown(texts[key])
+        elif kind == "done":
+            _render_stage(views[key], event[2], reused=event[3])
+            total += 0.0 if event[3] else event[2]["seconds"]
+        else:
+            status.error(f"Generation failed: {event[2]}")
+            failed = True
+    if not failed:
+        st.caption(f"Pipeline finished in {total:.1f}s of generation")
+
+
+def _render_stage(view, entry, reused):
+    status, output, prompt = view
+    if reused:
+        status.caption(f":green[Completed] · inputs unchanged, reused ({entry['seconds']:.1f}s when generated)")
+    else:
+        status.caption(f":green[Completed] in {entry['seconds']:.1f}s")
+    with output.container():
+        st.markdown("### Generated Content")
+        st.markdown(entry["output"])
+    with prompt.container():
+        st.markdown("### Prompt Used")
+        st.code(entry["prompt"], language="markdown")
@@ -0,0 +1,78 @@
+import re
+
+# Gemini bills input by non-whitespace characters; tokens average roughly four
+# characters of English/code. The heuristic is only used if tiktoken can't load.
+CHARS_PER_TOKEN = 4
+# Fixed token charge Gemini applies to an image or a non-text part.
+MEDIA_PART_TOKENS = 258
+# Fixed token rate Gemini applies to video (frames sampled at 1 fps, with audio).
+VIDEO_TOKENS_PER_SECOND = 263
+PRICE_PER_1K_CHARACTERS = 0.0025
+
+_WHITESPACE = re.compile(r"\s+")
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+
+def split_contents(contents):
+    texts = []
+    media_parts = 0
+    items = contents if isinstance(contents, (list, tuple)) else [contents]
+    for item in items:
+        if isinstance(item, str):
+            texts.append(item)
+            continue
+        try:
+            text = item.text
+        except (AttributeError, ValueError):
+            text = None
+        if isinstance(text, str):
+            texts.append(text)
+        else:
+            media_parts += 1
+    return texts, media_parts
+
+
+def estimate_tokens(contents):
+    texts, media_parts = split_contents(contents)
+    encoding = _get_encoding()
+    if encoding:
+        text_tokens = sum(len(encoding.encode(t, disallowed_special=())) for t in texts)
+    else:
+        text_tokens = sum(-(-len(t) // CHARS_PER_TOKEN) for t in texts)
+    return text_tokens + media_parts * MEDIA_PART_TOKENS
+
+
+def billable_characters(contents):
+    texts, _ = split_contents(contents)
+    return sum(len(_WHITESPACE.sub("", t)) for t in texts)
+
+
+def estimate_cost(characters, price_per_1k=PRICE_PER_1K_CHARACTERS):
+    return (characters / 1000) * price_per_1k
+
+
+def count_prompt(model, contents, exact=False):
+    if exact:
+        response = model.count_tokens(contents)
+        return response.total_tokens, response.total_billable_characters
+    return estimate_tokens(contents), billable_characters(contents)
+
+
+class TokenLimitError(ValueError):
+    pass
+
+
+def check_token_limit(total_tokens, limit):
+    if total_tokens > limit:
+        raise TokenLimitError(f"Total tokens must be less than {limit}")
@@ -1,79 +1,171 @@
 import os
-import re
+import threading
 
-import vertexai
 from vertexai.generative_models import (
     GenerationConfig,
-    GenerativeModel,
     HarmBlockThreshold,
     HarmCategory,
     Part,
 )
 import vertexai.generative_models as generative_models
-from vertexai.preview.vision_models import (
-    ImageGenerationModel,
-    MultiModalEmbeddingModel,
-)
-from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
 
+import utils_models
+from utils_models import init_vertex
+from utils_cache import ResponseCache, prompt_key
+from utils_tokens import check_token_limit, count_prompt, estimate_cost
 
 
-PROJECT_ID = os.environ.get("GCP_PROJECT")  # Your Google Cloud Project ID
-LOCATION = os.environ.get("GCP_REGION")  # Your Google Cloud Project Region
-vertexai.init(project=PROJECT_ID, location=LOCATION)
 
+def _multimodal_embeddings():
+    from vertexai.preview.vision_models import MultiModalEmbeddingModel
+    return MultiModalEmbeddingModel.from_pretrained("multimodalembedding@001")
 
+def _text_embeddings():
+    from vertexai.language_models import TextEmbeddingModel
+    return TextEmbeddingModel(model_id="textembedding-gecko-multilingual@latest")
 
-model_gemini_pro = GenerativeModel("gemini-1.0-pro")
-model_gemini_pro_15 = GenerativeModel("gemini-1.5-pro-001")
-model_gemini_flash = GenerativeModel("gemini-1.5-flash-001")
-model_experimental = GenerativeModel("gemini-experimental")
-multimodal_model_pro = GenerativeModel("gemini-1.0-pro-vision")
-multimodal_embeddings = MultiModalEmbeddingModel.from_pretrained(
-    "multimodalembedding@001"
-)
-embeddings = TextEmbeddingModel(model_id="textembedding-gecko-multilingual@latest")
-imagen = ImageGenerationModel.from_pretrained("imagegeneration@005")
+def _imagen():
+    from vertexai.preview.vision_models import ImageGenerationModel
+    return ImageGenerationModel.from_pretrained("imagegeneration@005")
 
-safety_settings = {
-    generative_models.HarmCategory.HARM_CATEGORY_HATE_SPEECH: generative_models.HarmBlockThreshold.BLOCK_NONE,
-    generative_models.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: generative_models.HarmBlockThreshold.BLOCK_NONE,
-    generative_models.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: generative_models.HarmBlockThreshold.BLOCK_NONE,
-    generative_models.HarmCategory.HARM_CATEGORY_HARASSMENT: generative_models.HarmBlockThreshold.BLOCK_NONE,
+
+# Models are built on first access (e.g. `utils_vertex.model_gemini_pro` or
+# `from utils_vertex import model_gemini_pro`) and then cached for the whole
+# process, so Streamlit reruns and other pages reuse the same clients.
+_MODEL_FACTORIES = {
+    "model_gemini_pro": lambda: utils_models.get_model("gemini-1.0-pro"),
+    "model_gemini_pro_15": lambda: utils_models.get_model("gemini-1.5-pro-001"),
+    "model_gemini_flash": lambda: utils_models.get_model("gemini-1.5-flash-001"),
+    "model_experimental": lambda: utils_models.get_model("gemini-experimental"),
+    "multimodal_model_pro": lambda: utils_models.get_model("gemini-1.0-pro-vision"),
+    "multimodal_embeddings": _multimodal_embeddings,
+    "embeddings": _text_embeddings,
+    "imagen": _imagen,
 }
 
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(name):
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _models_lock:
+        if name not in _models:
+            init_vertex()
+            _models[name] = _MODEL_FACTORIES[name]()
+        return _models[name]
+
+
+def loaded_models():
+    return list(_models)
 
 
+def __getattr__(name):
+    if name in _MODEL_FACTORIES:
+        return get_model(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+safety_settings = {
+    generative_models.HarmCategory.HARM_CATEGORY_HATE_SPEECH: generative_models.HarmBlockThreshold.BLOCK_NONE,
+    generative_models.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: generative_models.HarmBlockThreshold.BLOCK_NONE,
+    generative_models.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: generative_models.HarmBlockThreshold.BLOCK_NONE,
+    generative_models.HarmCategory.HARM_CATEGORY_HARASSMENT: generative_models.HarmBlockThreshold.BLOCK_NONE,
+}
 
-def sendPrompt(input, model):
+TOKEN_LIMIT = 1000000
 
-    
-    token_size = model.count_tokens(input)
-    token_size = str(token_size)
-    patternToken = r"total_tokens:\s*(\d+)"
-    matchToken = re.search(patternToken, token_size)
+generation_config = {
+    "max_output_tokens": 8192,
+    "temperature": 0.4,
+    "top_p": 1
+}
 
-    total_tokens = int(matchToken.group(1))
-    if total_tokens > 1000000:
-        raise ValueError("Total tokens must be less than 1000000")
+# Identical prompts are answered from memory; set PROMPT_CACHE_DIR to also keep
+# responses on disk across restarts.
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("PROMPT_CACHE_ENTRIES", "256")),
+    disk_dir=os.environ.get("PROMPT_CACHE_DIR"),
+    ttl_seconds=int(os.environ.get("PROMPT_CACHE_TTL", "86400")),
+    max_disk_bytes=int(os.environ.get("PROMPT_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
 
 
-    patternChar = r"total_billable_characters:\s*(\d+)"
-    matchChar = re.search(patternChar, token_size)
 
-    billable_characters = int(matchChar.group(1))
-    valor = (billable_characters / 1000) * 0.0025
+# Yields response text chunks as they arrive; `text` and `usage` are filled in
+# once the stream has been fully consumed.
+class PromptStream:
+    def __init__(self, responses, cost, cache_key=None):
+        self._responses = responses
+        self._cache_key = cache_key
+        self.cost = cost
+        self.text = None
+        self.usage = {}
+
+    def __iter__(self):
+        parts = []
+        for chunk in self._responses:
+            if isinstance(chunk, str):
+                text = chunk
+            else:
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage is not None:
+                    self.usage = {
+                        "prompt_token_count": usage.prompt_token_count,
+                        "candidates_token_count": usage.candidates_token_count,
+                        "total_token_count": usage.total_token_count,
+                    }
+                try:
+                    text = chunk.text
+                except (ValueError, IndexError):
+                    text = ""
+            if text:
+                parts.append(text)
+                yield text
+        self.text = "".join(parts)
+        if self._cache_key is not None:
+            response_cache.put(self._cache_key, self.text)
+
+
+def _prepare_prompt(input, model, exact_count):
+    total_tokens, billable_characters = count_prompt(model, input, exact=exact_count)
+    check_token_limit(total_tokens, TOKEN_LIMIT)
+    return estimate_cost(billable_characters)
+
+
+def sendPrompt(input, model, use_cache=True, exact_count=False):
+    cache_key = prompt_key(model, input, generation_config, safety_settings)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # Only the token-limit check matters here: sendPrompt returns plain text,
+    # so callers that need the cost use streamPrompt (PromptStream.cost).
+    _prepare_prompt(input, model, exact_count)
 
     prompt_response = model.generate_content(input,
-        generation_config={
-            "max_output_tokens": 8192,
-            "temperature": 0.4,
-            "top_p": 1
-        },
+        generation_config=generation_config,
         safety_settings=safety_settings,
     )
+    response_cache.put(cache_key, prompt_response.text)
     return prompt_response.text
 
 
+def streamPrompt(input, model, use_cache=True, exact_count=False):
+    cache_key = prompt_key(model, input, generation_config, safety_settings)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return PromptStream([cached], cost=0.0)
+
+    valor = _prepare_prompt(input, model, exact_count)
+
+    responses = model.generate_content(input,
+        generation_config=generation_config,
+        safety_settings=safety_settings,
+        stream=True,
+    )
+    return PromptStream(responses, cost=valor, cache_key=cache_key)
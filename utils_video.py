@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from utils_media import cached_video_model, part_from_bytes, part_from_uri
+from utils_tokens import MEDIA_PART_TOKENS, VIDEO_TOKENS_PER_SECOND
+
+# Keyframes extracted from each video are cached here, so a video is only
+# downloaded and decoded once per instance.
+VIDEO_CACHE_DIR = os.environ.get("VIDEO_CACHE_DIR", "./.video-cache")
+# Frames are sampled at this rate and kept only when they differ from the last
+# kept frame by more than SCENE_THRESHOLD (mean absolute difference, 0-255, of
+# a small grayscale thumbnail). Idle stretches therefore yield no frames.
+SAMPLE_FPS = 1.0
+SCENE_THRESHOLD = 12.0
+MAX_KEYFRAMES = 64
+KEYFRAME_WIDTH = 768
+JPEG_QUALITY = 80
+# Manifests and keyframe parts are kept in memory for this many of the most
+# recently used videos; older ones are read from VIDEO_CACHE_DIR again.
+KEYFRAME_CACHE_ENTRIES = int(os.environ.get("KEYFRAME_CACHE_ENTRIES", "8"))
+
+_keyframes = OrderedDict()
+_keyframe_parts = OrderedDict()
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _recall(cache, key):
+    with _locks_guard:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _remember(cache, key, value):
+    with _locks_guard:
+        cache[key] = value
+        while len(cache) > KEYFRAME_CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+
+def _cache_key(uri, sample_fps, threshold, max_frames):
+    return hashlib.sha1(json.dumps([uri, sample_fps, threshold, max_frames, KEYFRAME_WIDTH]).encode("utf-8")).hexdigest()
+
+
+def _download(uri, path):
+    if uri.startswith("gs://"):
+        from google.cloud import storage
+
+        bucket, name = uri[len("gs://"):].split("/", 1)
+        storage.Client().bucket(bucket).blob(name).download_to_filename(path)
+    else:
+        shutil.copyfile(uri, path)
+
+
+def extract_keyframes(path, sample_fps=SAMPLE_FPS, threshold=SCENE_THRESHOLD, max_frames=MAX_KEYFRAMES):
+    # Returns (duration in seconds, [(timestamp, JPEG bytes)]).
+    import cv2
+    import numpy as np
+
+    if max_frames < 1:
+        raise ValueError("max_frames must be at least 1")
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video: {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+    step = max(int(round(fps / sample_fps)), 1)
+
+    frames = []
+    last_thumbnail = None
+    index = 0
+    while True:
+        if not capture.grab():
+            break
+        if index % step == 0:
+            ok, frame = capture.retrieve()
+            if ok:
+                thumbnail = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 36)).astype(np.int16)
+                if last_thumbnail is None or np.abs(thumbnail - last_thumbnail).mean() > threshold:
+                    last_thumbnail = thumbnail
+                    height, width = frame.shape[:2]
+                    if width > KEYFRAME_WIDTH:
+                        frame = cv2.resize(frame, (KEYFRAME_WIDTH, int(height * KEYFRAME_WIDTH / width)))
+                    _, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                    frames.append((index / fps, jpeg.tobytes()))
+        index += 1
+    capture.release()
+
+    if len(frames) > max_frames:
+        # Too many scene changes: keep an evenly spread subset.
+        last = len(frames) - 1
+        frames = [frames[round(i * last / max(max_frames - 1, 1))] for i in range(max_frames)]
+    return duration, frames
+
+
+def get_keyframes(uri, sample_fps=SAMPLE_FPS, threshold=SCENE_THRESHOLD, max_frames=MAX_KEYFRAMES):
+    # Returns {"uri", "duration", "frames": [{"t", "path"}]}, extracting the
+    # keyframes only the first time a video is seen by this instance.
+    key = _cache_key(uri, sample_fps, threshold, max_frames)
+    keyframes = _recall(_keyframes, key)
+    if keyframes is not None:
+        return keyframes
+    with _locks_guard:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        keyframes = _recall(_keyframes, key)
+        if keyframes is not None:
+            return keyframes
+        directory = os.path.join(VIDEO_CACHE_DIR, key)
+        manifest_path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(manifest_path):
+            os.makedirs(directory, exist_ok=True)
+            video_path = os.path.join(directory, "source" + os.path.splitext(uri)[1])
+            _download(uri, video_path)
+            duration, frames = extract_keyframes(video_path, sample_fps, threshold, max_frames)
+            os.remove(video_path)
+            manifest = {"uri": uri, "duration": duration, "frames": []}
+            for i, (timestamp, jpeg) in enumerate(frames):
+                frame_path = os.path.join(directory, f"frame-{i:04d}.jpg")
+                with open(frame_path, "wb") as f:
+                    f.write(jpeg)
+                manifest["frames"].append({"t": timestamp, "path": frame_path})
+            with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            keyframes = json.load(f)
+        _remember(_keyframes, key, keyframes)
+        return keyframes
+
+
+def video_parts(uri, keyframes=None, mime_type="video/mp4"):
+    # Prompt parts for a video: the whole video, or its keyframes each preceded
+    # by its timestamp. Keyframe parts are built once per extraction, so reruns
+    # don't read and hash the JPEGs again.
+    if keyframes is None:
+        return [part_from_uri(uri, mime_type=mime_type)]
+    key = tuple(frame["path"] for frame in keyframes["frames"])
+    parts = _recall(_keyframe_parts, key)
+    if parts is None:
+        parts = []
+        for frame in keyframes["frames"]:
+            with open(frame["path"], "rb") as f:
+                parts += [f"Frame at {frame['t']:.1f}s:", part_from_bytes(f.read(), "image/jpeg")]
+        _remember(_keyframe_parts, key, parts)
+    return list(parts)
+
+
+def video_request(model, uri, keyframes=None, mime_type="video/mp4"):
+    # The client to call and the prompt parts for a video. A whole gs:// video
+    # is served from a context cache when it can be, so the parts are empty and
+    # the returned client already has the video in its context.
+    if keyframes is None and uri.startswith("gs://"):
+        cached = cached_video_model(model, uri, mime_type)
+        if cached is not None:
+            return cached, []
+    return model, video_parts(uri, keyframes, mime_type)
+
+
+def estimate_video_tokens(duration):
+    return int(duration * VIDEO_TOKENS_PER_SECOND)
+
+
+def estimate_keyframe_tokens(keyframes):
+    return len(keyframes["frames"]) * MEDIA_PART_TOKENS